@@ -0,0 +1,126 @@
+# benchmarks/gapless_benchmark.py
+"""
+Measures the silence between two queued music tracks: the time from the end of one track (the
+after-callback on the voice thread) to the first 20ms frame of the next one being readable, for:
+  - cold:   the old path. Hop to the event loop (call_soon_threadsafe + task + guild lock), spawn
+            the decoder in the executor, then wait for its first frame
+  - primed: the gapless path. The decoder was spawned PREFETCH_LEAD seconds earlier and its pipe
+            already holds the first frames, so the voice thread reads one straight away
+Reports best and median over N track changes.
+
+Run from the repository root:  python benchmarks/gapless_benchmark.py [--repeats 20]
+Uses ffmpeg (a generated sine, same s16le 48kHz stereo output as FFmpegPCMAudio) if it is on
+PATH; otherwise a Python subprocess that writes PCM stands in for the decoder, which has a
+similar process start cost but no demux/decode work, so the cold numbers are a lower bound.
+"""
+import os
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import statistics
+import subprocess
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FRAME_BYTES = 3840 # 20ms of 48kHz stereo s16le, what discord's AudioPlayer reads per packet
+PRIME_SECONDS = 0.5 # Stand-in for MUSIC_PREFETCH_LEAD_SECONDS; long enough for the pipe to fill
+
+_PYTHON_DECODER = (
+    "import sys\n"
+    "frame = bytes(3840)\n"
+    "out = sys.stdout.buffer\n"
+    "for _ in range(50 * 30): out.write(frame)\n"
+)
+
+
+def decoder_command():
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg:
+        return 'ffmpeg', [ffmpeg, '-hide_banner', '-loglevel', 'error', '-f', 'lavfi', '-i', 'sine=frequency=440:duration=30',
+                          '-f', 's16le', '-ar', '48000', '-ac', '2', 'pipe:1']
+    return 'python stand-in', [sys.executable, '-c', _PYTHON_DECODER]
+
+
+def spawn(command):
+    return subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+
+def first_frame(process) -> bytes:
+    return process.stdout.read(FRAME_BYTES)
+
+
+def finish(process):
+    process.kill()
+    process.stdout.close()
+    process.wait()
+
+
+async def cold_gap(loop, lock: asyncio.Lock, command) -> float:
+    """Track end on a foreign thread -> loop task -> lock -> executor spawn -> first frame."""
+    done = loop.create_future()
+
+    async def play_next(ended_at: float):
+        async with lock:
+            process = await loop.run_in_executor(None, spawn, command)
+            frame = await loop.run_in_executor(None, first_frame, process)
+            gap = time.perf_counter() - ended_at
+            assert len(frame) == FRAME_BYTES
+            finish(process)
+            done.set_result(gap)
+
+    def after_callback():
+        ended_at = time.perf_counter()
+        loop.call_soon_threadsafe(lambda: loop.create_task(play_next(ended_at)))
+
+    threading.Thread(target=after_callback).start()
+    return await done
+
+
+async def primed_gap(loop, command) -> float:
+    """Decoder spawned ahead of time; the voice thread switches and reads the first frame itself."""
+    process = await loop.run_in_executor(None, spawn, command)
+    await asyncio.sleep(PRIME_SECONDS)
+    result = {}
+
+    def after_callback():
+        ended_at = time.perf_counter()
+        frame = first_frame(process)
+        result['gap'] = time.perf_counter() - ended_at
+        assert len(frame) == FRAME_BYTES
+
+    thread = threading.Thread(target=after_callback)
+    thread.start()
+    await loop.run_in_executor(None, thread.join)
+    finish(process)
+    return result['gap']
+
+
+async def run(repeats: int):
+    loop = asyncio.get_running_loop()
+    lock = asyncio.Lock()
+    label, command = decoder_command()
+    await loop.run_in_executor(None, lambda: finish(spawn(command))) # Warm the page cache and executor
+    cold = [await cold_gap(loop, lock, command) for _ in range(repeats)]
+    primed = [await primed_gap(loop, command) for _ in range(repeats)]
+    return label, cold, primed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeats', type=int, default=20, help="Track changes measured per path")
+    args = parser.parse_args()
+
+    label, cold, primed = asyncio.run(run(args.repeats))
+    print(f"Decoder: {label}. Gap = track end -> first {FRAME_BYTES}-byte frame readable, {args.repeats} changes each.")
+    print(f"{'path':>8} | {'best ms':>8} {'median ms':>10} {'worst ms':>9}")
+    for name, gaps in (('cold', cold), ('primed', primed)):
+        print(f"{name:>8} | {min(gaps) * 1000:>8.2f} {statistics.median(gaps) * 1000:>10.2f} {max(gaps) * 1000:>9.2f}")
+    print(f"Median gap removed: {(statistics.median(cold) - statistics.median(primed)) * 1000:.2f} ms per track change")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+# benchmarks/mixer_benchmark.py
+"""
+Times utils.audio_dsp.mix_s16le, the per-frame work of core.audio_mixer.GuildMixer, for a
+music bed plus 0..N overlaid sounds, at unity gain and while the ducking ramp is moving.
+Each call has to finish well inside the 20ms frame it produces, for every connected guild.
+
+Run from the repository root:  python benchmarks/mixer_benchmark.py [--overlays 4] [--frames 5000]
+Needs numpy.
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from utils import audio_dsp
+
+FRAME_BYTES = 3840 # 20ms of 48kHz stereo s16le
+FRAME_MS = 20.0
+
+
+def make_frame(seed: int) -> bytes:
+    rng = np.random.default_rng(seed)
+    return rng.integers(-20000, 20000, FRAME_BYTES // 2, dtype=np.int16).astype('<i2').tobytes()
+
+
+def measure(func, frames: int, repeats: int) -> float:
+    """Best mean seconds per call over repeats runs of frames calls."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(frames):
+            func()
+        best = min(best, (time.perf_counter() - start) / frames)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--overlays', type=int, default=4, help="Most overlaid sounds to measure")
+    parser.add_argument('--frames', type=int, default=5000)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    bed = make_frame(0)
+    overlays = [make_frame(i + 1) for i in range(args.overlays)]
+    print(f"Frame: {FRAME_BYTES} bytes ({FRAME_MS:.0f}ms). Best mean of {args.repeats} x {args.frames} frames.")
+    print(f"{'inputs':>14} | {'unity us':>9} {'ramp us':>9} | {'guilds per core':>15}")
+    for count in range(args.overlays + 1):
+        inputs = overlays[:count]
+        unity = measure(lambda: audio_dsp.mix_s16le(bed, inputs, FRAME_BYTES), args.frames, args.repeats)
+        ramp = measure(lambda: audio_dsp.mix_s16le(bed, inputs, FRAME_BYTES, 1.0, 0.9), args.frames, args.repeats)
+        label = f"bed + {count}"
+        print(f"{label:>14} | {unity * 1e6:>9.1f} {ramp * 1e6:>9.1f} | {int(FRAME_MS / 1000 / max(unity, ramp)):>15}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+# benchmarks/normalize_benchmark.py
+"""
+Compares the render stage that runs after decoding (trim, peak normalize, resample to 48kHz,
+convert to stereo 16-bit) for:
+  - the pydub chain: max_dBFS scan, apply_gain copy, set_frame_rate / set_channels / set_sample_width copies
+  - utils.audio_dsp: peak read plus one fused pass into a preallocated buffer (and the LUFS measurement)
+Reports best-of-N wall time and peak traced allocation per clip.
+
+Run from the repository root:  python benchmarks/normalize_benchmark.py [--seconds 10] [--rates 22050 44100 48000]
+Needs numpy; pydub is optional (without it only the NumPy path is measured).
+"""
+import os
+import sys
+import math
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from utils import audio_dsp
+
+try:
+    from pydub import AudioSegment
+    PYDUB_AVAILABLE = True
+except ImportError:
+    PYDUB_AVAILABLE = False
+
+TARGET_DBFS = -14.0
+MAX_DURATION_MS = 10 * 1000
+
+
+def make_test_raw(seconds: float, rate: int, channels: int) -> bytes:
+    """Speech-like test signal: two tones under a slow amplitude envelope, 16-bit interleaved."""
+    t = np.arange(int(rate * seconds)) / rate
+    envelope = 0.3 + 0.25 * np.sin(2 * math.pi * 3 * t)
+    mono = envelope * (np.sin(2 * math.pi * 220 * t) + 0.5 * np.sin(2 * math.pi * 1250 * t))
+    samples = (mono * 12000).astype('<i2')
+    return np.repeat(samples[:, None], channels, axis=1).tobytes()
+
+
+def render_pydub(raw: bytes, rate: int, channels: int) -> bytes:
+    seg = AudioSegment(data=raw, sample_width=2, frame_rate=rate, channels=channels)
+    if len(seg) > MAX_DURATION_MS:
+        seg = seg[:MAX_DURATION_MS]
+    gain = min(TARGET_DBFS - seg.max_dBFS, 6.0)
+    seg = seg.apply_gain(gain)
+    seg = seg.set_frame_rate(48000).set_channels(2).set_sample_width(2)
+    return seg.raw_data
+
+
+def render_numpy(raw: bytes, rate: int, channels: int, lufs: bool = False) -> bytearray:
+    samples = audio_dsp.samples_from_raw(raw, 2, channels)[:MAX_DURATION_MS * rate // 1000]
+    peak = audio_dsp.peak_dbfs(samples, 2)
+    if lufs:
+        audio_dsp.integrated_loudness(samples, 2, rate)
+    gain = min(TARGET_DBFS - peak, 6.0)
+    return audio_dsp.render_s16le_stereo(samples, 2, rate, gain)
+
+
+def measure(func, repeats: int):
+    """Returns (best wall seconds, peak traced bytes) for func()."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=10.0, help="Length of the test clip")
+    parser.add_argument('--rates', type=int, nargs='+', default=[22050, 24000, 44100, 48000])
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    if not PYDUB_AVAILABLE:
+        print("pydub not installed: measuring the NumPy path only.")
+
+    print(f"Clip: {args.seconds:.1f}s, 16-bit. Output: 48kHz stereo s16le ({int(args.seconds * 48000 * 4) / 1024:.0f} KiB)")
+    print(f"{'input':>12} | {'pydub ms':>9} {'pydub KiB':>10} | {'numpy ms':>9} {'numpy KiB':>10} | {'+LUFS ms':>9} | {'speedup':>7}")
+    for rate in args.rates:
+        for channels in (1, 2):
+            raw = make_test_raw(args.seconds, rate, channels)
+            np_time, np_mem = measure(lambda: render_numpy(raw, rate, channels), args.repeats)
+            lufs_time, _ = measure(lambda: render_numpy(raw, rate, channels, lufs=True), args.repeats)
+            label = f"{rate}Hz/{channels}ch"
+            if PYDUB_AVAILABLE:
+                pd_time, pd_mem = measure(lambda: render_pydub(raw, rate, channels), args.repeats)
+                speedup = pd_time / np_time if np_time else float('inf')
+                print(f"{label:>12} | {pd_time * 1000:>9.2f} {pd_mem / 1024:>10.0f} | {np_time * 1000:>9.2f} {np_mem / 1024:>10.0f} | {lufs_time * 1000:>9.2f} | {speedup:>6.1f}x")
+            else:
+                print(f"{label:>12} | {'-':>9} {'-':>10} | {np_time * 1000:>9.2f} {np_mem / 1024:>10.0f} | {lufs_time * 1000:>9.2f} | {'-':>7}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
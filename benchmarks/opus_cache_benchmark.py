@@ -0,0 +1,96 @@
+# benchmarks/opus_cache_benchmark.py
+"""
+Compares voice-thread CPU per concurrent stream for:
+  - PCM playback (MmapPCMAudio): every 20ms frame is Opus-encoded at play time, as the
+    discord voice player does for non-Opus sources.
+  - Pre-encoded playback (MmapOpusAudio): packets are read and sent as-is.
+
+Run from the repository root:  python benchmarks/opus_cache_benchmark.py [--streams 1 4 16] [--seconds 10]
+Needs py-cord and a loadable Opus library (see test_opus.py).
+"""
+import os
+import sys
+import math
+import time
+import array
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+
+from core.audio_sources import (
+    FRAME_SIZE, SAMPLES_PER_FRAME, MmapPCMAudio, MmapOpusAudio, encode_opus_packets, opus_available,
+)
+
+SAMPLE_RATE = 48000
+
+
+def make_test_pcm(seconds: float) -> bytes:
+    """A two-tone stereo s16le signal, so the encoder has real work to do."""
+    samples = array.array('h')
+    for i in range(int(SAMPLE_RATE * seconds)):
+        t = i / SAMPLE_RATE
+        value = int(8000 * math.sin(2 * math.pi * 440 * t) + 4000 * math.sin(2 * math.pi * 1250 * t))
+        samples.append(value)  # Left
+        samples.append(value // 2)  # Right
+    return samples.tobytes()
+
+
+def run_streams(make_source, streams: int, encode: bool) -> float:
+    """Pulls every frame from `streams` concurrent sources, round-robin like parallel voice threads. Returns CPU seconds."""
+    sources = [make_source() for _ in range(streams)]
+    encoders = [discord.opus.Encoder() for _ in range(streams)] if encode else []
+    active = list(range(streams))
+    start = time.process_time()
+    while active:
+        still_active = []
+        for i in active:
+            data = sources[i].read()
+            if not data:
+                continue
+            if encode:
+                encoders[i].encode(data, SAMPLES_PER_FRAME)
+            still_active.append(i)
+        active = still_active
+    elapsed = time.process_time() - start
+    for source in sources:
+        source.cleanup()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--streams', type=int, nargs='+', default=[1, 4, 16, 32])
+    parser.add_argument('--seconds', type=float, default=10.0, help="Length of the test clip")
+    args = parser.parse_args()
+
+    if not opus_available():
+        print("Opus library could not be loaded; nothing to compare. Run test_opus.py for details.")
+        return 1
+
+    pcm_data = make_test_pcm(args.seconds)
+    packets = encode_opus_packets(pcm_data)
+    frames = math.ceil(len(pcm_data) / FRAME_SIZE)
+    with tempfile.TemporaryDirectory() as tmp:
+        pcm_path = os.path.join(tmp, 'clip.pcm')
+        opus_path = os.path.join(tmp, 'clip.opuspk')
+        with open(pcm_path, 'wb') as f: f.write(pcm_data)
+        with open(opus_path, 'wb') as f: f.write(packets)
+
+        print(f"Clip: {args.seconds:.1f}s, {frames} frames. PCM artifact {len(pcm_data) / 1024:.0f} KiB, Opus artifact {len(packets) / 1024:.0f} KiB")
+        print(f"{'streams':>8} | {'PCM+encode ms/stream-s':>22} | {'pre-encoded ms/stream-s':>23} | {'speedup':>7}")
+        for streams in args.streams:
+            pcm_cpu = run_streams(lambda: MmapPCMAudio(pcm_path), streams, encode=True)
+            opus_cpu = run_streams(lambda: MmapOpusAudio(opus_path), streams, encode=False)
+            stream_seconds = streams * args.seconds
+            pcm_ms = pcm_cpu * 1000 / stream_seconds
+            opus_ms = opus_cpu * 1000 / stream_seconds
+            speedup = pcm_ms / opus_ms if opus_ms else float('inf')
+            print(f"{streams:>8} | {pcm_ms:>22.3f} | {opus_ms:>23.3f} | {speedup:>6.0f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -13,6 +13,8 @@ from typing import Dict, Any
 import config # Bot config, paths, constants
 import data_manager # Functions to load/save data
 from core.playback_manager import PlaybackManager # Handles audio queues and playback
+from core.tts_clip_cache import TTSClipCache # Cached TTS join announcements
+from core.tts_engine import TTSEngine # Shared Edge-TTS synthesis for /tts and joins
 from utils import file_helpers # For ensure_dir and initial checks
 
 # --- Logging Setup ---
@@ -136,6 +138,8 @@ bot.guild_leave_timers: Dict[int, asyncio.Task[Any]] = {} # Initialize timer dic
 bot.config = config # Attach config module
 bot.playback_manager = PlaybackManager(bot) # Instantiate and attach PlaybackManager
 log.info("PlaybackManager initialized.")
+bot.tts_engine = TTSEngine()
+bot.tts_clip_cache = TTSClipCache(bot.playback_manager.sound_cache) # Reuses rendered clips across joins
 
 # --- Load Cogs ---
 log.info("Loading Cogs...")
@@ -174,4 +178,11 @@ if __name__ == "__main__":
     except Exception as e:
         log.critical(f"FATAL RUNTIME ERROR: {e}", exc_info=True)
     finally:
+        bot.playback_manager.audio_service.shutdown()
+        bot.playback_manager.sound_metadata.close()
+        data_manager.flush_all() # Pending user/guild config changes
+        bot.tts_clip_cache.flush()
+        file_helpers.sound_library.stop_watching()
+        bot.tts_engine.log_stats()
+        bot.playback_manager.join_latency.log_stats()
         log.info("Bot process has ended.")
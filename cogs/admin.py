@@ -36,14 +36,14 @@ class AdminCog(commands.Cog):
         new_setting = not current_setting
 
         self.guild_settings.setdefault(guild_id_str, {})['stay_in_channel'] = new_setting
-        data_manager.save_guild_settings(self.guild_settings) # Save updated settings
+        data_manager.save_guild_settings(self.guild_settings, guild_id_str) # Save updated settings
 
         status_message = "ENABLED ✅ (Bot will now stay in VC when idle)" if new_setting else "DISABLED ❌ (Bot will now leave VC after being idle and alone)"
         await ctx.followup.send(f"Bot 'Stay in Channel' feature is now **{status_message}** for this server.", ephemeral=True)
         log.info(f"Guild {ctx.guild.name} ({guild_id_str}) 'stay_in_channel' set to {new_setting} by {admin.name}")
 
         # Trigger timer logic based on new setting
-        vc = discord.utils.get(self.bot.voice_clients, guild__id=guild_id)
+        vc = self.bot.playback_manager.get_voice_client(guild_id)
         if vc and vc.is_connected():
             if new_setting:
                 voice_helpers.cancel_leave_timer(self.bot, guild_id, reason="togglestay enabled")
@@ -70,7 +70,7 @@ class AdminCog(commands.Cog):
             return
 
         log.info(f"COMMAND: /leave invoked by {user.name} ({user.id}) in guild {guild.name} ({guild.id})")
-        vc = discord.utils.get(self.bot.voice_clients, guild=guild)
+        vc = guild.voice_client
 
         if vc and vc.is_connected():
             channel_name = vc.channel.name if vc.channel else "Unknown Channel"
@@ -86,7 +86,8 @@ class AdminCog(commands.Cog):
     # --- Public Sound Removal ---
     async def public_sound_autocomplete(self, ctx: discord.AutocompleteContext) -> list[discord.OptionChoice]:
         """Autocomplete for public sounds."""
-        return await file_helpers._generic_sound_autocomplete(ctx, file_helpers.get_public_sound_files)
+        names = file_helpers.search_public_sounds(ctx.value or "", limit=25) # Discord limit
+        return [discord.OptionChoice(name=name if len(name) <= 100 else name[:97] + "...", value=name) for name in names]
 
     # --- Error Handlers for Admin Commands ---
     @togglestay.error
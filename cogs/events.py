@@ -4,6 +4,7 @@ import discord
 from discord.ext import commands
 import logging
 import os
+import time
 import asyncio
 from typing import Optional, Any # Added Any for QueueItemType consistency if needed
 
@@ -18,13 +19,16 @@ from core.playback_manager import PlaybackManager, PlaybackMode # Import Enum to
 try:
     import edge_tts
     # Check pydub too, as it's needed for processing TTS output if normalization/trimming is desired later
-    # Note: Current TTS generation saves directly, processing happens in playback_manager.play_next
+    # Note: Synthesis goes through bot.tts_engine; clips are rendered like any sound when played
     TTS_READY = config.EDGE_TTS_AVAILABLE
 except ImportError:
     TTS_READY = False
 
 log = logging.getLogger('SoundBot.Cog.Events')
 
+# Voice IDs a user's saved TTS voice is checked against on every join; built once, the list is fixed at startup
+VALID_TTS_VOICES = frozenset(choice.value for choice in config.FULL_EDGE_TTS_VOICE_CHOICES)
+
 class EventsCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
@@ -62,6 +66,16 @@ class EventsCog(commands.Cog):
         log.info(f"Loaded {len(user_config)} user configs.")
         log.info(f"Loaded {len(guild_settings)} guild settings.")
         log.info(f"Sound Bot is operational. Monitoring {len(self.bot.guilds)} guilds.")
+        # Measure sounds uploaded before the metadata index existed (no-op if already running or done)
+        self.playback_manager.sound_metadata.start_backfill([config.USER_SOUNDS_DIR, config.PUBLIC_SOUNDS_DIR])
+        file_helpers.sound_library.start_watching([config.USER_SOUNDS_DIR, config.PUBLIC_SOUNDS_DIR])
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        """Drops a cached TTS join announcement when the member's display name changes."""
+        if before.display_name != after.display_name and not after.bot:
+            log.debug(f"EVENT: Display name of {after.id} changed ('{before.display_name}' -> '{after.display_name}').")
+            self.bot.tts_clip_cache.invalidate_user(after.id, after.guild.id)
 
     @commands.Cog.listener()
     async def on_voice_state_update(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
@@ -74,11 +88,12 @@ class EventsCog(commands.Cog):
 
         # --- User Joins/Moves into a Channel ---
         if not member.bot and after.channel and before.channel != after.channel:
+            event_at = time.monotonic() # Start of the join announcement latency budget
             channel_to_join = after.channel
             user_display_name = member.display_name
             log.info(f"EVENT: User {user_display_name} ({user_id_str}) entered {channel_to_join.name} in {guild.name}")
 
-            vc = discord.utils.get(self.bot.voice_clients, guild__id=guild_id)
+            vc = self.playback_manager.get_voice_client(guild_id)
 
             # If bot is already in the channel the user joined, cancel leave timer
             if vc and vc.is_connected() and vc.channel == channel_to_join:
@@ -87,7 +102,7 @@ class EventsCog(commands.Cog):
 
             # --- Determine Join Sound/TTS ---
             sound_path: Optional[str] = None
-            is_temp_sound = False # Track if the sound file is temporary (TTS)
+            is_temp_sound = False # Join sounds and cached TTS clips are both persistent files
             use_tts_join = False # Flag to indicate if TTS fallback is needed
 
             # Safely access user configurations from the bot instance
@@ -107,74 +122,49 @@ class EventsCog(commands.Cog):
                      log.info(f"SOUND: Using configured join sound: '{os.path.basename(sound_path)}' for {user_display_name}")
                  else:
                      log.warning(f"SOUND: Configured join sound file '{join_sound_filename}' (expected base: '{base_name_to_search}', found path: {potential_path}) not found or inaccessible for {user_display_name}. Removing broken entry.")
+                     if potential_path: file_helpers.sound_library.remove(potential_path) # Deleted behind the library's back
                      # Remove the broken entry directly from user_config if it exists
                      if user_config and 'join_sound' in user_config:
                          del user_config['join_sound']
                          # Consider removing the user entry if it's now completely empty
                          # if not user_config:
                          #     user_config_all.pop(user_id_str, None)
-                         data_manager.save_config(user_config_all) # Save changes
+                         data_manager.save_config(user_config_all, user_id_str) # Save changes
                      use_tts_join = True # Fallback to TTS
             else:
                  # No custom sound configured in the first place
                  use_tts_join = True
                  log.info(f"SOUND: No custom join sound configured for {user_display_name}. Using TTS join.")
 
-            # 2. Generate TTS if needed (fallback or default)
+            # 2. TTS join announcement if needed (fallback or default), cached per (text, voice)
             if use_tts_join:
                  if TTS_READY:
-                      # Ensure sounds dir exists (safer check)
-                      file_helpers.ensure_dir(config.SOUNDS_DIR)
-                      # Generate a unique temp filename
-                      tts_filename = f"tts_join_{member.id}_{os.urandom(4).hex()}.mp3"
-                      tts_path = os.path.join(config.SOUNDS_DIR, tts_filename)
-                      log.info(f"TTS JOIN: Generating for {user_display_name} ('{tts_filename}')...")
-
-                      try:
-                           # Get TTS defaults safely
-                           tts_defaults = user_config.get("tts_defaults", {}) if user_config else {}
-                           tts_voice = tts_defaults.get("voice", config.DEFAULT_TTS_VOICE)
-
-                           # Validate voice
-                           if not any(v.value == tts_voice for v in config.FULL_EDGE_TTS_VOICE_CHOICES):
-                                log.warning(f"TTS JOIN: Invalid voice '{tts_voice}' configured for user {user_id_str}. Falling back to bot default '{config.DEFAULT_TTS_VOICE}'.")
-                                tts_voice = config.DEFAULT_TTS_VOICE
-
-                           log.debug(f"TTS JOIN: Using voice: {tts_voice}")
-
-                           original_name = user_display_name
-                           normalized_name = text_helpers.normalize_for_tts(original_name)
-                           # Ensure text_to_speak is not empty after normalization
-                           text_to_speak = f"{normalized_name} joined" if normalized_name.strip() else "Someone joined"
-
-                           if original_name != normalized_name:
-                                log.info(f"TTS JOIN: Normalized Name: '{original_name}' -> '{normalized_name}'")
-                           log.info(f"TTS JOIN: Final Text to Speak: '{text_to_speak}'")
-
-                           # Generate TTS audio
-                           communicate = edge_tts.Communicate(text_to_speak, tts_voice)
-                           await communicate.save(tts_path)
-
-                           # Verify file creation and size
-                           if not os.path.exists(tts_path) or os.path.getsize(tts_path) == 0:
-                                raise RuntimeError(f"Edge-TTS failed to create a non-empty file: {tts_path}")
-
-                           log.info(f"TTS JOIN: Successfully saved TTS file '{tts_filename}'")
-                           sound_path = tts_path
-                           is_temp_sound = True
-
-                      except Exception as e:
-                           log.error(f"TTS JOIN: Failed generation for {user_display_name} (voice={tts_voice}): {e}", exc_info=True)
-                           sound_path = None # Ensure sound_path is None on failure
-                           # Cleanup failed temp file if it exists
-                           if os.path.exists(tts_path):
-                                try: os.remove(tts_path); log.debug(f"Cleaned up failed temporary TTS file: {tts_path}")
-                                except OSError as del_err: log.warning(f"TTS JOIN: Could not clean up failed temporary file '{tts_path}': {del_err}")
+                      # Get TTS defaults safely
+                      tts_defaults = user_config.get("tts_defaults", {}) if user_config else {}
+                      tts_voice = tts_defaults.get("voice", config.DEFAULT_TTS_VOICE)
+
+                      # Validate voice
+                      if tts_voice not in VALID_TTS_VOICES:
+                           log.warning(f"TTS JOIN: Invalid voice '{tts_voice}' configured for user {user_id_str}. Falling back to bot default '{config.DEFAULT_TTS_VOICE}'.")
+                           tts_voice = config.DEFAULT_TTS_VOICE
+
+                      original_name = user_display_name
+                      normalized_name = text_helpers.normalize_for_tts(original_name)
+                      # Ensure text_to_speak is not empty after normalization
+                      text_to_speak = f"{normalized_name} joined" if normalized_name.strip() else "Someone joined"
+
+                      if original_name != normalized_name:
+                           log.info(f"TTS JOIN: Normalized Name: '{original_name}' -> '{normalized_name}'")
+                      log.info(f"TTS JOIN: Text to Speak: '{text_to_speak}' (voice={tts_voice})")
+
+                      sound_path = await self.bot.tts_clip_cache.get_or_create(member.id, guild_id, text_to_speak, tts_voice, self.bot.tts_engine.synthesize)
+                      if not sound_path:
+                           log.error(f"TTS JOIN: Failed generation for {user_display_name} (voice={tts_voice}).")
                  else:
                       log.error(f"TTS JOIN: Cannot generate for {user_display_name}, TTS prerequisites (edge-tts) not available.")
                       sound_path = None
 
-            # --- Queue the sound if found/generated ---
+            # --- Play the sound if found/generated ---
             if sound_path:
                 # Check bot permissions in the target channel BEFORE queueing
                 bot_perms = channel_to_join.permissions_for(guild.me)
@@ -186,34 +176,16 @@ class EventsCog(commands.Cog):
                         except OSError: pass
                     return # Don't queue if we can't join/speak
 
-                # --- Use PlaybackManager's queue ---
-                # Tuple format: (member, sound_path, is_temp_tts)
-                join_queue_item = (member, sound_path, is_temp_sound)
-
-                # Add to the playback manager's queue
-                queue_pos = await self.playback_manager.add_to_queue(guild_id, join_queue_item)
-                log.info(f"Queued join sound for {user_display_name} (Position: {queue_pos}, Temp: {is_temp_sound})")
-
-                # Ensure the bot is in the correct channel (or connects)
-                # Use the playback manager's helper for this. Pass None for interaction.
-                vc_ready = await self.playback_manager.ensure_voice_client(None, channel_to_join, action_type="JOIN SOUND")
-
-                # If VC is ready, ensure playback starts if idle
-                # add_to_queue and ensure_voice_client might already trigger this,
-                # but calling start_playback_if_idle is safe as it has internal checks.
-                if vc_ready:
-                     log.debug(f"VC ready for {guild.name}, ensuring playback check occurs.")
-                     await self.playback_manager.start_playback_if_idle(guild_id)
-                else:
-                     log.error(f"Failed to ensure voice client for join sound in {channel_to_join.name}. Sound remains queued for {user_display_name}.")
-                     # Note: Sound is queued. It might play later if bot connects successfully.
+                # --- Priority lane: skips the music queue, drops the sound if the member has left ---
+                # Connects/moves the bot itself, rendering the sound meanwhile
+                await self.playback_manager.announce_join(member, channel_to_join, sound_path, is_temp_sound, event_at)
 
             else:
                  log.info(f"SOUND/TTS JOIN: Could not find or generate a sound for {user_display_name}. Skipping playback.")
 
         # --- User Leaves/Moves Out ---
         elif not member.bot and before.channel and before.channel != after.channel:
-            vc = discord.utils.get(self.bot.voice_clients, guild__id=guild_id)
+            vc = self.playback_manager.get_voice_client(guild_id)
             # If the user left the bot's current channel
             if vc and vc.is_connected() and vc.channel == before.channel:
                 log.info(f"EVENT: User {member.display_name} left bot's channel ({before.channel.name}). Checking if bot should leave.")
@@ -222,7 +194,7 @@ class EventsCog(commands.Cog):
                 async def delayed_leave_check():
                      await asyncio.sleep(1.5) # Slightly longer delay?
                      # Re-fetch VC state inside the delayed task
-                     current_vc = discord.utils.get(self.bot.voice_clients, guild__id=guild_id)
+                     current_vc = self.playback_manager.get_voice_client(guild_id)
                      # Check if bot is still in the *same* channel user left from
                      if current_vc and current_vc.is_connected() and current_vc.channel == before.channel:
                           log.debug(f"Running delayed leave check for {before.channel.name}")
@@ -250,11 +222,6 @@ class EventsCog(commands.Cog):
                 self.playback_manager.guild_queues.pop(guild_id, None)
                 if hasattr(self.playback_manager, 'playback_mode'):
                      self.playback_manager.playback_mode[guild_id] = PlaybackMode.IDLE
-                if hasattr(self.playback_manager, 'active_single_buffers'):
-                     buffer = self.playback_manager.active_single_buffers.pop(guild_id, None)
-                     if buffer and not buffer.closed:
-                         try: buffer.close()
-                         except Exception: pass
 
             # Bot Moved Channels
             elif before.channel and after.channel and before.channel != after.channel:
@@ -262,7 +229,7 @@ class EventsCog(commands.Cog):
                 # Cancel timer associated with the *old* channel state
                 voice_helpers.cancel_leave_timer(self.bot, guild_id, reason="bot moved channels")
                 # Check if should start timer in *new* channel if idle
-                vc = discord.utils.get(self.bot.voice_clients, guild__id=guild_id)
+                vc = self.playback_manager.get_voice_client(guild_id)
                 if vc and vc.is_connected() and not self.playback_manager.is_playing(guild_id):
                     log.debug("Bot moved and is idle, starting leave timer check for new channel.")
                     await voice_helpers.start_leave_timer(self.bot, vc)
@@ -271,7 +238,7 @@ class EventsCog(commands.Cog):
             elif not before.channel and after.channel:
                 log.info(f"EVENT: Bot connected to {after.channel.name} in {guild.name}.")
                 # Start timer check if connected idle (less common, usually connects to play)
-                vc = discord.utils.get(self.bot.voice_clients, guild__id=guild_id)
+                vc = self.playback_manager.get_voice_client(guild_id)
                 if vc and vc.is_connected() and not self.playback_manager.is_playing(guild_id):
                     # Only start timer if mode is IDLE, otherwise playback is expected
                     if self.playback_manager.playback_mode.get(guild_id, PlaybackMode.IDLE) == PlaybackMode.IDLE:
@@ -79,7 +79,7 @@ async def setjoinsound(
     user_config['join_sound'] = sound_filename # Store filename with extension
 
     # Save the configuration
-    data_manager.save_config(self.bot.user_sound_config)
+    data_manager.save_config(self.bot.user_sound_config, user_id_str)
 
     log.info(f"{log_prefix} Successfully set join sound to '{sound_filename}'.")
     await ctx.followup.send(
@@ -113,7 +113,7 @@ async def removejoinsound(self, ctx: discord.ApplicationContext):
         #         log.info(f"{log_prefix} Removed empty user config entry.")
 
         # Save the configuration
-        data_manager.save_config(self.bot.user_sound_config)
+        data_manager.save_config(self.bot.user_sound_config, user_id_str)
 
         await ctx.followup.send(
             f"🗑️ Your custom join sound has been removed.\n"
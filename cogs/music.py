@@ -6,8 +6,7 @@ import logging
 import asyncio
 import os
 import yt_dlp
-from functools import partial
-from typing import Optional, List, Dict, Any, Union
+from typing import Optional, List, Dict, Any, Union, Set
 import datetime
 import time
 from dataclasses import dataclass, field
@@ -18,6 +17,10 @@ from core.music_types import MusicQueueItem, DownloadStatus
 
 import config # Import your config module
 from core.playback_manager import PlaybackManager
+from core.download_scheduler import DownloadScheduler
+from core.music_cache import MusicCache
+from core.music_metadata import MusicMetadataCache
+from core.ytdl_pool import YTDLPool
 from utils import file_helpers
 
 log = logging.getLogger('SoundBot.Cog.Music')
@@ -25,8 +28,6 @@ log = logging.getLogger('SoundBot.Cog.Music')
 # --- Configuration (ensure these match your config.py or adjust as needed) ---
 CACHE_DIR = getattr(config, 'MUSIC_CACHE_DIR', 'music_cache')
 CACHE_TTL_SECONDS = getattr(config, 'MUSIC_CACHE_TTL_DAYS', 30) * 86400 # Default 30 days
-DOWNLOAD_AHEAD_COUNT = getattr(config, 'MUSIC_DOWNLOAD_AHEAD', 2) # How many songs ahead to download
-DOWNLOAD_CHECK_INTERVAL_SECONDS = getattr(config, 'MUSIC_DOWNLOAD_INTERVAL', 5) # Check queue every 5s
 CLEANUP_CHECK_INTERVAL_SECONDS = getattr(config, 'MUSIC_CLEANUP_INTERVAL', 3600) # Check cache every hour
 YTDL_MAX_DURATION = getattr(config, 'YTDL_MAX_DURATION', 600) # Max duration in seconds (default 10 mins)
 YTDL_MAX_FILESIZE = getattr(config, 'YTDL_MAX_FILESIZE_MB', 50) * 1024 * 1024 # Max filesize in MB
@@ -69,33 +70,36 @@ class MusicCog(commands.Cog):
             log.critical("PlaybackManager not found on bot. MusicCog requires it to be initialized first.")
             raise RuntimeError("PlaybackManager not found on bot.")
         self.playback_manager: PlaybackManager = bot.playback_manager
-        self._downloader_task_instance = self.downloader_task.start()
+        self.ytdl_pool = YTDLPool(YTDL_OPTS) # Long-lived YoutubeDL instances on their own threads
+        # Dedupes downloads across guilds and keeps music_cache/ under its size budget
+        self.music_cache = MusicCache(self._download_audio, CACHE_DIR, protected_paths_func=self._active_cache_paths)
+        self.download_scheduler = DownloadScheduler(self.playback_manager, self.music_cache.get)
+        self.metadata_cache = MusicMetadataCache(self._extract_info) # Resolved /play and /insert queries
+        # Downloads start as soon as the queue changes; nothing polls while shards are idle
+        self.playback_manager.add_queue_listener(self._on_queue_changed)
         self._cleanup_task_instance = self.cache_cleanup_task.start()
-        log.info(f"MusicCog initialized. Downloader interval: {DOWNLOAD_CHECK_INTERVAL_SECONDS}s, Cleanup interval: {CLEANUP_CHECK_INTERVAL_SECONDS}s, Cache TTL: {CACHE_TTL_SECONDS}s")
+        log.info(f"MusicCog initialized. Cleanup interval: {CLEANUP_CHECK_INTERVAL_SECONDS}s, Cache TTL: {CACHE_TTL_SECONDS}s")
 
     def cog_unload(self):
         """Cog cleanup."""
-        if self._downloader_task_instance:
-            self._downloader_task_instance.cancel()
+        self.playback_manager.remove_queue_listener(self._on_queue_changed)
         if self._cleanup_task_instance:
             self._cleanup_task_instance.cancel()
+        self.download_scheduler.close()
+        self.music_cache.close()
+        self.metadata_cache.close()
+        self.ytdl_pool.shutdown()
         log.info("MusicCog background tasks cancelled.")
 
+    def _on_queue_changed(self, guild_id: int, reason: str):
+        log.debug(f"Queue changed for GID {guild_id} ({reason}). Waking download scheduler.")
+        self.download_scheduler.wake()
+
     async def _extract_info(self, query: str) -> Optional[Dict[str, Any]]:
-        """Runs yt-dlp extract_info in executor."""
+        """Runs yt-dlp extract_info on the yt-dlp worker pool."""
         log.debug(f"Running yt-dlp info extraction for: {query[:100]}")
         try:
-            # Create a fresh YTDL instance each time to potentially avoid state issues
-            ytdl_opts_copy = YTDL_OPTS.copy()
-            # Ensure postprocessor uses a standard key name recognised by yt-dlp
-            for pp in ytdl_opts_copy.get('postprocessors', []):
-                 if 'key' not in pp and 'processor_name' in pp: # Handle older key name if needed
-                     pp['key'] = pp.pop('processor_name')
-
-            ydl_instance = yt_dlp.YoutubeDL(ytdl_opts_copy)
-            partial_func = partial(ydl_instance.extract_info, query, download=False)
-            loop = asyncio.get_running_loop()
-            data = await loop.run_in_executor(None, partial_func)
+            data = await self.ytdl_pool.run(lambda ydl: ydl.extract_info(query, download=False))
 
             if not data:
                 log.warning(f"yt-dlp extract_info returned no data for query: {query[:100]}")
@@ -135,7 +139,7 @@ class MusicCog(commands.Cog):
             return None
 
     async def _download_audio(self, video_info: Dict[str, Any]) -> Optional[str]:
-        """Downloads audio using yt-dlp info in executor. Returns file path or None."""
+        """Downloads audio using yt-dlp info on the yt-dlp worker pool. Returns file path or None."""
         url = video_info.get('webpage_url') or video_info.get('original_url') or video_info.get('url')
         title = video_info.get('title', 'Unknown Title')
         if not url:
@@ -145,47 +149,36 @@ class MusicCog(commands.Cog):
         log.info(f"Attempting download for: '{title[:70]}' ({url})")
         try:
             # Use a separate function to run the blocking download
-            def download_sync(url_to_download, opts):
-                log.debug(f"Download sync starting for '{title[:70]}' in executor thread.")
-                # Create a fresh instance for download too
-                opts_copy = opts.copy()
-                for pp in opts_copy.get('postprocessors', []):
-                    if 'key' not in pp and 'processor_name' in pp:
-                        pp['key'] = pp.pop('processor_name')
-
-                with yt_dlp.YoutubeDL(opts_copy) as ydl:
-                    # We pass download=True here
-                    info = ydl.extract_info(url_to_download, download=True)
-                    # prepare_filename needs the *info* dictionary returned by extract_info
-                    downloaded_path = ydl.prepare_filename(info)
-
-                    # Sometimes the actual path is nested if post-processing occurred
-                    if 'requested_downloads' in info and info['requested_downloads']:
-                        actual_filepath = info['requested_downloads'][0].get('filepath')
-                        if actual_filepath and os.path.exists(actual_filepath):
-                             downloaded_path = actual_filepath
-                             log.debug(f"Using path from 'requested_downloads': {downloaded_path}")
-                        else:
-                             log.warning(f"Path in 'requested_downloads' invalid ({actual_filepath}), falling back to prepared: {downloaded_path}")
-                    elif 'filepath' in info: # Fallback check
-                         if os.path.exists(info['filepath']):
-                              downloaded_path = info['filepath']
-                              log.debug(f"Using path from 'filepath': {downloaded_path}")
-                         else:
-                              log.warning(f"Path in 'filepath' invalid ({info['filepath']}), falling back to prepared: {downloaded_path}")
+            def download_sync(ydl: yt_dlp.YoutubeDL, url_to_download: str):
+                log.debug(f"Download sync starting for '{title[:70]}' in yt-dlp worker thread.")
+                # We pass download=True here
+                info = ydl.extract_info(url_to_download, download=True)
+                # prepare_filename needs the *info* dictionary returned by extract_info
+                downloaded_path = ydl.prepare_filename(info)
+
+                # Sometimes the actual path is nested if post-processing occurred
+                if 'requested_downloads' in info and info['requested_downloads']:
+                    actual_filepath = info['requested_downloads'][0].get('filepath')
+                    if actual_filepath and os.path.exists(actual_filepath):
+                         downloaded_path = actual_filepath
+                         log.debug(f"Using path from 'requested_downloads': {downloaded_path}")
+                    else:
+                         log.warning(f"Path in 'requested_downloads' invalid ({actual_filepath}), falling back to prepared: {downloaded_path}")
+                elif 'filepath' in info: # Fallback check
+                     if os.path.exists(info['filepath']):
+                          downloaded_path = info['filepath']
+                          log.debug(f"Using path from 'filepath': {downloaded_path}")
+                     else:
+                          log.warning(f"Path in 'filepath' invalid ({info['filepath']}), falling back to prepared: {downloaded_path}")
 
 
                 log.debug(f"Download sync finished for '{title[:70]}'. Determined path: {downloaded_path}")
                 return downloaded_path
 
-            partial_func = partial(download_sync, url, YTDL_OPTS)
-            loop = asyncio.get_running_loop()
-            final_path = await loop.run_in_executor(None, partial_func)
+            final_path = await self.ytdl_pool.run(download_sync, url)
 
             if final_path and os.path.exists(final_path):
                 log.info(f"Download successful: '{title[:70]}' -> '{os.path.basename(final_path)}'")
-                # Update the modification time to keep it from being cleaned up immediately
-                os.utime(final_path, None)
                 return final_path
             else:
                 log.error(f"Download finished for '{title[:70]}' but could not confirm final file path or file doesn't exist. Determined path: {final_path}")
@@ -201,212 +194,33 @@ class MusicCog(commands.Cog):
             log.error(f"Unexpected error during yt-dlp download of '{title[:70]}': {e}", exc_info=True)
             return None
 
-    @tasks.loop(seconds=DOWNLOAD_CHECK_INTERVAL_SECONDS)
-    async def downloader_task(self):
-        log.debug(f"[Downloader Task Loop] ===== TASK ENTRY POINT =====") # ADDED: Top level marker
-        try:
-            log.debug("[Downloader Task Loop] Accessing playback_manager queues...") # ADDED: Before accessing queues
-            # Make sure we are accessing the correct dictionary
-            guild_queues_dict = self.playback_manager.guild_queues
-            active_guild_ids = list(guild_queues_dict.keys())
-            log.debug(f"[Downloader Task Loop] Accessed queues. Active GIDs: {active_guild_ids}") # ADDED: After accessing queues
-
-            if not active_guild_ids:
-                log.debug("[Downloader Task Loop] No active guild queues found.")
-                # log.debug(f"[Downloader Task Loop] ===== TASK EXIT POINT (No Guilds) =====") # Keep exit log below in finally
-                return # Exit early if no guilds have queues
-
-            log.debug(f"[Downloader Task Loop] Checking guilds: {active_guild_ids}")
-
-            for guild_id in active_guild_ids:
-                log.debug(f"[Downloader Task Loop] Processing GID: {guild_id}")
-                # Get the specific queue for this guild
-                queue = guild_queues_dict.get(guild_id) # Use .get() for safety
-
-                if not queue: # Check if queue is None or empty
-                    log.debug(f"[Downloader Task Loop] Queue empty or None for GID: {guild_id}, skipping.")
-                    continue
-
-                items_to_download: List[MusicQueueItem] = []
-                currently_downloading = 0
-                items_pending_in_scope = 0
-
-                # Use slice to avoid modifying list while iterating if needed, though enumerate should be safe
-                for i, item in enumerate(list(queue)): # Iterate over a copy? or just ensure no mid-loop removal? enumerate is usually fine.
-                    log.debug(f"[Downloader Task Loop] GID {guild_id}: Examining item at index {i}. Type: {type(item).__name__}")
-                    # --- Add explicit isinstance check log ---
-                    is_music_item_instance = isinstance(item, MusicQueueItem)
-                    log.debug(f"[Downloader Task Loop] GID {guild_id}: Is instance of MusicQueueItem? {is_music_item_instance}")
-                    # --- End explicit check log ---
-
-                    if is_music_item_instance: # Use the variable here
-                         item_title_safe = getattr(item, 'title', 'Unknown Title')[:30]
-                         item_status = getattr(item, 'download_status', 'STATUS_MISSING') # Use getattr for safety
-                         log.debug(f"[Downloader Task Loop] GID {guild_id}: Item '{item_title_safe}...', Status: {item_status}")
-
-                         if item_status == DownloadStatus.PENDING:
-                            items_pending_in_scope += 1
-                            # Only consider downloading items near the front of the queue
-                            if i < DOWNLOAD_AHEAD_COUNT:
-                                log.debug(f"[Downloader Task Loop] GID {guild_id}: Found PENDING item '{item_title_safe}' at index {i}. Adding to download list.")
-                                items_to_download.append(item)
-                            else:
-                                log.debug(f"[Downloader Task Loop] GID {guild_id}: Found PENDING item '{item_title_safe}' at index {i}, but exceeds DOWNLOAD_AHEAD_COUNT ({DOWNLOAD_AHEAD_COUNT}).")
-                         elif item_status == DownloadStatus.DOWNLOADING:
-                            currently_downloading += 1
-                            log.debug(f"[Downloader Task Loop] GID {guild_id}: Item '{item_title_safe}' is currently DOWNLOADING.")
-                         # Implicitly skip READY and FAILED items in this section
-                    else:
-                        log.warning(f"[Downloader Task Loop] Found non-MusicQueueItem in queue for GID {guild_id} at index {i}. Type: {type(item).__name__}. Skipping.")
-                        continue # Skip to the next item in the queue
-
-                log.debug(f"[Downloader Task Loop] GID: {guild_id} - Found Pending (overall): {items_pending_in_scope}, To Download (in scope): {len(items_to_download)}, Currently Downloading: {currently_downloading}")
-
-                available_slots = max(0, DOWNLOAD_AHEAD_COUNT - currently_downloading)
-                if not items_to_download or available_slots <= 0:
-                    log.debug(f"[Downloader Task Loop] GID: {guild_id}: No items to download now (need {len(items_to_download)}, avail slots {available_slots}).")
-                    continue # Move to the next guild
-
-                log.debug(f"[Downloader Task Loop] GID: {guild_id}: Attempting to download up to {available_slots} items.")
-                for item_to_download in items_to_download[:available_slots]:
-                    # Double-check status before starting download in case it changed
-                    if item_to_download.download_status == DownloadStatus.PENDING:
-                        item_title_safe = getattr(item_to_download, 'title', 'Unknown Title')[:50]
-                        log.info(f"[Downloader] Guild {guild_id}: Identified pending item '{item_title_safe}...', starting download process.")
-                        item_to_download.download_status = DownloadStatus.DOWNLOADING
-                        try:
-                            log.debug(f"[Downloader] Guild {guild_id}: Calling _download_audio for '{item_title_safe}'...")
-                            download_path = await self._download_audio(item_to_download.video_info)
-                            log.debug(f"[Downloader] Guild {guild_id}: _download_audio finished for '{item_title_safe}'. Path: {download_path}")
-
-                            if download_path and os.path.exists(download_path):
-                                item_to_download.download_path = download_path
-                                item_to_download.download_status = DownloadStatus.READY
-                                log.info(f"[Downloader] Guild {guild_id}: Item '{item_title_safe}...' ready. Path: {download_path}")
-
-                                # Check if this newly ready item is now at the front and the bot is idle
-                                current_queue_after_download = self.playback_manager.get_queue(guild_id)
-                                if current_queue_after_download and current_queue_after_download[0] == item_to_download:
-                                    if not self.playback_manager.is_playing(guild_id):
-                                        log.info(f"[Downloader] Guild {guild_id}: First item '{item_title_safe}...' is ready and bot is idle, ensuring playback starts.")
-                                        # Use create_task to avoid blocking the downloader loop
-                                        self.bot.loop.create_task(self.playback_manager.start_playback_if_idle(guild_id))
-                                    else:
-                                        log.debug(f"[Downloader] Guild {guild_id}: First item '{item_title_safe}...' is ready, but bot is already playing.")
-                                else:
-                                     # Check if the first item is ready now, even if it wasn't the one just downloaded
-                                     if current_queue_after_download and isinstance(current_queue_after_download[0], MusicQueueItem) and current_queue_after_download[0].download_status == DownloadStatus.READY:
-                                          if not self.playback_manager.is_playing(guild_id):
-                                               log.info(f"[Downloader] Guild {guild_id}: Item '{item_title_safe}...' ready (not first), but first item *is* ready and bot idle. Triggering playback check.")
-                                               self.bot.loop.create_task(self.playback_manager.start_playback_if_idle(guild_id))
-
-                                     log.debug(f"[Downloader] Guild {guild_id}: Item '{item_title_safe}...' ready, but it's not the first item in the queue (or queue changed/first item not ready).")
-
-
-                            else:
-                                item_to_download.download_status = DownloadStatus.FAILED
-                                log.error(f"[Downloader] Guild {guild_id}: Failed to download item '{item_title_safe}...'. _download_audio returned invalid path or file missing: {download_path}")
-
-                        except Exception as download_err:
-                            log.error(f"[Downloader] Guild {guild_id}: Exception during download attempt for '{item_title_safe}': {download_err}", exc_info=True)
-                            # Ensure status is marked FAILED even if exception occurred mid-process
-                            if hasattr(item_to_download, 'download_status'):
-                                item_to_download.download_status = DownloadStatus.FAILED
-                    else:
-                        log.warning(f"[Downloader Task Loop] GID: {guild_id}: Item '{getattr(item_to_download, 'title', 'Unknown')[:30]}' found in download list but status was not PENDING ({getattr(item_to_download, 'download_status', 'N/A')}). Skipping.")
-
-            log.debug(f"[Downloader Task Loop] Finished processing guilds for this iteration.") # ADDED: Before the finally block
-
-        except asyncio.CancelledError:
-             log.info("[Downloader Task Loop] Task cancelled.")
-             raise # Re-raise cancellation
-        except Exception as e:
-            # Make the error log more prominent
-            log.error(f"[Downloader Task Loop] !!! EXCEPTION IN LOOP !!! Type: {type(e).__name__}, Error: {e}", exc_info=True) # MODIFIED: More visible error log
-        finally:
-            log.debug(f"[Downloader Task Loop] ===== TASK EXIT POINT (End of Iteration) =====") # ADDED: To confirm loop completion/exit
-
-    @downloader_task.before_loop
-    async def before_downloader_task(self):
-        log.debug("before_downloader_task: Waiting for bot to be ready...")
-        await self.bot.wait_until_ready()
-        log.info("Downloader task starting...")
+    def _active_cache_paths(self) -> Set[str]:
+        """Absolute paths of music files currently playing, queued as READY, or downloading."""
+        active_paths = set()
+        for guild_id, queue in self.playback_manager.guild_queues.items():
+            current_item = self.playback_manager.get_current_item(guild_id)
+            if current_item and isinstance(current_item, MusicQueueItem) and current_item.download_path:
+                active_paths.add(os.path.abspath(current_item.download_path))
+
+            for item in queue:
+                if isinstance(item, MusicQueueItem) and item.download_path:
+                    # Only protect files that are ready or currently being downloaded
+                    if item.download_status in [DownloadStatus.READY, DownloadStatus.DOWNLOADING]:
+                        active_paths.add(os.path.abspath(item.download_path))
+        return active_paths
 
     @tasks.loop(seconds=CLEANUP_CHECK_INTERVAL_SECONDS)
     async def cache_cleanup_task(self):
-        now = time.time()
-        log.info(f"[Cache Cleanup] Running scan of '{CACHE_DIR}'...")
-        removed_count = 0
-        removed_size = 0
-        active_paths = set()
-
-        # Collect paths of items currently playing or in the queue and marked as READY/DOWNLOADING
+        """Expires long-unplayed tracks. Works from the cache index, no directory scan."""
         try:
-             # Use .items() for direct access to keys and values
-             for guild_id, queue in self.playback_manager.guild_queues.items():
-                 current_item = self.playback_manager.get_current_item(guild_id)
-                 if current_item and isinstance(current_item, MusicQueueItem) and current_item.download_path:
-                     active_paths.add(os.path.abspath(current_item.download_path))
-
-                 for item in queue:
-                     if isinstance(item, MusicQueueItem) and item.download_path:
-                         # Only protect files that are ready or currently being downloaded
-                         if item.download_status in [DownloadStatus.READY, DownloadStatus.DOWNLOADING]:
-                             active_paths.add(os.path.abspath(item.download_path))
+            removed_count = self.music_cache.expire(CACHE_TTL_SECONDS) # Index changes are written behind
+            ytdl_stats = self.ytdl_pool.stats()
+            log.info(f"[yt-dlp Pool] Jobs: {ytdl_stats['jobs']}, Errors: {ytdl_stats['errors']}, Recycles: {ytdl_stats['recycles']}, "
+                     f"Wait avg/p95: {ytdl_stats['wait']['avg']:.2f}s/{ytdl_stats['wait']['p95']:.2f}s, "
+                     f"Work avg/p95: {ytdl_stats['work']['avg']:.2f}s/{ytdl_stats['work']['p95']:.2f}s")
+            log.debug(f"[Cache Cleanup] Finished. Expired {removed_count} files.")
         except Exception as e:
-             log.error(f"[Cache Cleanup] Error collecting active paths: {e}", exc_info=True)
-
-
-        log.debug(f"[Cache Cleanup] Found {len(active_paths)} potential active file paths.")
-
-        try:
-            if not os.path.isdir(CACHE_DIR):
-                 log.warning(f"[Cache Cleanup] Cache directory '{CACHE_DIR}' does not exist. Skipping scan.")
-                 return
-
-            for filename in os.listdir(CACHE_DIR):
-                file_path = os.path.join(CACHE_DIR, filename)
-                abs_file_path = os.path.abspath(file_path)
-
-                # Skip directories, only process files
-                if not os.path.isfile(file_path):
-                    continue
-
-                # Skip files that are currently active
-                if abs_file_path in active_paths:
-                    log.debug(f"[Cache Cleanup] Skipping active file: {filename}")
-                    continue
-
-                try:
-                    # Get the last modification time
-                    last_modified = os.path.getmtime(file_path)
-                    age = now - last_modified
-
-                    # Check if the file is older than the TTL
-                    if age > CACHE_TTL_SECONDS:
-                        log.info(f"[Cache Cleanup] Removing stale file: {filename} (Age: {age:.0f}s > {CACHE_TTL_SECONDS}s)")
-                        file_size = os.path.getsize(file_path)
-                        os.remove(file_path)
-                        removed_count += 1
-                        removed_size += file_size
-                    else:
-                         log.debug(f"[Cache Cleanup] Keeping file: {filename} (Age: {age:.0f}s <= {CACHE_TTL_SECONDS}s)")
-
-                except FileNotFoundError:
-                    # File might have been deleted between listdir and stat/remove
-                    log.warning(f"[Cache Cleanup] File not found during processing: {filename}")
-                    continue
-                except OSError as e:
-                    log.error(f"[Cache Cleanup] Error accessing/removing file {filename}: {e}")
-
-            if removed_count > 0:
-                log.info(f"[Cache Cleanup] Finished. Removed {removed_count} files (Total size: {removed_size / (1024*1024):.2f} MB).")
-            else:
-                log.info("[Cache Cleanup] Finished. No stale files found to remove.")
-
-        except Exception as e:
-            log.error(f"[Cache Cleanup] Unexpected error during cache scan: {e}", exc_info=True)
-
+            log.error(f"[Cache Cleanup] Unexpected error during cache cleanup: {e}", exc_info=True)
 
     @cache_cleanup_task.before_loop
     async def before_cleanup_task(self):
@@ -443,7 +257,7 @@ class MusicCog(commands.Cog):
         # Give feedback that searching has started
         await self.playback_manager._try_respond(ctx.interaction, f"🔎 Searching for `{query[:100]}...`", ephemeral=False)
 
-        video_info = await self._extract_info(query)
+        video_info = await self.metadata_cache.resolve(query)
 
         if not video_info:
              log.error(f"PLAY CMD (GID:{ctx.guild.id}): _extract_info returned None/empty for query '{query[:100]}'. Aborting add.")
@@ -461,6 +275,7 @@ class MusicCog(commands.Cog):
             text_channel_id=ctx.channel_id, # Store text channel for potential future use
             query=query, # Store original query
             video_info=video_info, # Store extracted info
+            music_cache=self.music_cache,
         )
 
         # NOW the log statement can access queue_item (Removed the problematic log as per previous step)
@@ -519,7 +334,7 @@ class MusicCog(commands.Cog):
             await ctx.followup.send("This command must be used in a server.", ephemeral=True); return
 
         guild_id = guild.id
-        vc = discord.utils.get(self.bot.voice_clients, guild__id=guild_id)
+        vc = self.playback_manager.get_voice_client(guild_id)
 
         if not vc or not vc.is_connected():
             await ctx.followup.send("I'm not connected to a voice channel.", ephemeral=True)
@@ -554,7 +369,7 @@ class MusicCog(commands.Cog):
         if not guild: await ctx.followup.send("This command must be used in a server.", ephemeral=True); return
 
         guild_id = guild.id
-        vc = discord.utils.get(self.bot.voice_clients, guild__id=guild_id)
+        vc = self.playback_manager.get_voice_client(guild_id)
 
         if not vc or not vc.is_connected():
             await ctx.followup.send("I'm not connected to a voice channel.", ephemeral=True); return
@@ -659,7 +474,9 @@ class MusicCog(commands.Cog):
             return
 
         index_to_remove = position - 1 # Convert 1-based position to 0-based index
-        removed_item = await self.playback_manager.remove_from_queue(guild_id, index_to_remove)
+        # Pin the item the user picked; if the queue advances before the lock is ours, it is still the one removed
+        item_id = self.playback_manager.get_queue_item_id(guild_id, index_to_remove)
+        removed_item = await self.playback_manager.remove_from_queue(guild_id, index_to_remove, item_id=item_id)
 
         if removed_item:
             title = "Item"
@@ -706,7 +523,7 @@ class MusicCog(commands.Cog):
         if not vc: return # Feedback sent by ensure_voice_client
 
         await self.playback_manager._try_respond(ctx.interaction, f"🔎 Searching for `{query[:100]}`...", ephemeral=False)
-        video_info = await self._extract_info(query)
+        video_info = await self.metadata_cache.resolve(query)
 
         if not video_info:
             log.error(f"INSERT CMD (GID:{guild_id}): _extract_info returned None/empty for query '{query[:100]}'. Aborting insert.")
@@ -722,6 +539,7 @@ class MusicCog(commands.Cog):
             text_channel_id=ctx.channel_id,
             query=query,
             video_info=video_info,
+            music_cache=self.music_cache,
         )
 
         insert_index = position - 1 # Convert 1-based position to 0-based index
@@ -12,30 +12,11 @@ from core.playback_manager import PlaybackManager # Optional for type hinting
 log = logging.getLogger('SoundBot.Cog.PublicSounds')
 
 # --- Autocomplete ---
-# Implement the logic directly here, similar to user_sound_autocomplete
 async def public_sound_autocomplete(ctx: discord.AutocompleteContext) -> List[discord.OptionChoice]:
-    """Autocomplete for public sounds."""
+    """Autocomplete for public sounds. Served from the in-memory sound library."""
     try:
-        sounds = file_helpers.get_public_sound_files() # Get list of public sound base names
-        current_value = ctx.value.lower() if ctx.value else ""
-
-        starts_with = []
-        contains = []
-        for name in sounds:
-            lower_name = name.lower()
-            display_name = name if len(name) <= 100 else name[:97] + "..." # Truncate if needed
-            # Check if starts with or contains the user's input
-            if lower_name.startswith(current_value):
-                starts_with.append(discord.OptionChoice(name=display_name, value=name))
-            elif current_value in lower_name:
-                contains.append(discord.OptionChoice(name=display_name, value=name))
-
-        # Sort for better presentation (starts_with first)
-        starts_with.sort(key=lambda c: c.name.lower())
-        contains.sort(key=lambda c: c.name.lower())
-
-        suggestions = (starts_with + contains)[:25] # Discord limit
-        return suggestions
+        names = file_helpers.search_public_sounds(ctx.value or "", limit=25) # Discord limit
+        return [discord.OptionChoice(name=name if len(name) <= 100 else name[:97] + "...", value=name) for name in names]
     except Exception as e:
         log.error(f"Error during public sound autocomplete for user {ctx.interaction.user.id}: {e}", exc_info=True)
         return []
@@ -59,12 +40,15 @@ class PublicSoundsCog(commands.Cog):
             await ctx.followup.send("No public sounds have been added yet. Users can use `/publishsound` to share their sounds.", ephemeral=True)
             return
 
+        durations = self.playback_manager.sound_metadata.durations_in_dir(config.PUBLIC_SOUNDS_DIR)
+
         # --- Pagination ---
         items_per_page = 15
         pages_content = []
         current_page_lines = []
         for i, name in enumerate(public_sounds):
-            current_page_lines.append(f"- `{name}`")
+            duration_ms = durations.get(name.lower())
+            current_page_lines.append(f"- `{name}`" + (f" ({duration_ms / 1000:.1f}s)" if duration_ms is not None else ""))
             if (i + 1) % items_per_page == 0 or i == len(public_sounds) - 1:
                 pages_content.append("\n".join(current_page_lines))
                 current_page_lines = []
@@ -149,6 +133,9 @@ class PublicSoundsCog(commands.Cog):
             deleted_filename = os.path.basename(public_path)
             os.remove(public_path)
             log.info(f"ADMIN ACTION: Deleted public sound file '{deleted_filename}' by {admin.name}.")
+            await self.playback_manager.audio_service.invalidate(public_path)
+            self.playback_manager.sound_metadata.remove(public_path)
+            file_helpers.sound_library.remove(public_path)
             await ctx.followup.send(f"🗑️ Public sound `{public_base_name}` deleted successfully.", ephemeral=True)
         except OSError as e:
             log.error(f"Admin {admin.name} failed to delete public sound '{public_path}': {e}", exc_info=True)
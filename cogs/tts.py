@@ -2,39 +2,35 @@
 import discord
 from discord.ext import commands
 import logging
-import io
-import math
 import asyncio # Import asyncio
 from typing import Optional, List, Dict, Any
 
 import config
 import data_manager
-from utils import text_helpers # For normalize_for_tts
+from utils import text_helpers, audio_processor # For normalize_for_tts / rendering buffered TTS
+from utils.search_index import SearchIndex
 from core.playback_manager import PlaybackManager # Can import this for type hinting if desired
+from core.audio_service import AudioBacklogFull
+from core.audio_sources import BufferedPCMAudio
+from core.tts_stream import StreamingTTSAudio, ffmpeg_path
 
-# Check TTS dependency
-try:
-    import edge_tts
-    from pydub import AudioSegment # Need pydub here too for processing TTS output
-    from pydub.exceptions import CouldntDecodeError
-    TTS_READY = config.EDGE_TTS_AVAILABLE and config.PYDUB_AVAILABLE
-except ImportError:
-    TTS_READY = False
+# Check TTS dependency (synthesis goes through bot.tts_engine; pydub renders the buffered path)
+TTS_READY = config.EDGE_TTS_AVAILABLE and config.PYDUB_AVAILABLE
 
 log = logging.getLogger('SoundBot.Cog.TTS')
 
+STREAMING_ENABLED = getattr(config, 'TTS_STREAMING_ENABLED', True)
+
 # --- Autocomplete ---
+# Built once; the voice list is fixed at startup. Searchable by display name and voice ID
+VOICE_INDEX = SearchIndex()
+for _choice in config.FULL_EDGE_TTS_VOICE_CHOICES:
+    VOICE_INDEX.add(_choice.value, texts=[_choice.name, _choice.value], payload=_choice)
+
 async def tts_voice_autocomplete(ctx: discord.AutocompleteContext) -> List[discord.OptionChoice]:
     """Autocomplete for Edge-TTS voices using the FULL pre-generated list from config."""
     try:
-        current_value = ctx.value.lower() if ctx.value else ""
-        # Filter the full list based on user input (checking both display name and value)
-        suggestions = [
-            choice for choice in config.FULL_EDGE_TTS_VOICE_CHOICES
-            if current_value in choice.name.lower() or current_value in choice.value.lower()
-        ]
-        # Limit to Discord's max suggestions
-        return suggestions[:25]
+        return VOICE_INDEX.search(ctx.value or "", limit=25) # Discord limit
     except Exception as e:
         log.error(f"Error during TTS voice autocomplete for user {ctx.interaction.user.id}: {e}", exc_info=True)
         return []
@@ -86,8 +82,10 @@ class TTSCog(commands.Cog):
         tts_defaults = user_config.setdefault('tts_defaults', {})
         # Set the voice
         tts_defaults['voice'] = voice
+        VOICE_INDEX.record_use(voice)
 
-        data_manager.save_config(self.bot.user_sound_config) # Save the changes
+        data_manager.save_config(self.bot.user_sound_config, user_id_str) # Save the changes
+        self.bot.tts_clip_cache.invalidate_user(author.id) # Join announcement changes voice
 
         await ctx.followup.send(
             f"✅ TTS default voice updated!\n"
@@ -119,7 +117,8 @@ class TTSCog(commands.Cog):
                     del self.bot.user_sound_config[user_id_str]
                     log.info(f"Removed empty user config entry for {author.name} after TTS default removal.")
 
-            data_manager.save_config(self.bot.user_sound_config) # Save changes
+            data_manager.save_config(self.bot.user_sound_config, user_id_str) # Save changes
+            self.bot.tts_clip_cache.invalidate_user(author.id) # Join announcement reverts to the default voice
 
             # Get display name for the bot's default voice
             default_voice_display = config.DEFAULT_TTS_VOICE
@@ -186,7 +185,7 @@ class TTSCog(commands.Cog):
         voice_source = "explicit" if voice is not None else ("saved default" if 'voice' in saved_defaults else "bot default")
 
         # Validate the final voice choice
-        is_valid_voice = any(choice.value == final_voice for choice in config.FULL_EDGE_TTS_VOICE_CHOICES)
+        is_valid_voice = final_voice in VOICE_INDEX
         if not is_valid_voice:
             log.warning(f"TTS: Invalid final voice '{final_voice}' ({voice_source}) selected for {user.name}. Falling back to default.")
             await ctx.followup.send(f"❌ Invalid voice ID (`{final_voice}`). Falling back to bot default.", ephemeral=True)
@@ -195,10 +194,10 @@ class TTSCog(commands.Cog):
             voice_source = "bot default (fallback)"
 
         log.info(f"TTS Final Voice Selection: {final_voice} (Source: {voice_source}) for {user.name}")
+        VOICE_INDEX.record_use(final_voice)
 
         # --- Prepare Text ---
-        audio_source: Optional[discord.PCMAudio] = None
-        pcm_fp: Optional[io.BytesIO] = None
+        audio_source: Optional[discord.AudioSource] = None
         try:
             original_message = message
             normalized_message = text_helpers.normalize_for_tts(original_message)
@@ -218,88 +217,38 @@ class TTSCog(commands.Cog):
                 await ctx.followup.send("❌ Message became empty after removing unsupported characters.", ephemeral=True)
                 return
 
-            # --- Generate TTS Audio (In Memory) ---
-            log.info(f"TTS: Generating audio with Edge-TTS for '{user.name}' (voice={final_voice})...")
-            mp3_bytes_list = []
-            communicate = edge_tts.Communicate(text_to_speak, final_voice)
-            async for chunk in communicate.stream():
-                if chunk["type"] == "audio":
-                    mp3_bytes_list.append(chunk["data"])
-
-            if not mp3_bytes_list:
-                raise ValueError("Edge-TTS generation yielded no audio data chunks.")
-
-            mp3_data = b"".join(mp3_bytes_list)
-            if len(mp3_data) == 0:
-                raise ValueError("Edge-TTS generation resulted in empty audio data.")
-
-            # --- Process TTS Audio with Pydub (Normalization, Format Conversion) ---
-            log.debug("TTS: Processing generated MP3 data with Pydub...")
-            with io.BytesIO(mp3_data) as mp3_fp:
-                seg = AudioSegment.from_file(mp3_fp, format="mp3")
-                log.debug(f"TTS: Loaded MP3 into Pydub (duration: {len(seg)}ms)")
-
-                # Trim if exceeds max duration
-                if len(seg) > config.MAX_PLAYBACK_DURATION_MS:
-                    log.info(f"TTS: Trimming audio from {len(seg)}ms to {config.MAX_PLAYBACK_DURATION_MS}ms.")
-                    seg = seg[:config.MAX_PLAYBACK_DURATION_MS]
-
-                # Normalize loudness
-                peak_dbfs = seg.max_dBFS
-                if not math.isinf(peak_dbfs) and peak_dbfs > -90.0:
-                    target_dbfs = config.TARGET_LOUDNESS_DBFS
-                    change_in_dbfs = target_dbfs - peak_dbfs
-                    gain_limit = 6.0 # Max +6dB gain
-                    apply_gain = min(change_in_dbfs, gain_limit) if change_in_dbfs > 0 else change_in_dbfs
-                    log.info(f"TTS AUDIO: Normalizing. Peak:{peak_dbfs:.2f} Target:{target_dbfs:.2f} ApplyGain:{apply_gain:.2f} dB.")
-                    if apply_gain != change_in_dbfs:
-                         log.info(f"TTS AUDIO: Gain limited to +{gain_limit}dB.")
-                    seg = seg.apply_gain(apply_gain)
-                elif math.isinf(peak_dbfs): log.warning("TTS AUDIO: Cannot normalize silent TTS audio.")
-                else: log.warning(f"TTS AUDIO: Skipping normalization for very quiet TTS audio (Peak: {peak_dbfs:.2f})")
-
-                # Convert to PCM S16 LE for Discord
-                seg = seg.set_frame_rate(48000).set_channels(2)
-                pcm_fp = io.BytesIO() # Keep pcm_fp in scope
-                seg.export(pcm_fp, format="s16le")
-                pcm_fp.seek(0)
-
-                if pcm_fp.getbuffer().nbytes == 0:
-                    raise ValueError("Pydub export resulted in empty PCM data.")
-
-                log.debug(f"TTS: PCM processed in memory ({pcm_fp.getbuffer().nbytes} bytes)")
-                audio_source = discord.PCMAudio(pcm_fp) # pcm_fp needs to be kept open until playback finishes!
-
-            log.info(f"TTS: PCMAudio source created successfully for {user.name}.")
+            # --- Streaming: start playing as soon as the first audio is decoded ---
+            if STREAMING_ENABLED:
+                audio_source = await self._start_streaming_source(text_to_speak, final_voice)
+                if audio_source:
+                    log.info(f"TTS: Streaming source ready for {user.name}; synthesis continues during playback.")
+
+            # --- Buffered: whole clip synthesized and normalized first (streaming off or failed to start) ---
+            if audio_source is None:
+                audio_source = await self._generate_buffered_source(guild_id, text_to_speak, final_voice)
+                log.info(f"TTS: PCMAudio source created successfully for {user.name}.")
 
         except Exception as e:
             err_type = type(e).__name__
             msg = f"❌ Error generating/processing TTS ({err_type})."
             # Provide more specific error messages based on exception type
             if isinstance(e, (ValueError, RuntimeError)) and "TTS" in str(e): msg = f"❌ Error generating TTS: {e}"
-            elif isinstance(e, CouldntDecodeError): msg = f"❌ Error processing TTS audio (Pydub): {e}"
+            elif isinstance(e, AudioBacklogFull): msg = "⏳ The bot is busy processing audio. Please try again in a moment."
             elif "trustchain" in str(e).lower() or "ssl" in str(e).lower(): msg = "❌ TTS Error: Secure connection issue. Try again later?"
             elif "voice not found" in str(e).lower(): msg = f"❌ Error: TTS service reported voice '{final_voice}' not found."
 
             await ctx.followup.send(msg, ephemeral=True)
             log.error(f"TTS: Failed generation/processing for {user.name} (Voice: {final_voice}): {e}", exc_info=True)
-            # Ensure buffer is closed on error
-            if pcm_fp and not pcm_fp.closed:
-                 try: pcm_fp.close()
-                 except Exception: pass
             return # Stop execution
 
         # --- Playback ---
-        if not audio_source or not pcm_fp: # Should be caught by the except block, but safety first
+        if not audio_source: # Should be caught by the except block, but safety first
             await ctx.followup.send("❌ Failed to prepare TTS audio source for playback.", ephemeral=True)
-            log.error("TTS: Audio source or PCM buffer was None before playback attempt.")
-            if pcm_fp and not pcm_fp.closed:
-                 try: pcm_fp.close()
-                 except Exception: pass
+            log.error("TTS: Audio source was None before playback attempt.")
             return
 
         # Use playback manager to handle VC connection and playing
-        # Pass the pre-generated source and the buffer that needs closing
+        # Sources release their own buffers/decoder in cleanup()
         target_channel = user.voice.channel # Re-affirm target channel
         voice_display_name = final_voice # Get display name for message
         for choice in config.FULL_EDGE_TTS_VOICE_CHOICES:
@@ -310,14 +259,45 @@ class TTSCog(commands.Cog):
         spell_note = " (spelled out)" if spell_out else ""
         playback_display_name = f"TTS{spell_note} w/ {voice_display_name}: \"{display_msg_truncated}\""
 
-        await self.playback_manager.play_audio_source_now(  # <--- MUST BE play_audio_source_now
+        started = await self.playback_manager.play_audio_source_now(  # <--- MUST BE play_audio_source_now
             interaction=ctx.interaction,
             audio_source=audio_source,
-            audio_buffer_to_close=pcm_fp, # Pass the buffer to be closed
             display_name=playback_display_name
         )
+        if not started:
+            audio_source.cleanup() # Stops the streaming decoder / frees the buffer
+            return
         log.info(f"TTS: Playback started for {user.name} in {target_channel.name} ({target_channel.id}).")
 
+    # --- Synthesis helpers ---
+    async def _start_streaming_source(self, text: str, voice: str) -> Optional[StreamingTTSAudio]:
+        """Returns a source that plays while Edge-TTS is still synthesizing, or None to use the buffered path."""
+        if not ffmpeg_path():
+            log.debug("TTS: ffmpeg not in PATH. Using buffered synthesis.")
+            return None
+        try:
+            source = StreamingTTSAudio(asyncio.get_running_loop())
+        except OSError as e:
+            log.warning(f"TTS: Could not start streaming decoder ({e}). Using buffered synthesis.")
+            return None
+        log.info(f"TTS: Streaming audio with Edge-TTS (voice={voice})...")
+        source.start_feeding(self.bot.tts_engine.stream(text, voice))
+        if await source.wait_ready():
+            return source
+        log.warning(f"TTS: Streaming produced no audio in time (voice={voice}). Falling back to buffered synthesis.")
+        source.cleanup()
+        return None
+
+    async def _generate_buffered_source(self, guild_id: int, text: str, voice: str) -> BufferedPCMAudio:
+        """Synthesizes the whole message and renders it like any other sound (trim, normalize). Raises on failure."""
+        log.info(f"TTS: Generating audio with Edge-TTS (voice={voice})...")
+        mp3_data = await self.bot.tts_engine.synthesize(text, voice)
+        pcm_data = await self.playback_manager.audio_service.submit(guild_id, audio_processor.render_pcm_data, mp3_data, "mp3", f"TTS ({voice})")
+        if not pcm_data:
+            raise RuntimeError("TTS audio could not be decoded or normalized.")
+        log.debug(f"TTS: PCM processed in memory ({len(pcm_data)} bytes)")
+        return BufferedPCMAudio(pcm_data)
+
 def setup(bot: commands.Bot):
     if not TTS_READY:
          log.warning("TTS Cog not loading: Missing edge-tts or pydub library.")
@@ -16,24 +16,10 @@ log = logging.getLogger('SoundBot.Cog.UserSounds')
 # --- Autocomplete Functions ---
 # (Autocomplete function remains the same)
 async def user_sound_autocomplete(ctx: discord.AutocompleteContext) -> List[discord.OptionChoice]:
-    """Autocomplete for the user's personal sounds."""
+    """Autocomplete for the user's personal sounds. Served from the in-memory sound library."""
     try:
-        user_id = ctx.interaction.user.id
-        sounds = file_helpers.get_user_sound_files(user_id)
-        current_value = ctx.value.lower() if ctx.value else ""
-        starts_with = []
-        contains = []
-        for name in sounds:
-            lower_name = name.lower()
-            display_name = name if len(name) <= 100 else name[:97] + "..."
-            if lower_name.startswith(current_value):
-                starts_with.append(discord.OptionChoice(name=display_name, value=name))
-            elif current_value in lower_name:
-                contains.append(discord.OptionChoice(name=display_name, value=name))
-        starts_with.sort(key=lambda c: c.name.lower())
-        contains.sort(key=lambda c: c.name.lower())
-        suggestions = (starts_with + contains)[:25] # Discord limit
-        return suggestions
+        names = file_helpers.search_user_sounds(ctx.interaction.user.id, ctx.value or "", limit=25) # Discord limit
+        return [discord.OptionChoice(name=name if len(name) <= 100 else name[:97] + "...", value=name) for name in names]
     except Exception as e:
         log.error(f"Error during user sound autocomplete for user {ctx.interaction.user.id}: {e}", exc_info=True)
         return []
@@ -66,13 +52,17 @@ class UserSoundsCog(commands.Cog):
             current_sounds = file_helpers.get_user_sound_files(user_id)
             if len(current_sounds) >= config.MAX_USER_SOUNDS_PER_USER: await ctx.followup.send(f"{followup_prefix}❌ Limit reached...", ephemeral=True); return
         file_extension = os.path.splitext(sound_file.filename)[1].lower(); final_filename = f"{clean_name}{file_extension}"; final_path = os.path.join(target_dir, final_filename)
-        success, error_msg = await file_helpers.validate_and_save_upload(ctx, sound_file, final_path, command_name="uploadsound")
+        success, error_msg = await file_helpers.validate_and_save_upload(ctx, sound_file, final_path, command_name="uploadsound", metadata_index=self.playback_manager.sound_metadata)
         if success:
             log.info(f"Sound validation successful for {author.name}, saved to '{final_path}' (personal)")
+            await self.playback_manager.audio_service.invalidate(final_path) # Content may have been replaced
+            file_helpers.sound_library.add(final_path)
+            self.playback_manager.audio_service.ingest(final_path) # Pre-render in the background; the reply below doesn't wait
             if replacing_personal and existing_personal_path and existing_personal_path != final_path:
                 if os.path.exists(existing_personal_path):
                     try: os.remove(existing_personal_path); log.info(f"Removed old file...")
                     except Exception as e: log.warning(f"Could not remove old file '{existing_personal_path}': {e}")
+                await self.playback_manager.audio_service.invalidate(existing_personal_path); self.playback_manager.sound_metadata.remove(existing_personal_path); file_helpers.sound_library.remove(existing_personal_path)
             action = "updated" if replacing_personal else "uploaded"
             msg = f"{followup_prefix}✅ Success! Personal sound `{clean_name}` {action}.\nUse `/playsound name:{clean_name}`..."
             await ctx.followup.send(msg, ephemeral=True)
@@ -84,9 +74,11 @@ class UserSoundsCog(commands.Cog):
         await ctx.defer(ephemeral=True); author = ctx.author; log.info(f"COMMAND: /mysounds by {author.name} ({author.id})")
         user_sounds = file_helpers.get_user_sound_files(author.id)
         if not user_sounds: await ctx.followup.send("No sounds yet...", ephemeral=True); return
+        durations = self.playback_manager.sound_metadata.durations_in_dir(os.path.join(config.USER_SOUNDS_DIR, str(author.id)))
         items_per_page = 15; pages_content = []; current_page_lines = []
         for i, name in enumerate(user_sounds):
-            current_page_lines.append(f"- `{name}`")
+            duration_ms = durations.get(name.lower())
+            current_page_lines.append(f"- `{name}`" + (f" ({duration_ms / 1000:.1f}s)" if duration_ms is not None else ""))
             if (i + 1) % items_per_page == 0 or i == len(user_sounds) - 1: pages_content.append("\n".join(current_page_lines)); current_page_lines = []
         embeds = []; total_sounds = len(user_sounds); num_pages = len(pages_content)
         for page_num, page_text in enumerate(pages_content):
@@ -106,7 +98,7 @@ class UserSoundsCog(commands.Cog):
         sound_base_name = os.path.splitext(os.path.basename(sound_path))[0]
         user_dir_abs = os.path.abspath(os.path.join(config.USER_SOUNDS_DIR, str(user_id))); resolved_path_abs = os.path.abspath(sound_path)
         if not resolved_path_abs.startswith(user_dir_abs + os.sep): log.critical(f"SECURITY ALERT: Path traversal..."); await ctx.followup.send("❌ Security error.", ephemeral=True); return
-        try: os.remove(sound_path); log.info(f"Deleted PERSONAL sound '{os.path.basename(sound_path)}' for {user_id}."); await ctx.followup.send(f"🗑️ Deleted `{sound_base_name}`.", ephemeral=True)
+        try: os.remove(sound_path); log.info(f"Deleted PERSONAL sound '{os.path.basename(sound_path)}' for {user_id}."); await self.playback_manager.audio_service.invalidate(sound_path); self.playback_manager.sound_metadata.remove(sound_path); file_helpers.sound_library.remove(sound_path); await ctx.followup.send(f"🗑️ Deleted `{sound_base_name}`.", ephemeral=True)
         except OSError as e: log.error(f"Failed delete: {e}", exc_info=True); await ctx.followup.send(f"❌ Failed delete: {type(e).__name__}.", ephemeral=True)
         except Exception as e: log.error(f"Unexpected error deleting: {e}", exc_info=True); await ctx.followup.send(f"❌ Unexpected error deleting `{sound_base_name}`.", ephemeral=True)
 
@@ -151,7 +143,7 @@ class UserSoundsCog(commands.Cog):
         if not public_base_name: await ctx.followup.send(f"❌ Invalid name...", ephemeral=True); return
         public_filename = f"{public_base_name}{source_ext}"; public_path = os.path.join(config.PUBLIC_SOUNDS_DIR, public_filename)
         if file_helpers.find_public_sound_path(public_base_name): await ctx.followup.send(f"❌ Public sound `{public_base_name}` exists.", ephemeral=True); return
-        try: file_helpers.ensure_dir(config.PUBLIC_SOUNDS_DIR); shutil.copy2(user_path, public_path); log.info(f"SOUND PUBLISHED..."); await ctx.followup.send(f"✅ Published `{public_base_name}`...", ephemeral=True)
+        try: file_helpers.ensure_dir(config.PUBLIC_SOUNDS_DIR); shutil.copy2(user_path, public_path); self.playback_manager.sound_metadata.copy(user_path, public_path); file_helpers.sound_library.add(public_path); log.info(f"SOUND PUBLISHED..."); await ctx.followup.send(f"✅ Published `{public_base_name}`...", ephemeral=True)
         except Exception as e: log.error(f"Failed publish: {e}", exc_info=True); await ctx.followup.send(f"❌ Failed publish: {type(e).__name__}.", ephemeral=True)
 
     # ==================================
@@ -234,18 +226,15 @@ class UserSoundboardView(discord.ui.View):
     def get_placeholder_id(self) -> Optional[str]: return self._placeholder_id
     def populate_buttons(self):
         user_dir = os.path.join(config.USER_SOUNDS_DIR, str(self.user_id)); log.debug(f"SOUNDPANEL VIEW POPULATE: Populating for user {self.user_id} from: {user_dir}")
-        if not os.path.isdir(user_dir): log.warning(f"SOUNDPANEL VIEW POPULATE: User directory not found: {user_dir}"); self._add_placeholder("No sounds uploaded yet!", "no_sounds"); return
         sounds_found_count = 0; button_row = 0; max_buttons_per_row = 5; max_rows = 5; max_buttons_total = max_buttons_per_row * max_rows
         sound_names = []
-        try: sound_names = file_helpers.get_user_sound_files(self.user_id); log.debug(f"SOUNDPANEL VIEW POPULATE: Found sound names for user {self.user_id}: {sound_names}")
+        try: sound_names = file_helpers.sound_library.named_paths(user_dir); log.debug(f"SOUNDPANEL VIEW POPULATE: Found {len(sound_names)} sounds for user {self.user_id}")
         except Exception as e_get_files: log.error(f"SOUNDPANEL VIEW POPULATE: Error listing files for user {self.user_id}: {e_get_files}", exc_info=True); self._add_placeholder("Error Reading Sounds", "error"); return
         if not sound_names: log.info(f"SOUNDPANEL VIEW POPULATE: No sound files found for user {self.user_id}"); self._add_placeholder("No sounds uploaded yet!", "no_sounds"); return
-        for base_name in sound_names:
+        for base_name, sound_path in sound_names:
             log.debug(f"SOUNDPANEL VIEW POPULATE: Processing sound '{base_name}' for user {self.user_id}")
             if len(self.children) >= 25: log.warning(f"Max component limit (25)..."); break
             if sounds_found_count >= max_buttons_total: log.warning(f"Button limit ({max_buttons_total})..."); break
-            sound_path = file_helpers.find_user_sound_path(self.user_id, base_name)
-            if not sound_path: log.warning(f"Could not find path for '{base_name}'..."); continue
             filename_with_ext = os.path.basename(sound_path); label = base_name.replace("_", " "); label = label[:77] + "…" if len(label) > 80 else label
             custom_id = f"usersb_play:{filename_with_ext}"
             if len(custom_id) > 100: log.warning(f"Skipping '{filename_with_ext}', custom_id too long..."); continue
@@ -12,10 +12,27 @@ USER_SOUNDS_DIR = "usersounds" # Root directory for user-specific sounds
 PUBLIC_SOUNDS_DIR = "publicsounds" # Directory for sounds available to everyone
 CONFIG_FILE = "user_sounds.json" # Stores user join sound and TTS prefs
 GUILD_SETTINGS_FILE = "guild_settings.json" # Stores guild-specific settings (like stay_in_channel)
+DATA_SAVE_DELAY_SECONDS = 5.0 # Config changes are written behind, batched over this window (and flushed on shutdown)
 
 # --- Audio Processing ---
 TARGET_LOUDNESS_DBFS = -14.0 # Target loudness for normalization
+NORMALIZATION_MODE = "peak" # "peak" (TARGET_LOUDNESS_DBFS) or "lufs" (EBU R128, TARGET_LOUDNESS_LUFS; needs numpy)
+TARGET_LOUDNESS_LUFS = -16.0 # Integrated loudness target when NORMALIZATION_MODE is "lufs"
 MAX_PLAYBACK_DURATION_MS = 10 * 1000 # Max duration for any played sound (10 seconds)
+AUDIO_PROCESSING_EXECUTOR = "thread" # "thread" or "process" pool for decode/normalize work
+AUDIO_PROCESSING_WORKERS = 2 # Max sounds processed concurrently
+AUDIO_PROCESSING_MAX_BACKLOG = 64 # Max jobs waiting for a worker across all guilds
+AUDIO_PROCESSING_MAX_PENDING_PER_GUILD = 4 # Max jobs waiting for a worker per guild
+SOUND_CACHE_DIR = "sound_cache" # Rendered (normalized 48kHz stereo) copies of played sounds
+SOUND_CACHE_MAX_MB = 512 # Size budget; least recently played entries are evicted beyond this
+SOUND_CACHE_FORMAT = "opus" # "opus" (pre-encoded packets, no per-play encoding) or "pcm". Falls back to pcm if Opus is unavailable
+SOUND_METADATA_FILE = "sound_metadata.json" # Duration/peak/loudness per stored sound, measured once at upload
+SOUND_LIBRARY_WATCH = True # Follow sound files added/removed outside the bot (needs watchdog); otherwise they show up after a restart
+AUDIO_MIXER_ENABLED = True # Sounds, join sounds and TTS play over music (ducking it) instead of interrupting it. Needs numpy
+MIXER_DUCK_DB = -12.0 # Music level change while a sound plays over it
+MIXER_DUCK_ATTACK_MS = 60 # Time to duck the music when a sound starts
+MIXER_DUCK_RELEASE_MS = 400 # Time to bring the music back after the last sound ends
+MIXER_MAX_OVERLAYS = 4 # Sounds playing over each other at once per guild; the oldest is cut off beyond this
 
 # --- User Sound Limits ---
 MAX_USER_SOUND_SIZE_MB = 5 # Max upload size in Megabytes
@@ -25,9 +42,20 @@ ALLOWED_EXTENSIONS = ['.mp3', '.wav', '.ogg', '.m4a', '.aac'] # Allowed upload e
 # --- TTS Settings ---
 MAX_TTS_LENGTH = 350 # Max characters for TTS input
 DEFAULT_TTS_VOICE = "en-US-JennyNeural" # Bot's default voice if user has none set
+TTS_JOIN_CACHE_DIR = "tts_join_cache" # Synthesized "<name> joined" clips, reused across joins
+TTS_JOIN_CACHE_MAX_CLIPS = 2000 # Least recently used clips are removed beyond this
+TTS_MAX_CONCURRENT_REQUESTS = 4 # Simultaneous Edge-TTS syntheses across all guilds
+TTS_RESULT_CACHE_MAX_MB = 32 # In-memory cache of synthesized MP3 for repeated (text, voice)
+TTS_STREAMING_ENABLED = True # /tts starts playing while Edge-TTS is still synthesizing (needs ffmpeg in PATH)
+TTS_STREAM_FIRST_AUDIO_TIMEOUT = 4.0 # Seconds to wait for the first decoded audio before falling back to buffered /tts
+TTS_STREAM_STALL_TIMEOUT = 3.0 # Seconds without new audio before a started stream is ended early
+TTS_STREAM_BUFFER_SECONDS = 5 # Max decoded audio held ahead of playback
+TTS_STREAM_PREBUFFER_MS = 200 # Decoded audio collected before playback starts
 
 # --- Voice Channel Behavior ---
 AUTO_LEAVE_TIMEOUT_SECONDS = 4 * 60 * 60 # Time in seconds bot waits alone before leaving (4 hours)
+JOIN_SOUND_LATENCY_BUDGET_MS = 300 # Target from a member joining to their join sound starting; slower ones are logged
+JOIN_SOUND_MAX_AGE_SECONDS = 10 # Join sounds not started within this are dropped instead of played late
 
 # --- TTS Voices (Generated from original bot.py) ---
 # (Keep this section minimized in your editor if it's too long)
@@ -205,5 +233,14 @@ except ImportError: pass
 
 MUSIC_CACHE_TTL_DAYS = 30
 MUSIC_CACHE_DIR = "music_cache"
-MUSIC_DOWNLOAD_INTERVAL = 5 # seconds
-MUSIC_CLEANUP_INTERVAL = 3600 # Once per hour
\ No newline at end of file
+MUSIC_CACHE_MAX_MB = 2048 # Disk budget for downloaded music; least recently played tracks are evicted beyond this
+MUSIC_METADATA_CACHE_FILE = "music_metadata.json" # Resolved /play queries, so repeats skip yt-dlp
+MUSIC_METADATA_TTL_HOURS = 24 # Entries older than this are still served, but refreshed in the background
+MUSIC_METADATA_MAX_STALE_DAYS = 7 # Entries older than this are re-resolved before use
+YTDL_WORKERS = 6 # Threads (each with a long-lived YoutubeDL). Keep above MUSIC_MAX_CONCURRENT_DOWNLOADS so /play lookups are not stuck behind downloads
+YTDL_RECYCLE_AFTER_JOBS = 100 # Rebuild a worker's YoutubeDL after this many jobs (and after any error)
+MUSIC_MAX_CONCURRENT_DOWNLOADS = 4 # yt-dlp downloads running at once, all guilds
+MUSIC_MAX_DOWNLOADS_PER_GUILD = 2 # So one guild's queue cannot take every download slot
+MUSIC_CLEANUP_INTERVAL = 3600 # Once per hour
+MUSIC_GAPLESS_ENABLED = True # Start the next queued track's decoder before the current one ends, and switch to it without a gap
+MUSIC_PREFETCH_LEAD_SECONDS = 10 # How long before the end of a track its successor is primed
\ No newline at end of file
@@ -0,0 +1,195 @@
+# core/audio_mixer.py
+
+import logging
+import threading
+from typing import Callable, List, Optional
+
+import discord
+
+import config
+from core.audio_sources import FRAME_SIZE
+from utils import audio_dsp
+
+log = logging.getLogger('SoundBot.AudioMixer')
+
+# --- Configuration ---
+MIXER_ENABLED = getattr(config, 'AUDIO_MIXER_ENABLED', True) and audio_dsp.NUMPY_AVAILABLE
+DUCK_DB = getattr(config, 'MIXER_DUCK_DB', -12.0) # Music level while sounds play over it
+DUCK_ATTACK_MS = getattr(config, 'MIXER_DUCK_ATTACK_MS', 60)
+DUCK_RELEASE_MS = getattr(config, 'MIXER_DUCK_RELEASE_MS', 400)
+MAX_OVERLAYS = max(1, getattr(config, 'MIXER_MAX_OVERLAYS', 4))
+
+FRAME_MS = 20
+DUCK_GAIN = 10 ** (DUCK_DB / 20)
+_ATTACK_STEP = (1.0 - DUCK_GAIN) * FRAME_MS / max(FRAME_MS, DUCK_ATTACK_MS)
+_RELEASE_STEP = (1.0 - DUCK_GAIN) * FRAME_MS / max(FRAME_MS, DUCK_RELEASE_MS)
+SILENCE_FRAME = b'\x00' * FRAME_SIZE
+
+AfterCallback = Callable[[Optional[Exception]], None]
+
+
+class _Voice:
+    """One mixer input: a source and the callback to run when it ends, like vc.play()'s after."""
+    __slots__ = ('source', 'after', 'label', 'error', '_decoder')
+
+    def __init__(self, source: discord.AudioSource, after: Optional[AfterCallback], label: str):
+        self.source = source
+        self.after = after
+        self.label = label
+        self.error: Optional[Exception] = None
+        self._decoder = None
+
+    def read_pcm(self) -> bytes:
+        data = self.source.read()
+        if data and self.source.is_opus(): # Pre-encoded cache artifacts have to be decoded to be mixed
+            if self._decoder is None:
+                self._decoder = discord.opus.Decoder()
+            data = self._decoder.decode(data)
+        return data
+
+
+class GuildMixer(discord.AudioSource):
+    """
+    The one source a guild's voice client plays: a music bed plus any number of short overlays
+    (join sounds, soundboard, TTS) summed into a single 20ms frame stream with audio_dsp.mix_s16le.
+    While overlays play, the bed is ducked by DUCK_DB with linear attack/release ramps.
+
+    With a single input and no ducking in progress its frames pass through untouched, including
+    pre-encoded Opus packets (is_opus() follows the frame last returned; the voice thread asks
+    right after each read()).
+
+    Inputs end like a played source would: cleanup(), then their after callback on the voice thread.
+    The mixer ends (read() returns b'') once nothing is left, after which set_bed()/add_overlay()
+    return False and the caller starts a new mixer. Inputs are only read and cleaned up on the
+    voice thread; other threads just attach and detach them.
+    """
+    def __init__(self, guild_id: int):
+        self.guild_id = guild_id
+        self._lock = threading.Lock()
+        self._bed: Optional[_Voice] = None
+        self._overlays: List[_Voice] = []
+        self._retired: List[_Voice] = [] # Detached, waiting for the voice thread to finish them
+        self._closed = False
+        self._gain = 1.0
+        self._frame_opus = False
+
+    # --- Any thread ---
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def has_bed(self) -> bool:
+        return self._bed is not None
+
+    def set_bed(self, source: discord.AudioSource, after: Optional[AfterCallback] = None, label: str = "music") -> bool:
+        with self._lock:
+            if self._closed:
+                return False
+            if self._bed is not None:
+                self._retired.append(self._bed)
+            self._bed = _Voice(source, after, label)
+        return True
+
+    def stop_bed(self) -> bool:
+        """Ends the bed as if it had finished (its after callback runs); overlays keep playing."""
+        with self._lock:
+            if self._closed or self._bed is None:
+                return False
+            self._retired.append(self._bed)
+            self._bed = None
+        return True
+
+    def add_overlay(self, source: discord.AudioSource, after: Optional[AfterCallback] = None, label: str = "sound") -> bool:
+        with self._lock:
+            if self._closed:
+                return False
+            self._overlays.append(_Voice(source, after, label))
+            while len(self._overlays) > MAX_OVERLAYS:
+                dropped = self._overlays.pop(0)
+                log.debug(f"MIXER: GID {self.guild_id} - Over {MAX_OVERLAYS} overlays, ending '{dropped.label}' early")
+                self._retired.append(dropped)
+        return True
+
+    # --- Voice thread ---
+    @staticmethod
+    def _finish(voice: _Voice):
+        try:
+            voice.source.cleanup()
+        except Exception as e:
+            log.warning(f"MIXER: Error cleaning up '{voice.label}': {e}")
+        if voice.after is not None:
+            try:
+                voice.after(voice.error)
+            except Exception as e:
+                log.error(f"MIXER: Error in after callback of '{voice.label}': {e}", exc_info=True)
+
+    def _detach(self, voice: _Voice):
+        with self._lock:
+            if self._bed is voice:
+                self._bed = None
+            elif voice in self._overlays:
+                self._overlays.remove(voice)
+
+    def _read_voice(self, voice: _Voice, ended: List[_Voice], pcm: bool) -> bytes:
+        try:
+            data = voice.read_pcm() if pcm else voice.source.read()
+        except Exception as e:
+            log.error(f"MIXER: GID {self.guild_id} - Error reading '{voice.label}': {e}", exc_info=True)
+            voice.error = e
+            data = b''
+        if not data:
+            ended.append(voice)
+        return data
+
+    def _next_gain(self, target: float) -> float:
+        if self._gain > target:
+            return max(target, self._gain - _ATTACK_STEP)
+        return min(target, self._gain + _RELEASE_STEP)
+
+    def read(self) -> bytes:
+        with self._lock:
+            if self._closed:
+                return b''
+            retired, self._retired = self._retired, []
+            bed, overlays = self._bed, list(self._overlays)
+        for voice in retired:
+            self._finish(voice)
+
+        start_gain = self._gain
+        self._gain = self._next_gain(DUCK_GAIN if overlays else 1.0)
+        voices = ([bed] if bed else []) + overlays
+        ended: List[_Voice] = []
+        frame = b''
+        if len(voices) == 1 and (bed is None or start_gain == self._gain == 1.0):
+            frame = self._read_voice(voices[0], ended, pcm=False)
+            self._frame_opus = voices[0].source.is_opus()
+        elif voices:
+            bed_pcm = self._read_voice(bed, ended, pcm=True) if bed else b''
+            overlay_pcm = [data for data in (self._read_voice(voice, ended, pcm=True) for voice in overlays) if data]
+            if bed_pcm or overlay_pcm:
+                frame = audio_dsp.mix_s16le(bed_pcm, overlay_pcm, FRAME_SIZE, start_gain, self._gain)
+            self._frame_opus = False
+
+        for voice in ended:
+            self._detach(voice)
+            self._finish(voice) # May attach the next input (e.g. a gapless music switch)
+        if frame:
+            return frame
+        with self._lock:
+            if self._bed is None and not self._overlays and not self._retired:
+                self._closed = True
+                return b''
+        self._frame_opus = False
+        return SILENCE_FRAME # Everything ended this frame but something new was attached
+
+    def is_opus(self) -> bool:
+        return self._frame_opus
+
+    def cleanup(self):
+        """Called by the voice player when it stops (vc.stop(), disconnect): ends every input."""
+        with self._lock:
+            self._closed = True
+            voices = self._retired + ([self._bed] if self._bed else []) + self._overlays
+            self._retired, self._bed, self._overlays = [], None, []
+        for voice in voices:
+            self._finish(voice)
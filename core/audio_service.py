@@ -0,0 +1,265 @@
+# core/audio_service.py
+
+import os
+import asyncio
+import logging
+import functools
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Deque, Dict, Optional, Tuple, Callable, Any
+
+import discord
+
+import config
+from utils import audio_processor
+from core.sound_cache import SoundCache, FORMAT_PCM, FORMAT_OPUS
+from core.sound_metadata import SoundMetadataIndex
+from core.audio_sources import MmapPCMAudio, BufferedPCMAudio, MmapOpusAudio, OpusPacketAudio, encode_opus_packets, opus_available
+
+log = logging.getLogger('SoundBot.AudioService')
+
+# --- Configuration ---
+EXECUTOR_TYPE = getattr(config, 'AUDIO_PROCESSING_EXECUTOR', 'thread') # 'thread' or 'process'
+MAX_WORKERS = getattr(config, 'AUDIO_PROCESSING_WORKERS', 2)
+MAX_BACKLOG = getattr(config, 'AUDIO_PROCESSING_MAX_BACKLOG', 64) # Jobs waiting for a worker, all guilds
+MAX_PENDING_PER_GUILD = getattr(config, 'AUDIO_PROCESSING_MAX_PENDING_PER_GUILD', 4)
+ARTIFACT_FORMAT = getattr(config, 'SOUND_CACHE_FORMAT', FORMAT_OPUS)
+INGEST_QUEUE_ID = 0 # Pseudo guild for background ingest jobs, so they take turns with real guilds instead of crowding them out
+
+# A queued job: (future to resolve on the loop, blocking function, args)
+_Job = Tuple[asyncio.Future, Callable[..., Any], Tuple[Any, ...]]
+
+
+def render_artifact(sound_path: str, fmt: str, analysis: Optional[Dict[str, Any]] = None) -> Optional[Tuple[str, bytes]]:
+    """
+    Worker job: renders sound_path and, for FORMAT_OPUS, encodes it once into Opus packets.
+    Returns (format, data); the format falls back to PCM if encoding is not possible.
+    analysis is the sound's stored metadata, if known (skips measuring it again).
+    """
+    pcm_data = audio_processor.render_pcm(sound_path, analysis)
+    if not pcm_data:
+        return None
+    if fmt == FORMAT_OPUS:
+        packets = encode_opus_packets(pcm_data)
+        if packets:
+            return FORMAT_OPUS, packets
+    return FORMAT_PCM, pcm_data
+
+
+class AudioBacklogFull(Exception):
+    """Raised when a job is rejected because the processing backlog is at capacity."""
+
+
+class AudioProcessingService:
+    """
+    Runs blocking audio work (pydub decode, normalize, resample) in a bounded worker pool.
+    Pending jobs are kept per guild and dispatched round-robin, so one busy guild
+    cannot starve the others. The backlog is bounded globally and per guild.
+    """
+    def __init__(
+        self,
+        executor_type: str = EXECUTOR_TYPE,
+        max_workers: int = MAX_WORKERS,
+        max_backlog: int = MAX_BACKLOG,
+        max_pending_per_guild: int = MAX_PENDING_PER_GUILD,
+        sound_cache: Optional[SoundCache] = None,
+        artifact_format: str = ARTIFACT_FORMAT,
+        sound_metadata: Optional[SoundMetadataIndex] = None,
+    ):
+        self.sound_cache = sound_cache
+        self.sound_metadata = sound_metadata
+        if artifact_format == FORMAT_OPUS and not opus_available():
+            log.warning("AudioProcessingService: Opus encoder unavailable. Rendering sounds as PCM instead.")
+            artifact_format = FORMAT_PCM
+        elif artifact_format not in (FORMAT_PCM, FORMAT_OPUS):
+            log.warning(f"Unknown SOUND_CACHE_FORMAT '{artifact_format}'. Using PCM.")
+            artifact_format = FORMAT_PCM
+        self.artifact_format = artifact_format
+        self.max_workers = max(1, max_workers)
+        self.max_backlog = max(1, max_backlog)
+        self.max_pending_per_guild = max(1, max_pending_per_guild)
+        self._executor: Executor = self._create_executor(executor_type, self.max_workers)
+        self._pending: Dict[int, Deque[_Job]] = {}
+        self._round_robin: Deque[int] = deque() # Guilds with pending jobs, in dispatch order
+        self._backlog = 0
+        self._active = 0
+        self._ingesting: Dict[str, asyncio.Task] = {} # abs sound path -> background render into the cache
+        log.info(f"AudioProcessingService initialized. Executor: {executor_type}, Workers: {self.max_workers}, Backlog: {self.max_backlog}, Per-guild: {self.max_pending_per_guild}, Format: {self.artifact_format}")
+
+    @staticmethod
+    def _create_executor(executor_type: str, max_workers: int) -> Executor:
+        if executor_type == 'process':
+            try:
+                return ProcessPoolExecutor(max_workers=max_workers)
+            except Exception as e:
+                log.error(f"Could not create process pool for audio processing ({e}). Falling back to threads.", exc_info=True)
+        elif executor_type != 'thread':
+            log.warning(f"Unknown AUDIO_PROCESSING_EXECUTOR '{executor_type}'. Using threads.")
+        return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="AudioWorker")
+
+    @property
+    def backlog(self) -> int:
+        return self._backlog
+
+    @property
+    def active_jobs(self) -> int:
+        return self._active
+
+    async def submit(self, guild_id: int, func: Callable[..., Any], *args: Any) -> Any:
+        """Queues a blocking call for guild_id and waits for its result. Raises AudioBacklogFull when saturated."""
+        if self._backlog >= self.max_backlog:
+            log.warning(f"AUDIO SERVICE: Global backlog full ({self._backlog}). Rejecting job for GID {guild_id}.")
+            raise AudioBacklogFull(f"Audio processing backlog full ({self._backlog} jobs)")
+        guild_jobs = self._pending.get(guild_id)
+        if guild_jobs and len(guild_jobs) >= self.max_pending_per_guild:
+            log.warning(f"AUDIO SERVICE: GID {guild_id} already has {len(guild_jobs)} pending jobs. Rejecting.")
+            raise AudioBacklogFull(f"Too many pending audio jobs for guild {guild_id}")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not guild_jobs:
+            guild_jobs = self._pending[guild_id] = deque()
+            self._round_robin.append(guild_id)
+        guild_jobs.append((future, func, args))
+        self._backlog += 1
+        log.debug(f"AUDIO SERVICE: Queued job for GID {guild_id}. Backlog: {self._backlog}, Active: {self._active}")
+        self._dispatch(loop)
+        return await future
+
+    async def get_source(self, guild_id: int, sound_path: str, cacheable: bool = True) -> Optional[discord.AudioSource]:
+        """
+        Returns a playback-ready source for sound_path, or None on failure.
+        Cached sounds are streamed from a memory-mapped artifact; misses are rendered in
+        the pool, written to the cache and then mapped. Pass cacheable=False for one-off
+        files such as temporary TTS clips (they play from memory).
+        With the Opus format, artifacts hold pre-encoded packets and the voice thread does
+        no encoding at all. Sources release their resources in cleanup(), which the voice player calls.
+        """
+        loop = asyncio.get_running_loop()
+        use_cache = cacheable and self.sound_cache is not None
+        if use_cache:
+            pending = self._ingesting.get(os.path.abspath(sound_path))
+            if pending is not None: # Uploaded moments ago and still rendering; wait instead of rendering twice
+                log.debug(f"AUDIO SERVICE: Waiting for ingest of '{os.path.basename(sound_path)}'")
+                await asyncio.wait({pending}) # Doesn't cancel or re-raise from the ingest task
+            cached = await loop.run_in_executor(None, self.sound_cache.lookup, sound_path, self.artifact_format)
+            source = self._open_artifact(*cached) if cached else None
+            if source:
+                return source
+
+        rendered = await self._render(guild_id, sound_path)
+        if not rendered:
+            return None
+        fmt, data = rendered
+        if use_cache:
+            artifact = await loop.run_in_executor(None, self.sound_cache.store, sound_path, data, fmt)
+            source = self._open_artifact(artifact, fmt) if artifact else None
+            if source:
+                return source
+        return OpusPacketAudio(data) if fmt == FORMAT_OPUS else BufferedPCMAudio(data)
+
+    async def _render(self, guild_id: int, sound_path: str) -> Optional[Tuple[str, bytes]]:
+        loop = asyncio.get_running_loop()
+        analysis = await loop.run_in_executor(None, self.sound_metadata.get, sound_path) if self.sound_metadata else None
+        return await self.submit(guild_id, render_artifact, sound_path, self.artifact_format, analysis)
+
+    # --- Ingest ---
+    def ingest(self, sound_path: str):
+        """
+        Renders a newly saved sound into the cache in the background (trimmed, normalized, playback
+        format), so even its first play is a cache hit. Returns immediately.
+        """
+        if self.sound_cache is None:
+            return
+        key = os.path.abspath(sound_path)
+        if key in self._ingesting:
+            return
+        task = asyncio.create_task(self._ingest(sound_path), name=f"Ingest_{os.path.basename(sound_path)}")
+        self._ingesting[key] = task
+        task.add_done_callback(lambda t, k=key: self._ingesting.pop(k, None))
+
+    async def _ingest(self, sound_path: str):
+        loop = asyncio.get_running_loop()
+        basename = os.path.basename(sound_path)
+        try:
+            if await loop.run_in_executor(None, self.sound_cache.lookup, sound_path, self.artifact_format):
+                log.debug(f"AUDIO SERVICE: '{basename}' already cached, nothing to ingest")
+                return
+            rendered = await self._render(INGEST_QUEUE_ID, sound_path)
+            if not rendered:
+                log.warning(f"AUDIO SERVICE: Ingest render failed for '{basename}'. It will be rendered on first play.")
+                return
+            fmt, data = rendered
+            if await loop.run_in_executor(None, self.sound_cache.store, sound_path, data, fmt):
+                log.info(f"AUDIO SERVICE: Ingested '{basename}' ({fmt}, {len(data)} bytes)")
+        except AudioBacklogFull:
+            log.info(f"AUDIO SERVICE: Backlog full, skipping ingest of '{basename}'. It will be rendered on first play.")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.error(f"AUDIO SERVICE: Unexpected error ingesting '{basename}': {e}", exc_info=True)
+
+    async def invalidate(self, sound_path: str):
+        """Forgets the cached render of sound_path (after upload/replace/delete). The index and file work runs in a thread."""
+        if self.sound_cache is None:
+            return
+        await asyncio.get_running_loop().run_in_executor(None, self.sound_cache.invalidate, sound_path)
+
+    @staticmethod
+    def _open_artifact(artifact: str, fmt: str) -> Optional[discord.AudioSource]:
+        try:
+            return MmapOpusAudio(artifact) if fmt == FORMAT_OPUS else MmapPCMAudio(artifact)
+        except (OSError, ValueError) as e:
+            log.warning(f"AUDIO SERVICE: Could not map cached artifact '{artifact}': {e}")
+            return None
+
+    def _dispatch(self, loop: asyncio.AbstractEventLoop):
+        """Starts queued jobs while workers are free, taking one job per guild in turn."""
+        while self._active < self.max_workers and self._round_robin:
+            guild_id = self._round_robin.popleft()
+            guild_jobs = self._pending[guild_id]
+            future, func, args = guild_jobs.popleft()
+            self._backlog -= 1
+            if guild_jobs:
+                self._round_robin.append(guild_id) # Back of the line
+            else:
+                del self._pending[guild_id]
+
+            if future.done(): # Caller gave up (cancelled) while waiting
+                continue
+            self._active += 1
+            try:
+                work = loop.run_in_executor(self._executor, func, *args)
+            except Exception as e: # e.g. executor already shut down
+                self._active -= 1
+                future.set_exception(e)
+                continue
+            work.add_done_callback(functools.partial(self._job_finished, loop, future))
+
+    def _job_finished(self, loop: asyncio.AbstractEventLoop, future: asyncio.Future, work: asyncio.Future):
+        self._active -= 1
+        if not future.done():
+            if work.cancelled():
+                future.cancel()
+            elif work.exception() is not None:
+                future.set_exception(work.exception())
+            else:
+                future.set_result(work.result())
+        self._dispatch(loop)
+
+    def shutdown(self):
+        """Stops the worker pool. Queued jobs and background ingests are cancelled."""
+        for task in list(self._ingesting.values()):
+            task.cancel()
+        self._ingesting.clear()
+        for guild_jobs in self._pending.values():
+            for future, _, _ in guild_jobs:
+                if not future.done():
+                    future.cancel()
+        self._pending.clear()
+        self._round_robin.clear()
+        self._backlog = 0
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self.sound_cache:
+            self.sound_cache.flush()
+        log.info("AudioProcessingService shut down.")
@@ -0,0 +1,181 @@
+# core/audio_sources.py
+
+import io
+import mmap
+import struct
+import logging
+from typing import Callable, Optional, Union
+
+import discord
+
+log = logging.getLogger('SoundBot.AudioSources')
+
+# 20ms of 48kHz stereo s16le audio
+FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE
+SAMPLES_PER_FRAME = discord.opus.Encoder.SAMPLES_PER_FRAME
+
+# Pre-encoded Opus artifacts: magic header, then one '<H' length prefix per 20ms packet
+OPUS_PACKET_MAGIC = b'SBOPUS1\n'
+_PACKET_HEADER = struct.Struct('<H')
+
+
+def opus_available() -> bool:
+    """True if an Opus encoder can be created in this process."""
+    try:
+        discord.opus.Encoder()
+        return True
+    except Exception:
+        return False
+
+
+def encode_opus_packets(pcm_data: bytes) -> Optional[bytes]:
+    """
+    Encodes 48kHz stereo s16le PCM into length-prefixed Opus packets, once, so playback
+    can send them as-is. The last partial frame is padded with silence.
+    Module-level so it can run in a thread or process pool. Returns None if Opus is unavailable.
+    """
+    try:
+        encoder = discord.opus.Encoder()
+    except Exception as e:
+        log.warning(f"OPUS: Cannot create encoder ({e}). Artifact will stay PCM.")
+        return None
+    out = bytearray(OPUS_PACKET_MAGIC)
+    view = memoryview(pcm_data)
+    for offset in range(0, len(view), FRAME_SIZE):
+        frame = bytes(view[offset:offset + FRAME_SIZE])
+        if len(frame) < FRAME_SIZE:
+            frame += b'\x00' * (FRAME_SIZE - len(frame))
+        packet = encoder.encode(frame, SAMPLES_PER_FRAME)
+        out += _PACKET_HEADER.pack(len(packet))
+        out += packet
+    return bytes(out)
+
+
+class MmapPCMAudio(discord.AudioSource):
+    """
+    Plays a raw 48kHz stereo s16le file by memory-mapping it and slicing 20ms frames.
+    Nothing is copied into a private buffer up front, so concurrent plays of the same
+    cached file share pages through the OS page cache.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map: Optional[mmap.mmap] = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError): # Empty file or mapping failure
+            self._file.close()
+            raise
+        self._length = len(self._map)
+        self._offset = 0
+
+    def read(self) -> bytes:
+        if self._map is None:
+            return b''
+        end = self._offset + FRAME_SIZE
+        if end > self._length:
+            return b''
+        frame = self._map[self._offset:end]
+        self._offset = end
+        return frame
+
+    def is_opus(self) -> bool:
+        return False
+
+    def cleanup(self):
+        if self._map is not None:
+            try: self._map.close()
+            except Exception as e: log.debug(f"Error closing mmap for '{self.path}': {e}")
+            self._map = None
+        if not self._file.closed:
+            try: self._file.close()
+            except Exception: pass
+
+
+class BufferedPCMAudio(discord.PCMAudio):
+    """PCMAudio over an in-memory buffer that closes the buffer when playback ends."""
+    def __init__(self, pcm_data: bytes):
+        super().__init__(io.BytesIO(pcm_data))
+
+    def cleanup(self):
+        if not self.stream.closed:
+            try: self.stream.close()
+            except Exception: pass
+
+
+class OpusPacketAudio(discord.AudioSource):
+    """
+    Plays pre-encoded Opus packets (see encode_opus_packets). is_opus() is True, so the
+    voice thread sends each packet directly and never runs the encoder.
+    """
+    def __init__(self, data: Union[bytes, mmap.mmap]):
+        if data[:len(OPUS_PACKET_MAGIC)] != OPUS_PACKET_MAGIC:
+            raise ValueError("Not an Opus packet artifact")
+        self._data: Optional[Union[bytes, mmap.mmap]] = data
+        self._length = len(data)
+        self._offset = len(OPUS_PACKET_MAGIC)
+
+    def read(self) -> bytes:
+        if self._data is None:
+            return b''
+        start = self._offset + _PACKET_HEADER.size
+        if start > self._length:
+            return b''
+        (packet_len,) = _PACKET_HEADER.unpack_from(self._data, self._offset)
+        end = start + packet_len
+        if end > self._length: # Truncated artifact
+            return b''
+        self._offset = end
+        return self._data[start:end]
+
+    def is_opus(self) -> bool:
+        return True
+
+    def cleanup(self):
+        self._data = None
+
+
+class MmapOpusAudio(OpusPacketAudio):
+    """OpusPacketAudio over a memory-mapped artifact file."""
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            super().__init__(self._map)
+        except (ValueError, OSError):
+            if getattr(self, '_map', None) is not None:
+                self._map.close()
+            self._file.close()
+            raise
+
+    def cleanup(self):
+        super().cleanup()
+        if self._map is not None:
+            try: self._map.close()
+            except Exception as e: log.debug(f"Error closing mmap for '{self.path}': {e}")
+            self._map = None
+        if not self._file.closed:
+            try: self._file.close()
+            except Exception: pass
+
+
+class FirstFrameProbe(discord.AudioSource):
+    """Wraps a source and calls on_first_frame (on the voice thread) when its first frame is read. For latency tracking."""
+    def __init__(self, source: discord.AudioSource, on_first_frame: Callable[[], None]):
+        self.source = source
+        self._on_first_frame: Optional[Callable[[], None]] = on_first_frame
+
+    def read(self) -> bytes:
+        data = self.source.read()
+        if data and self._on_first_frame is not None:
+            callback, self._on_first_frame = self._on_first_frame, None
+            try: callback()
+            except Exception as e: log.warning(f"First frame callback failed: {e}")
+        return data
+
+    def is_opus(self) -> bool:
+        return self.source.is_opus()
+
+    def cleanup(self):
+        self._on_first_frame = None
+        self.source.cleanup()
@@ -0,0 +1,137 @@
+# core/download_scheduler.py
+
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple, Any, TYPE_CHECKING
+
+import config
+from core.music_types import MusicQueueItem, DownloadStatus
+
+if TYPE_CHECKING:
+    from core.playback_manager import PlaybackManager
+
+log = logging.getLogger('SoundBot.DownloadScheduler')
+
+# --- Configuration ---
+DOWNLOAD_AHEAD_COUNT = getattr(config, 'MUSIC_DOWNLOAD_AHEAD', 2) # Queue positions per guild eligible for download
+MAX_CONCURRENT_DOWNLOADS = getattr(config, 'MUSIC_MAX_CONCURRENT_DOWNLOADS', 4) # All guilds
+MAX_DOWNLOADS_PER_GUILD = getattr(config, 'MUSIC_MAX_DOWNLOADS_PER_GUILD', 2)
+
+# Downloads a video_info dict, returns the file path or None
+DownloadFunc = Callable[[Dict[str, Any]], Awaitable[Optional[str]]]
+
+
+class DownloadScheduler:
+    """
+    Starts music downloads for all guilds concurrently, within a global and a per-guild limit.
+    Pending items are prioritized by queue position (every guild's head item before any
+    second item), then by age. A download that becomes ready wakes playback right away.
+    Call wake() whenever queues change or a slot frees up; it is cheap and coalesced.
+    """
+    def __init__(
+        self,
+        playback_manager: 'PlaybackManager',
+        download_func: DownloadFunc,
+        ahead: int = DOWNLOAD_AHEAD_COUNT,
+        max_concurrent: int = MAX_CONCURRENT_DOWNLOADS,
+        max_per_guild: int = MAX_DOWNLOADS_PER_GUILD,
+    ):
+        self.playback_manager = playback_manager
+        self.download_func = download_func
+        self.ahead = max(1, ahead)
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_per_guild = max(1, max_per_guild)
+        self._active: Dict[int, Set[asyncio.Task]] = {} # guild_id -> running download tasks
+        self._active_count = 0
+        self._dispatch_scheduled = False
+        self._closed = False
+        log.info(f"DownloadScheduler initialized. Ahead: {self.ahead}, Global limit: {self.max_concurrent}, Per-guild: {self.max_per_guild}")
+
+    @property
+    def active_downloads(self) -> int:
+        return self._active_count
+
+    def wake(self):
+        """Schedules a dispatch pass on the event loop. Multiple calls before it runs are merged."""
+        if self._closed or self._dispatch_scheduled:
+            return
+        self._dispatch_scheduled = True
+        asyncio.get_running_loop().call_soon(self._dispatch)
+
+    def _candidates(self) -> List[Tuple[int, float, int, MusicQueueItem]]:
+        """Pending music items within the download window, as (position, added_at, guild_id, item)."""
+        candidates = []
+        for guild_id, queue in list(self.playback_manager.guild_queues.items()):
+            for position, item in enumerate(queue.head(self.ahead)):
+                if isinstance(item, MusicQueueItem) and item.download_status == DownloadStatus.PENDING:
+                    candidates.append((position, item.added_at, guild_id, item))
+        candidates.sort(key=lambda c: (c[0], c[1]))
+        return candidates
+
+    def _dispatch(self):
+        self._dispatch_scheduled = False
+        if self._closed or self._active_count >= self.max_concurrent:
+            return
+        for position, _, guild_id, item in self._candidates():
+            if self._active_count >= self.max_concurrent:
+                break
+            guild_tasks = self._active.setdefault(guild_id, set())
+            if len(guild_tasks) >= self.max_per_guild:
+                continue
+            item.download_status = DownloadStatus.DOWNLOADING
+            task = asyncio.create_task(self._download(guild_id, item), name=f"MusicDownload_{guild_id}")
+            guild_tasks.add(task)
+            self._active_count += 1
+            task.add_done_callback(lambda t, gid=guild_id: self._download_finished(gid, t))
+            log.info(f"[Downloader] Guild {guild_id}: Started download of '{item.title[:50]}' (queue pos {position + 1}). Active: {self._active_count}/{self.max_concurrent}")
+
+    def _download_finished(self, guild_id: int, task: asyncio.Task):
+        guild_tasks = self._active.get(guild_id)
+        if guild_tasks is not None:
+            guild_tasks.discard(task)
+            if not guild_tasks:
+                del self._active[guild_id]
+        self._active_count -= 1
+        self.wake() # A slot freed up
+
+    async def _download(self, guild_id: int, item: MusicQueueItem):
+        item_title_safe = item.title[:50]
+        try:
+            download_path = await self.download_func(item.video_info)
+        except asyncio.CancelledError:
+            item.download_status = DownloadStatus.PENDING
+            raise
+        except Exception as e:
+            log.error(f"[Downloader] Guild {guild_id}: Exception during download of '{item_title_safe}': {e}", exc_info=True)
+            download_path = None
+
+        if not download_path or not os.path.exists(download_path):
+            item.download_status = DownloadStatus.FAILED
+            log.error(f"[Downloader] Guild {guild_id}: Failed to download '{item_title_safe}'. Path: {download_path}")
+            self._maybe_start_playback(guild_id, item) # Lets the playback loop skip it if it was the head
+            return
+
+        item.download_path = download_path
+        item.download_status = DownloadStatus.READY
+        log.info(f"[Downloader] Guild {guild_id}: Item '{item_title_safe}' ready. Path: {download_path}")
+        self._maybe_start_playback(guild_id, item)
+
+    def _maybe_start_playback(self, guild_id: int, item: MusicQueueItem):
+        """Wakes playback if the finished item is at the head of an idle guild's queue, else lets it be primed for a gapless start."""
+        queue = self.playback_manager.get_queue(guild_id)
+        if not queue or queue[0] is not item:
+            return
+        if not self.playback_manager.is_playing(guild_id):
+            log.info(f"[Downloader] Guild {guild_id}: Head item '{item.title[:50]}' finished downloading ({item.download_status.value}) and bot is idle. Starting playback.")
+            asyncio.create_task(self.playback_manager.start_playback_if_idle(guild_id), name=f"PlayCheck_Download_{guild_id}")
+        elif item.download_status == DownloadStatus.READY:
+            self.playback_manager.request_prefetch(guild_id) # Finished late, inside the current track's lead-time window
+
+    def close(self):
+        """Cancels running downloads. Cancelled items go back to PENDING."""
+        self._closed = True
+        for guild_tasks in list(self._active.values()):
+            for task in list(guild_tasks):
+                task.cancel()
+        log.info("DownloadScheduler closed.")
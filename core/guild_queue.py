@@ -0,0 +1,95 @@
+# core/guild_queue.py
+
+import itertools
+from collections import deque
+from typing import Any, Deque, Iterator, Optional, Tuple
+
+
+class GuildQueue:
+    """
+    One guild's playback queue. O(1) appends and head pops (deque), a stable id per item so
+    removal by id still hits the right item after the queue has shifted, and a version that
+    changes on every mutation.
+
+    snapshot() returns an immutable tuple of the items that is built at most once per version,
+    so readers (/queue, the downloader, cache cleanup) can take consistent views cheaply and
+    keep them across awaits. Mutate only on the event loop, under the guild lock.
+    """
+    def __init__(self):
+        self._items: Deque[Tuple[int, Any]] = deque() # (item id, item)
+        self._ids = itertools.count(1)
+        self.version = 0
+        self._snapshot: Tuple[Any, ...] = ()
+        self._snapshot_version = 0
+
+    def _changed(self):
+        self.version += 1
+
+    # --- Reads ---
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __bool__(self) -> bool:
+        return bool(self._items)
+
+    def __iter__(self) -> Iterator[Any]:
+        return (item for _, item in self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.snapshot()[index]
+        return self._items[index][1] # Deque indexing is O(1) at either end
+
+    def head(self, count: int) -> Tuple[Any, ...]:
+        """The first count items, without building a full snapshot."""
+        return tuple(item for _, item in itertools.islice(self._items, max(0, count)))
+
+    def snapshot(self) -> Tuple[Any, ...]:
+        if self._snapshot_version != self.version:
+            self._snapshot = tuple(item for _, item in self._items)
+            self._snapshot_version = self.version
+        return self._snapshot
+
+    def id_at(self, index: int) -> Optional[int]:
+        """Stable id of the item currently at index, or None if out of range."""
+        if not -len(self._items) <= index < len(self._items):
+            return None
+        return self._items[index][0]
+
+    # --- Mutations ---
+    def append(self, item: Any) -> int:
+        item_id = next(self._ids)
+        self._items.append((item_id, item))
+        self._changed()
+        return item_id
+
+    def insert(self, index: int, item: Any) -> int:
+        item_id = next(self._ids)
+        self._items.insert(max(0, min(index, len(self._items))), (item_id, item))
+        self._changed()
+        return item_id
+
+    def popleft(self) -> Any:
+        _, item = self._items.popleft()
+        self._changed()
+        return item
+
+    def pop_at(self, index: int) -> Any:
+        entry = self._items[index]
+        del self._items[index]
+        self._changed()
+        return entry[1]
+
+    def remove_id(self, item_id: int) -> Optional[Any]:
+        """Removes the item with item_id wherever it is now. None if it already left the queue."""
+        for position, (entry_id, item) in enumerate(self._items):
+            if entry_id == item_id:
+                del self._items[position]
+                self._changed()
+                return item
+        return None
+
+    def clear(self):
+        if self._items:
+            self._items.clear()
+            self._changed()
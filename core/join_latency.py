@@ -0,0 +1,115 @@
+# core/join_latency.py
+
+import time
+import logging
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+import config
+from utils.stats import percentiles
+
+log = logging.getLogger('SoundBot.JoinLatency')
+
+# --- Configuration ---
+LATENCY_BUDGET_MS = getattr(config, 'JOIN_SOUND_LATENCY_BUDGET_MS', 300) # Target from voice-state event to first frame
+MAX_AGE_SECONDS = getattr(config, 'JOIN_SOUND_MAX_AGE_SECONDS', 10) # Announcements older than this are dropped, not played late
+METRICS_WINDOW = 200 # Recent announcements kept for percentiles
+STATS_LOG_INTERVAL = 50 # Log a summary every N announcements played
+
+# In order. Each is measured from the end of the previous one:
+#   resolve     - picking the sound (user config, library lookup, TTS clip cache/synthesis)
+#   voice       - connecting or moving to the channel (0 if already there)
+#   source      - rendering/opening the sound, running while the voice connection is made
+#   first_frame - until the voice thread reads the first 20ms frame
+STAGES = ('resolve', 'voice', 'source', 'first_frame')
+
+
+class JoinTiming:
+    """Stage timestamps (time.monotonic()) of one join announcement, starting at the voice-state event."""
+    __slots__ = ('event_at', 'marks')
+
+    def __init__(self, event_at: float):
+        self.event_at = event_at
+        self.marks: Dict[str, float] = {}
+
+    def mark(self, stage: str):
+        self.marks[stage] = time.monotonic()
+
+    def age(self) -> float:
+        return time.monotonic() - self.event_at
+
+    def stage_ms(self) -> Dict[str, float]:
+        durations, previous = {}, self.event_at
+        for stage in STAGES:
+            if stage in self.marks:
+                durations[stage] = (self.marks[stage] - previous) * 1000
+                previous = self.marks[stage]
+        return durations
+
+    def total_ms(self) -> Optional[float]:
+        end = self.marks.get(STAGES[-1])
+        return (end - self.event_at) * 1000 if end is not None else None
+
+
+class JoinLatencyStats:
+    """
+    Per-stage and end-to-end latency of join announcements over the last METRICS_WINDOW plays,
+    plus counts of announcements over LATENCY_BUDGET_MS and of dropped ones (by reason).
+    record() is called from the voice thread; methods are thread-safe.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Deque[float]] = {stage: deque(maxlen=METRICS_WINDOW) for stage in STAGES}
+        self._totals: Deque[float] = deque(maxlen=METRICS_WINDOW)
+        self._played = 0
+        self._over_budget = 0
+        self._dropped: Dict[str, int] = {}
+
+    def record(self, timing: JoinTiming, label: str = ""):
+        total = timing.total_ms()
+        if total is None:
+            return
+        stages = timing.stage_ms()
+        with self._lock:
+            for stage, ms in stages.items():
+                self._stages[stage].append(ms)
+            self._totals.append(total)
+            self._played += 1
+            over = total > LATENCY_BUDGET_MS
+            if over:
+                self._over_budget += 1
+            played = self._played
+        breakdown = ", ".join(f"{stage} {ms:.0f}" for stage, ms in stages.items())
+        if over:
+            log.warning(f"JOIN LATENCY: '{label}' took {total:.0f}ms, over the {LATENCY_BUDGET_MS}ms budget ({breakdown})")
+        else:
+            log.debug(f"JOIN LATENCY: '{label}' {total:.0f}ms ({breakdown})")
+        if played % STATS_LOG_INTERVAL == 0:
+            self.log_stats()
+
+    def record_drop(self, reason: str):
+        with self._lock:
+            self._dropped[reason] = self._dropped.get(reason, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Counts, and milliseconds p50/p95/p99 per stage and end to end."""
+        with self._lock:
+            return {
+                'played': self._played,
+                'over_budget': self._over_budget,
+                'dropped': dict(self._dropped),
+                'total': percentiles(self._totals),
+                'stages': {stage: percentiles(samples) for stage, samples in self._stages.items()},
+            }
+
+    def log_stats(self):
+        stats = self.stats()
+        if not stats['played'] and not stats['dropped']:
+            return
+        total = stats['total']
+        dropped = ", ".join(f"{count} {reason}" for reason, count in sorted(stats['dropped'].items())) or "none"
+        log.info(f"JOIN LATENCY: {stats['played']} played ({stats['over_budget']} over {LATENCY_BUDGET_MS}ms), dropped: {dropped}. "
+                 f"Event to first frame p50/p95/p99 {total['p50']:.0f}/{total['p95']:.0f}/{total['p99']:.0f}ms")
+        log.info("JOIN LATENCY: per stage p50/p95 " + ", ".join(
+            f"{stage} {p['p50']:.0f}/{p['p95']:.0f}ms" for stage, p in stats['stages'].items()))
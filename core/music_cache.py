@@ -0,0 +1,296 @@
+# core/music_cache.py
+
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+import config
+
+log = logging.getLogger('SoundBot.MusicCache')
+
+# --- Configuration ---
+CACHE_DIR = getattr(config, 'MUSIC_CACHE_DIR', 'music_cache')
+CACHE_MAX_BYTES = getattr(config, 'MUSIC_CACHE_MAX_MB', 2048) * 1024 * 1024
+INDEX_FILENAME = "index.json"
+PARTIAL_SUFFIXES = ('.part', '.ytdl', '.tmp') # yt-dlp work files, never indexed
+SAVE_DELAY_SECONDS = 5.0 # Index changes within this window share one write
+
+# (extractor, video id), e.g. ('youtube', 'dQw4w9WgXcQ')
+VideoKey = Tuple[str, str]
+DownloadFunc = Callable[[Dict[str, Any]], Awaitable[Optional[str]]]
+
+
+def video_key(video_info: Dict[str, Any]) -> Optional[VideoKey]:
+    """Identity of a track across guilds and queries, or None if yt-dlp did not report one."""
+    extractor = video_info.get('extractor') or video_info.get('extractor_key')
+    video_id = video_info.get('id')
+    if not extractor or not video_id:
+        return None
+    return str(extractor).lower(), str(video_id)
+
+
+class MusicCache:
+    """
+    Front door for music downloads. Serves tracks already in the cache without touching the
+    network, and coalesces concurrent requests for the same (extractor, id) from any number
+    of guilds onto a single yt-dlp download.
+
+    Files are tracked in a persistent index (filename -> video key, size, last access, hits),
+    so lookups and eviction never list or stat the directory. The cache is kept under a size
+    budget by evicting least-recently-used entries as new downloads arrive, skipping files
+    that are queued or playing.
+    """
+    def __init__(
+        self,
+        download_func: DownloadFunc,
+        cache_dir: str = CACHE_DIR,
+        max_bytes: int = CACHE_MAX_BYTES,
+        protected_paths_func: Optional[Callable[[], Set[str]]] = None,
+    ):
+        self.download_func = download_func
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.protected_paths_func = protected_paths_func # Absolute paths that must not be evicted
+        self._index_path = os.path.join(cache_dir, INDEX_FILENAME)
+        self._in_flight: Dict[VideoKey, asyncio.Task] = {}
+        # filename -> {'key': 'extractor:id' or None, 'size': int, 'last_access': float, 'hits': int}, least recently used first
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._by_key: Dict[VideoKey, str] = {} # video key -> filename
+        self._total_bytes = 0
+        self._dirty = False
+        self._save_handle: Optional[asyncio.TimerHandle] = None
+        self._write_lock = threading.Lock()
+        self._generation = 0 # Bumped per snapshot; a write never replaces a newer one
+        self._written_generation = 0
+        self._load_index()
+
+    # --- Index persistence ---
+    def _load_index(self):
+        if not os.path.exists(self._index_path):
+            self._adopt_existing_files()
+            return
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # Oldest first; the index is kept in recency order from here on
+            for filename, entry in sorted(data.get('entries', {}).items(), key=lambda kv: kv[1].get('last_access', 0)):
+                self._add_entry(filename, entry)
+            log.info(f"MUSIC CACHE: Loaded {len(self._entries)} entries ({self._total_bytes / (1024*1024):.2f} MB) from '{self._index_path}'")
+        except (json.JSONDecodeError, UnicodeDecodeError, OSError) as e:
+            log.error(f"MUSIC CACHE: Error loading index '{self._index_path}': {e}. Rebuilding from directory.", exc_info=True)
+            self._entries, self._by_key, self._total_bytes = {}, {}, 0
+            self._adopt_existing_files()
+
+    def _adopt_existing_files(self):
+        """One-time migration: index files downloaded before the index existed. Their video key is unknown."""
+        if not os.path.isdir(self.cache_dir):
+            return
+        found = []
+        for dir_entry in os.scandir(self.cache_dir):
+            if not dir_entry.is_file() or dir_entry.name == INDEX_FILENAME or dir_entry.name.endswith(PARTIAL_SUFFIXES):
+                continue
+            st = dir_entry.stat()
+            found.append((dir_entry.name, {'key': None, 'size': st.st_size, 'last_access': st.st_mtime, 'hits': 0}))
+        for filename, entry in sorted(found, key=lambda item: item[1]['last_access']):
+            self._add_entry(filename, entry)
+        log.info(f"MUSIC CACHE: Built index from {len(found)} existing files ({self._total_bytes / (1024*1024):.2f} MB)")
+        self._dirty = True
+        self.flush()
+
+    def _mark_dirty(self):
+        """Marks the index changed. It is written in a worker thread SAVE_DELAY_SECONDS later."""
+        self._dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return # Written by the next flush()
+        if self._save_handle is None:
+            self._save_handle = loop.call_later(SAVE_DELAY_SECONDS, self._write_behind, loop)
+
+    def _snapshot(self) -> Tuple[int, Dict[str, Dict[str, Any]]]:
+        """Copies the index. Call from the event loop, which is the only thread mutating it."""
+        self._dirty = False
+        self._generation += 1
+        return self._generation, {name: dict(entry) for name, entry in self._entries.items()}
+
+    def _write_behind(self, loop: asyncio.AbstractEventLoop):
+        self._save_handle = None
+        loop.run_in_executor(None, self._write, *self._snapshot())
+
+    def _write(self, generation: int, entries: Dict[str, Dict[str, Any]]):
+        with self._write_lock:
+            if generation <= self._written_generation:
+                return
+            temp_path = f"{self._index_path}.tmp"
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'entries': entries}, f)
+                os.replace(temp_path, self._index_path)
+                self._written_generation = generation
+                log.debug(f"MUSIC CACHE: Saved index ({len(entries)} entries)")
+            except OSError as e:
+                log.error(f"MUSIC CACHE: Error saving index: {e}", exc_info=True)
+
+    def flush(self):
+        """Writes pending index changes now, on the calling thread. Called at startup and shutdown."""
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+        if self._dirty:
+            self._write(*self._snapshot())
+
+    # --- Entries ---
+    def _add_entry(self, filename: str, entry: Dict[str, Any]):
+        self._entries[filename] = entry
+        self._total_bytes += entry.get('size', 0)
+        if entry.get('key'):
+            extractor, _, video_id = entry['key'].partition(':')
+            self._by_key[(extractor, video_id)] = filename
+
+    def _remove_entry(self, filename: str, delete_file: bool = True):
+        entry = self._entries.pop(filename, None)
+        if not entry:
+            return
+        self._total_bytes -= entry.get('size', 0)
+        if entry.get('key'):
+            extractor, _, video_id = entry['key'].partition(':')
+            if self._by_key.get((extractor, video_id)) == filename:
+                del self._by_key[(extractor, video_id)]
+        self._mark_dirty()
+        if delete_file:
+            try:
+                asyncio.get_running_loop().run_in_executor(None, self._delete_file, filename)
+            except RuntimeError: # No loop (startup, shutdown)
+                self._delete_file(filename)
+
+    def _delete_file(self, filename: str):
+        try:
+            os.remove(os.path.join(self.cache_dir, filename))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log.warning(f"MUSIC CACHE: Could not remove '{filename}': {e}")
+
+    def cached_path(self, key: VideoKey) -> Optional[str]:
+        filename = self._by_key.get(key)
+        if not filename:
+            return None
+        path = os.path.join(self.cache_dir, filename)
+        if not os.path.isfile(path):
+            log.warning(f"MUSIC CACHE: Indexed file '{filename}' vanished. Dropping entry.")
+            self._remove_entry(filename, delete_file=False)
+            return None
+        return path
+
+    def _record(self, key: Optional[VideoKey], path: str):
+        """Indexes a finished download and evicts older entries if over budget."""
+        filename = os.path.basename(path)
+        try:
+            size = os.path.getsize(path)
+        except OSError as e:
+            log.warning(f"MUSIC CACHE: Cannot stat new download '{filename}': {e}")
+            return
+        if filename in self._entries:
+            self._remove_entry(filename, delete_file=False)
+        self._add_entry(filename, {'key': f"{key[0]}:{key[1]}" if key else None, 'size': size, 'last_access': time.time(), 'hits': 0})
+        self._mark_dirty()
+        self._evict(keep=filename)
+
+    def touch(self, path: str):
+        """Marks a cached file as just played. Called from MusicQueueItem.get_playback_source."""
+        filename = os.path.basename(path)
+        entry = self._entries.pop(filename, None)
+        if entry:
+            self._entries[filename] = entry # Re-insert so dict order tracks recency
+            entry['last_access'] = time.time()
+            entry['hits'] = entry.get('hits', 0) + 1
+            self._mark_dirty()
+
+    # --- Eviction ---
+    def _protected_filenames(self) -> Set[str]:
+        if not self.protected_paths_func:
+            return set()
+        try:
+            return {os.path.basename(p) for p in self.protected_paths_func()}
+        except Exception as e:
+            log.error(f"MUSIC CACHE: Error collecting protected paths: {e}", exc_info=True)
+            return set()
+
+    def _evict(self, keep: Optional[str] = None):
+        """Removes least recently used files until the cache fits its budget. Walks only the oldest entries needed."""
+        if self._total_bytes <= self.max_bytes:
+            return
+        protected = self._protected_filenames()
+        excess, victims = self._total_bytes - self.max_bytes, []
+        for filename, entry in self._entries.items(): # Oldest first
+            if excess <= 0:
+                break
+            if filename == keep or filename in protected:
+                continue
+            victims.append(filename)
+            excess -= entry.get('size', 0)
+        freed = 0
+        for filename in victims:
+            freed += self._entries[filename].get('size', 0)
+            self._remove_entry(filename)
+        removed = len(victims)
+        log.info(f"MUSIC CACHE: Evicted {removed} files ({freed / (1024*1024):.2f} MB). Total: {self._total_bytes / (1024*1024):.2f} MB / {self.max_bytes / (1024*1024):.0f} MB")
+
+    def expire(self, max_age_seconds: float) -> int:
+        """Drops entries not played for max_age_seconds, using the index only. Returns the number removed."""
+        cutoff = time.time() - max_age_seconds
+        protected = self._protected_filenames()
+        stale = []
+        for name, entry in self._entries.items(): # Oldest first, so stop at the first recent one
+            if entry.get('last_access', 0) >= cutoff:
+                break
+            if name not in protected:
+                stale.append(name)
+        for filename in stale:
+            self._remove_entry(filename)
+        if stale:
+            log.info(f"MUSIC CACHE: Expired {len(stale)} files unplayed for over {max_age_seconds / 86400:.0f} days")
+        return len(stale)
+
+    # --- Fetching ---
+    async def get(self, video_info: Dict[str, Any]) -> Optional[str]:
+        """Returns a local file for video_info, downloading it at most once at a time per track."""
+        title = video_info.get('title', 'Unknown Title')[:50]
+        key = video_key(video_info)
+        if key is None:
+            log.debug(f"MUSIC CACHE: No extractor/id for '{title}'. Downloading without dedup.")
+            path = await self.download_func(video_info)
+            if path:
+                self._record(None, path)
+            return path
+
+        path = self.cached_path(key)
+        if path:
+            log.info(f"MUSIC CACHE: Hit for '{title}' ({key[0]}:{key[1]}) -> '{os.path.basename(path)}'")
+            return path
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            log.info(f"MUSIC CACHE: Joining in-flight download of '{title}' ({key[0]}:{key[1]})")
+        else:
+            task = asyncio.create_task(self._download(key, video_info), name=f"MusicFetch_{key[0]}_{key[1]}")
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t, k=key: self._in_flight.pop(k, None))
+        # Shield so one cancelled waiter (e.g. its guild stopped) does not abort the download for the others
+        return await asyncio.shield(task)
+
+    async def _download(self, key: VideoKey, video_info: Dict[str, Any]) -> Optional[str]:
+        path = await self.download_func(video_info)
+        if path:
+            self._record(key, path)
+        return path
+
+    def close(self):
+        for task in list(self._in_flight.values()):
+            task.cancel()
+        self._in_flight.clear()
+        self.flush()
@@ -0,0 +1,202 @@
+# core/music_metadata.py
+
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+import config
+
+log = logging.getLogger('SoundBot.MusicMetadata')
+
+# --- Configuration ---
+METADATA_CACHE_FILE = getattr(config, 'MUSIC_METADATA_CACHE_FILE', 'music_metadata.json')
+METADATA_TTL_SECONDS = getattr(config, 'MUSIC_METADATA_TTL_HOURS', 24) * 3600 # Fresh: served without refresh
+METADATA_MAX_STALE_SECONDS = getattr(config, 'MUSIC_METADATA_MAX_STALE_DAYS', 7) * 86400 # Stale: served, refreshed in background
+METADATA_MAX_ENTRIES = getattr(config, 'MUSIC_METADATA_MAX_ENTRIES', 5000)
+SAVE_DELAY_SECONDS = 30 # Batches index writes after new lookups
+
+# Only what the bot uses. Stream URLs and format lists expire quickly and are large, so they are dropped.
+KEPT_FIELDS = ('id', 'extractor', 'extractor_key', 'title', 'webpage_url', 'original_url', 'uploader', 'duration', 'thumbnail')
+
+ExtractFunc = Callable[[str], Awaitable[Optional[Dict[str, Any]]]]
+
+_YOUTUBE_HOSTS = {'youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com', 'youtu.be'}
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_query(query: str) -> str:
+    """
+    Cache key for a /play query. YouTube URLs map to 'youtube:<id>' regardless of host or extra
+    parameters; other URLs drop the fragment; searches are case- and whitespace-insensitive.
+    """
+    query = query.strip()
+    if query.startswith(('http://', 'https://')):
+        parts = urlsplit(query)
+        host = parts.netloc.lower()
+        if host in _YOUTUBE_HOSTS:
+            if host == 'youtu.be':
+                video_id = parts.path.lstrip('/').split('/')[0]
+            elif parts.path.startswith('/shorts/'):
+                video_id = parts.path.split('/')[2] if len(parts.path.split('/')) > 2 else ''
+            else:
+                video_id = parse_qs(parts.query).get('v', [''])[0]
+            if video_id:
+                return f"youtube:{video_id}"
+        return f"url:{parts.scheme.lower()}://{host}{parts.path}{'?' + parts.query if parts.query else ''}"
+    return f"search:{_WHITESPACE_RE.sub(' ', query).casefold()}"
+
+
+def trim_info(video_info: Dict[str, Any]) -> Dict[str, Any]:
+    trimmed = {k: video_info[k] for k in KEPT_FIELDS if video_info.get(k) is not None}
+    thumbnails = video_info.get('thumbnails')
+    if 'thumbnail' not in trimmed and isinstance(thumbnails, list) and thumbnails:
+        trimmed['thumbnail'] = thumbnails[-1].get('url')
+    return trimmed
+
+
+class MusicMetadataCache:
+    """
+    TTL cache of resolved yt-dlp metadata for /play and /insert, persisted across restarts.
+    Keys are normalized queries (see normalize_query). Fresh entries return immediately;
+    stale ones return immediately too, while a background extraction refreshes them.
+    Failed lookups are not cached.
+    """
+    def __init__(
+        self,
+        extract_func: ExtractFunc,
+        cache_file: str = METADATA_CACHE_FILE,
+        ttl_seconds: float = METADATA_TTL_SECONDS,
+        max_stale_seconds: float = METADATA_MAX_STALE_SECONDS,
+        max_entries: int = METADATA_MAX_ENTRIES,
+    ):
+        self.extract_func = extract_func
+        self.cache_file = cache_file
+        self.ttl_seconds = ttl_seconds
+        self.max_stale_seconds = max(ttl_seconds, max_stale_seconds)
+        self.max_entries = max(1, max_entries)
+        # normalized query -> {'info': trimmed info, 'fetched_at': float}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._save_handle: Optional[asyncio.TimerHandle] = None
+        self._dirty = False
+        self._write_lock = threading.Lock()
+        self._generation = 0 # Bumped per snapshot; a write never replaces a newer one
+        self._written_generation = 0
+        self._load()
+
+    # --- Persistence ---
+    def _load(self):
+        if not os.path.exists(self.cache_file):
+            log.info(f"MUSIC METADATA: {self.cache_file} not found. Starting empty.")
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            cutoff = time.time() - self.max_stale_seconds
+            self._entries = {k: v for k, v in data.get('entries', {}).items() if v.get('fetched_at', 0) >= cutoff}
+            log.info(f"MUSIC METADATA: Loaded {len(self._entries)} entries from {self.cache_file}")
+        except (json.JSONDecodeError, UnicodeDecodeError, OSError) as e:
+            log.error(f"MUSIC METADATA: Error loading {self.cache_file}: {e}. Starting empty.", exc_info=True)
+            self._entries = {}
+
+    def _schedule_save(self):
+        """Marks the cache changed. It is written in a worker thread SAVE_DELAY_SECONDS later."""
+        self._dirty = True
+        if self._save_handle is None:
+            loop = asyncio.get_running_loop()
+            self._save_handle = loop.call_later(SAVE_DELAY_SECONDS, self._write_behind, loop)
+
+    def _snapshot(self) -> Tuple[int, Dict[str, Dict[str, Any]]]:
+        """Copies the entries. Call from the event loop, which is the only thread mutating them."""
+        self._dirty = False
+        self._generation += 1
+        return self._generation, {key: dict(entry) for key, entry in self._entries.items()}
+
+    def _write_behind(self, loop: asyncio.AbstractEventLoop):
+        self._save_handle = None
+        loop.run_in_executor(None, self._write, *self._snapshot())
+
+    def _write(self, generation: int, entries: Dict[str, Dict[str, Any]]):
+        with self._write_lock:
+            if generation <= self._written_generation:
+                return
+            temp_path = f"{self.cache_file}.tmp"
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'entries': entries}, f)
+                os.replace(temp_path, self.cache_file)
+                self._written_generation = generation
+                log.debug(f"MUSIC METADATA: Saved {len(entries)} entries")
+            except OSError as e:
+                log.error(f"MUSIC METADATA: Error saving {self.cache_file}: {e}", exc_info=True)
+
+    def flush(self):
+        """Writes pending changes now, on the calling thread. Called at shutdown."""
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+        if self._dirty:
+            self._write(*self._snapshot())
+
+    # --- Lookup ---
+    def _put(self, key: str, video_info: Dict[str, Any]) -> Dict[str, Any]:
+        trimmed = trim_info(video_info)
+        self._entries.pop(key, None) # Re-insert so dict order tracks recency
+        self._entries[key] = {'info': trimmed, 'fetched_at': time.time()}
+        # Direct URL queries for the same video share the entry
+        if video_info.get('extractor_key') == 'Youtube' and video_info.get('id'):
+            id_key = f"youtube:{video_info['id']}"
+            if id_key != key:
+                self._entries.pop(id_key, None)
+                self._entries[id_key] = self._entries[key]
+        while len(self._entries) > self.max_entries:
+            self._entries.pop(next(iter(self._entries)))
+        self._schedule_save()
+        return trimmed
+
+    async def _fetch(self, key: str, query: str) -> Optional[Dict[str, Any]]:
+        video_info = await self.extract_func(query)
+        if not video_info:
+            return None
+        return self._put(key, video_info)
+
+    def _refresh_in_background(self, key: str, query: str):
+        if key in self._refreshing:
+            return
+        task = asyncio.create_task(self._fetch(key, query), name=f"MetadataRefresh_{key[:40]}")
+        self._refreshing[key] = task
+        task.add_done_callback(lambda t, k=key: self._refreshing.pop(k, None))
+
+    async def resolve(self, query: str) -> Optional[Dict[str, Any]]:
+        """Returns video info for query, from cache when possible. Returns a copy the caller may keep."""
+        key = normalize_query(query)
+        entry = self._entries.get(key)
+        if entry:
+            age = time.time() - entry['fetched_at']
+            if age < self.ttl_seconds:
+                log.debug(f"MUSIC METADATA: Fresh hit for '{key[:80]}' (age {age:.0f}s)")
+                return dict(entry['info'])
+            if age < self.max_stale_seconds:
+                log.debug(f"MUSIC METADATA: Stale hit for '{key[:80]}' (age {age:.0f}s). Refreshing in background.")
+                self._refresh_in_background(key, query)
+                return dict(entry['info'])
+
+        # Miss or too old: wait for extraction, joining a refresh already in progress
+        task = self._refreshing.get(key)
+        if task is not None:
+            result = await asyncio.shield(task)
+        else:
+            result = await self._fetch(key, query)
+        return dict(result) if result else None
+
+    def close(self):
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        self._refreshing.clear()
+        self.flush()
@@ -32,6 +32,7 @@ class MusicQueueItem:
     download_path: Optional[str] = None
     last_played_at: Optional[float] = None
     type: str = "music" # To differentiate from other queue items
+    music_cache: Optional[Any] = field(default=None, repr=False, compare=False) # core.music_cache.MusicCache, for access tracking
 
     # --- Properties ---
     @property
@@ -64,6 +65,8 @@ class MusicQueueItem:
 
     async def get_playback_source(self) -> Optional[discord.AudioSource]:
         if self.download_status == DownloadStatus.READY and self.download_path and os.path.exists(self.download_path):
+            if self.music_cache:
+                self.music_cache.touch(self.download_path)
             try:
                 ffmpeg_options = {'options': '-vn'}
                 loop = asyncio.get_running_loop()
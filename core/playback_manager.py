@@ -4,7 +4,7 @@ import logging
 import io
 import os
 from collections import defaultdict
-from typing import Dict, List, Optional, Union, Any
+from typing import Dict, List, Optional, Tuple, Union, Any, Callable
 import time
 import functools
 from discord.ext import commands
@@ -12,7 +12,14 @@ from enum import Enum, auto
 
 # Local application imports
 import config
-from utils import audio_processor
+from core.audio_service import AudioProcessingService, AudioBacklogFull
+from core.audio_mixer import GuildMixer, MIXER_ENABLED
+from core.audio_sources import FirstFrameProbe
+from core.join_latency import JoinLatencyStats, JoinTiming, MAX_AGE_SECONDS as JOIN_MAX_AGE_SECONDS
+from core.sound_cache import SoundCache
+from core.sound_metadata import SoundMetadataIndex
+from core.guild_queue import GuildQueue
+from utils import file_helpers
 
 # Define Enum for playback status (ensure this is defined)
 class PlaybackMode(Enum):
@@ -26,20 +33,66 @@ log = logging.getLogger('SoundBot.PlaybackManager')
 
 # Define QueueItemType using Any for flexibility
 QueueItemType = Any
+# Called with (guild_id, reason) whenever a guild's queue changes
+QueueListener = Callable[[int, str], None]
 
 # Configuration for idle timeout
 IDLE_TIMEOUT_SECONDS = getattr(config, 'AUTO_LEAVE_TIMEOUT_SECONDS', 14400) # Default 4 hours
+GAPLESS_ENABLED = getattr(config, 'MUSIC_GAPLESS_ENABLED', True)
+PREFETCH_LEAD_SECONDS = getattr(config, 'MUSIC_PREFETCH_LEAD_SECONDS', 10) # Start the next track's decoder this long before the current one ends
+PREFETCH_PAUSE_POLL_SECONDS = 2.0 # How often a prefetch that fell due while paused checks for resume
 
 class PlaybackManager:
     """Manages voice connections, queues, and playback state for guilds."""
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.guild_queues: Dict[int, List[QueueItemType]] = defaultdict(list)
+        self.guild_queues: Dict[int, GuildQueue] = defaultdict(GuildQueue)
         self.currently_playing: Dict[int, Optional[QueueItemType]] = defaultdict(lambda: None)
         self.guild_locks: Dict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
         self.idle_timers: Dict[int, asyncio.Task] = {}
         self.playback_mode: Dict[int, PlaybackMode] = defaultdict(lambda: PlaybackMode.IDLE)
-        self.active_single_buffers: Dict[int, io.BytesIO] = {}
+        self.sound_cache = SoundCache() # Rendered PCM of previously played sounds
+        self.sound_metadata = SoundMetadataIndex() # Duration/peak/loudness measured once per stored sound
+        self.audio_service = AudioProcessingService(sound_cache=self.sound_cache, sound_metadata=self.sound_metadata) # Decodes/normalizes sounds off the event loop
+        self._queue_listeners: List[QueueListener] = []
+        self._prefetched: Dict[int, Tuple[QueueItemType, discord.AudioSource]] = {} # Primed decoder for the queue head, per guild
+        self._prefetch_timers: Dict[int, asyncio.TimerHandle] = {}
+        self.mixers: Dict[int, GuildMixer] = {} # Music bed + overlaid sounds, one per connected guild (AUDIO_MIXER_ENABLED)
+        self.join_latency = JoinLatencyStats() # Voice-state event to first frame, per stage (announce_join)
+
+    # --- Queue change events ---
+    def add_queue_listener(self, listener: QueueListener):
+        """Registers a callback run on the event loop after any queue change (add/insert/remove/advance/clear)."""
+        if listener not in self._queue_listeners:
+            self._queue_listeners.append(listener)
+
+    def remove_queue_listener(self, listener: QueueListener):
+        try:
+            self._queue_listeners.remove(listener)
+        except ValueError:
+            pass
+
+    def _notify_queue_changed(self, guild_id: int, reason: str):
+        prefetched = self._prefetched.get(guild_id)
+        if prefetched is not None:
+            queue = self.guild_queues.get(guild_id)
+            if not queue or queue[0] is not prefetched[0]: # Head removed/replaced: the primed decoder is for the wrong track
+                self._discard_prefetch(guild_id, keep_timer=True)
+                self.request_prefetch(guild_id) # Prime the new head instead, if we're already inside the lead-time window
+        for listener in list(self._queue_listeners):
+            try:
+                listener(guild_id, reason)
+            except Exception as e:
+                log.error(f"Queue listener {listener!r} failed for GID {guild_id} ({reason}): {e}", exc_info=True)
+
+    def get_voice_client(self, guild_id: int) -> Optional[discord.VoiceClient]:
+        """
+        The bot's voice client in guild_id, or None. Two dict lookups instead of scanning
+        bot.voice_clients: the client keeps a guild -> voice client map that it updates on
+        connect, move and disconnect, so there is nothing to keep in sync here.
+        """
+        guild = self.bot.get_guild(guild_id)
+        return guild.voice_client if guild else None
 
     # core/playback_manager.py
 
@@ -60,7 +113,7 @@ class PlaybackManager:
             log.error("ensure_voice_client called with invalid target_channel (no guild)")
             return None
         guild_id = guild.id
-        current_vc = discord.utils.get(self.bot.voice_clients, guild__id=guild_id)
+        current_vc = self.get_voice_client(guild_id)
 
         # --- No user variable needed for core logic ---
         # user = interaction.user if interaction else None # Not needed here anymore
@@ -127,6 +180,7 @@ class PlaybackManager:
         from utils import voice_helpers
         voice_helpers.cancel_leave_timer(self.bot, guild_id, reason=f"safe_disconnect ({reason})")
         async with self.guild_locks[guild_id]:
+            self._discard_prefetch(guild_id) # Before stop(), so the finish callback can't switch to it
             if vc.is_playing():
                 log.debug(f"Stopping active player for GID:{guild_id} during disconnect.")
                 vc.stop()
@@ -134,18 +188,10 @@ class PlaybackManager:
             self.guild_queues.pop(guild_id, None)
             self.playback_mode[guild_id] = PlaybackMode.IDLE
             self._cancel_idle_timer(guild_id)
-            buffer = self.active_single_buffers.pop(guild_id, None)
-            if buffer and not buffer.closed:
-                # --- CORRECTED SYNTAX ---
-                try:
-                    buffer.close()
-                except Exception:
-                    pass # Ignore close errors here
-                # ------------------------
-                log.debug(f"Closed lingering single-play buffer during disconnect for GID:{guild_id}")
             log.debug(f"Cleared playback state for GID:{guild_id}")
+            self._notify_queue_changed(guild_id, "disconnect")
             try:
-                current_vc = discord.utils.get(self.bot.voice_clients, guild__id=guild_id)
+                current_vc = self.get_voice_client(guild_id)
                 if current_vc and current_vc.is_connected():
                     await current_vc.disconnect(force=False)
                     log.info(f"Successfully disconnected from voice in GID:{guild_id}.")
@@ -154,8 +200,15 @@ class PlaybackManager:
             except Exception as e:
                 log.error(f"Error during voice client disconnect for GID:{guild_id}: {e}", exc_info=True)
 
-    def get_queue(self, guild_id: int) -> List[QueueItemType]:
-        return self.guild_queues.get(guild_id, [])
+    def get_queue(self, guild_id: int) -> Tuple[QueueItemType, ...]:
+        """Consistent, immutable view of the guild's queue (shared until the queue next changes)."""
+        queue = self.guild_queues.get(guild_id)
+        return queue.snapshot() if queue is not None else ()
+
+    def get_queue_item_id(self, guild_id: int, index: int) -> Optional[int]:
+        """Stable id of the item at index right now; pass it to remove_from_queue to remove exactly that item."""
+        queue = self.guild_queues.get(guild_id)
+        return queue.id_at(index) if queue is not None else None
 
     def get_current_item(self, guild_id: int) -> Optional[QueueItemType]:
         return self.currently_playing.get(guild_id)
@@ -166,8 +219,7 @@ class PlaybackManager:
         log.debug(f"ADD_TO_QUEUE (Core - GID:{guild_id}): Received item '{item_title_safe}'. Type: {type(item).__name__}") # ADD THIS
         async with self.guild_locks[guild_id]:
             log.debug(f"ADD_TO_QUEUE (Core - GID:{guild_id}): Lock acquired.") # ADD THIS
-            # Ensure the queue list exists using setdefault just in case
-            queue = self.guild_queues.setdefault(guild_id, [])
+            queue = self.guild_queues[guild_id]
             log.debug(f"ADD_TO_QUEUE (Core - GID:{guild_id}): Queue length BEFORE append: {len(queue)}") # ADD THIS
 
             queue.append(item)
@@ -181,7 +233,7 @@ class PlaybackManager:
 
             log.info(f"ADD_TO_QUEUE: GID {guild_id} - Appended item '{item_title_safe}'. New Length: {position}. Type: {type(item).__name__}") # Existing log
 
-            vc = discord.utils.get(self.bot.voice_clients, guild__id=guild_id)
+            vc = self.get_voice_client(guild_id)
             trigger_playback_check = False # Flag
             if vc and vc.is_connected() and not self.is_playing(guild_id) and position == 1:
                  current_mode = self.playback_mode.get(guild_id, PlaybackMode.IDLE)
@@ -198,6 +250,7 @@ class PlaybackManager:
             elif position != 1:
                  log.debug(f"ADD_TO_QUEUE: GID {guild_id} - Item added at Pos {position} (not 1), not triggering playback check.")
 
+        self._notify_queue_changed(guild_id, "add")
         # --- Trigger outside lock ---
         if trigger_playback_check and vc: # Ensure vc is still valid
             log.debug(f"ADD_TO_QUEUE: GID {guild_id} - Calling start_playback_if_idle task.")
@@ -207,13 +260,19 @@ class PlaybackManager:
         log.debug(f"ADD_TO_QUEUE (Core - GID:{guild_id}): Releasing lock.")
         return position # Return position regardless of whether playback was triggered now
 
+    @staticmethod
+    def _is_join_item(item: QueueItemType) -> bool:
+        """Join sounds are queued as (member, sound path, is temp TTS) tuples."""
+        return isinstance(item, tuple) and len(item) == 3 and isinstance(item[1], str)
+
     async def insert_into_queue(self, guild_id: int, index: int, item: QueueItemType):
         async with self.guild_locks[guild_id]:
             queue = self.guild_queues[guild_id]
             index = max(0, min(index, len(queue)))
             queue.insert(index, item)
             log.debug(f"Inserted item at index {index} for GID {guild_id}. New length: {len(queue)}")
-            vc = discord.utils.get(self.bot.voice_clients, guild__id=guild_id)
+            self._notify_queue_changed(guild_id, "insert")
+            vc = self.get_voice_client(guild_id)
             if index == 0 and vc and vc.is_connected() and not self.is_playing(guild_id):
                 if self.playback_mode.get(guild_id, PlaybackMode.IDLE) in [PlaybackMode.IDLE, PlaybackMode.QUEUE]:
                     log.info(f"Item inserted at front of idle queue. Triggering playback check for GID {guild_id}.")
@@ -222,16 +281,25 @@ class PlaybackManager:
                 else:
                      log.debug(f"Item inserted at front for GID {guild_id}, but mode is {self.playback_mode.get(guild_id)}, not starting playback automatically.")
 
-    async def remove_from_queue(self, guild_id: int, index: int) -> Optional[QueueItemType]:
+    async def remove_from_queue(self, guild_id: int, index: int, item_id: Optional[int] = None) -> Optional[QueueItemType]:
+        """
+        Removes the item at index, or, if item_id is given (see get_queue_item_id), that exact item
+        wherever it has moved to while waiting for the lock. Returns None if it is gone.
+        """
         async with self.guild_locks[guild_id]:
             queue = self.guild_queues.get(guild_id)
-            if queue and 0 <= index < len(queue):
-                removed_item = queue.pop(index)
-                log.debug(f"Removed item at index {index} for GID {guild_id}.")
-                return removed_item
+            if queue and item_id is not None:
+                removed_item = queue.remove_id(item_id)
+            elif queue and 0 <= index < len(queue):
+                removed_item = queue.pop_at(index)
             else:
-                log.warning(f"Attempted to remove item at invalid index {index} for GID {guild_id}. Queue length: {len(queue) if queue else 0}")
+                removed_item = None
+            if removed_item is None:
+                log.warning(f"Attempted to remove item (index {index}, id {item_id}) no longer in queue for GID {guild_id}. Queue length: {len(queue) if queue else 0}")
                 return None
+            log.debug(f"Removed item (index {index}, id {item_id}) for GID {guild_id}.")
+            self._notify_queue_changed(guild_id, "remove")
+            return removed_item
 
     async def clear_queue(self, guild_id: int):
         async with self.guild_locks[guild_id]:
@@ -239,15 +307,16 @@ class PlaybackManager:
                 count = len(self.guild_queues[guild_id])
                 self.guild_queues.pop(guild_id, None)
                 log.info(f"Cleared queue ({count} items) for GID {guild_id}")
+                self._notify_queue_changed(guild_id, "clear")
             else:
                 log.debug(f"Queue already empty or non-existent for GID {guild_id}, clear request ignored.")
 
     def is_playing(self, guild_id: int) -> bool:
-        vc = discord.utils.get(self.bot.voice_clients, guild__id=guild_id)
+        vc = self.get_voice_client(guild_id)
         return bool(vc and vc.is_playing() and self.currently_playing.get(guild_id) is not None)
 
     async def start_playback_if_idle(self, guild_id: int):
-        vc = discord.utils.get(self.bot.voice_clients, guild__id=guild_id)
+        vc = self.get_voice_client(guild_id)
         async with self.guild_locks[guild_id]:
             if vc and vc.is_connected() and not self.is_playing(guild_id) and self.guild_queues.get(guild_id):
                 if self.playback_mode.get(guild_id, PlaybackMode.IDLE) in [PlaybackMode.IDLE, PlaybackMode.QUEUE]:
@@ -263,11 +332,13 @@ class PlaybackManager:
                  log.debug(f"Start playback check for GID {guild_id}: Bot not in voice channel.")
 
     async def skip_track(self, guild_id: int) -> bool:
-        vc = discord.utils.get(self.bot.voice_clients, guild__id=guild_id)
+        vc = self.get_voice_client(guild_id)
         async with self.guild_locks[guild_id]:
             if self.is_playing(guild_id) and vc:
                 log.info(f"Skipping track for GID {guild_id}")
-                vc.stop()
+                mixer = self.mixers.get(guild_id)
+                if not (mixer is not None and vc.source is mixer and mixer.stop_bed()): # Ends only the music; overlaid sounds finish
+                    vc.stop()
                 return True
             else:
                 log.warning(f"Skip requested for GID {guild_id}, but nothing is playing.")
@@ -275,10 +346,11 @@ class PlaybackManager:
 
     async def stop_playback(self, guild_id: int, clear_queue: bool = True, leave_channel: bool = True):
         log.info(f"Received stop command for GID {guild_id}. Clear: {clear_queue}, Leave: {leave_channel}")
-        vc = discord.utils.get(self.bot.voice_clients, guild__id=guild_id)
+        vc = self.get_voice_client(guild_id)
         async with self.guild_locks[guild_id]:
             self.playback_mode[guild_id] = PlaybackMode.IDLE
             self._cancel_idle_timer(guild_id)
+            self._discard_prefetch(guild_id)
             if vc and vc.is_playing():
                 log.debug(f"Stopping player for GID {guild_id} due to stop command.")
                 vc.stop()
@@ -288,15 +360,7 @@ class PlaybackManager:
                     count = len(self.guild_queues[guild_id])
                     self.guild_queues.pop(guild_id, None)
                     log.info(f"Cleared queue ({count} items) for GID {guild_id} due to stop command.")
-            buffer = self.active_single_buffers.pop(guild_id, None)
-            if buffer and not buffer.closed:
-                # --- CORRECTED SYNTAX ---
-                try:
-                    buffer.close()
-                except Exception:
-                    pass
-                # ------------------------
-                log.debug(f"Closed lingering single-play buffer during stop command for GID:{guild_id}")
+                    self._notify_queue_changed(guild_id, "clear")
             if leave_channel and vc and vc.is_connected():
                  self.bot.loop.create_task(self.safe_disconnect(vc, manual_leave=True, reason="stop_playback command"))
             elif vc and vc.is_connected():
@@ -353,25 +417,26 @@ class PlaybackManager:
                     log.debug(f"Music Item: '{title[:50]}' Status Enum: {status}")
 
                     if status == DownloadStatus.READY:
-                        audio_source = await item_to_try.get_playback_source()
+                        audio_source = self._take_prefetch(guild_id, item_to_try) or await item_to_try.get_playback_source()
                         if audio_source:
-                            dequeued_item = queue.pop(0)
+                            dequeued_item = queue.popleft()
                             self.currently_playing[guild_id] = dequeued_item
                             self._cancel_idle_timer(guild_id)
                             self.playback_mode[guild_id] = PlaybackMode.QUEUE
                             after_callback = functools.partial(self._playback_finished_callback, guild_id, vc)
                             log.info(f"Playing '{title}' in GID {guild_id}")
-                            vc.play(audio_source, after=after_callback)
+                            self._play_on(guild_id, vc, audio_source, after_callback, label=title, bed=True)
+                            self._schedule_prefetch(guild_id, dequeued_item)
                             next_item_played = True
                             break
                         else:
                             log.error(f"Music Item '{title}' status READY but get_playback_source failed. Skipping. GID: {guild_id}")
                             item_to_try.download_status = DownloadStatus.FAILED
-                            queue.pop(0)
+                            queue.popleft()
                             continue
                     elif status == DownloadStatus.FAILED:
                         log.warning(f"Skipping failed Music Item: '{title}'. GID: {guild_id}")
-                        queue.pop(0)
+                        queue.popleft()
                         continue
                     elif status == DownloadStatus.PENDING or status == DownloadStatus.DOWNLOADING:
                         log.info(f"Music Item '{title}' not ready ({status}). Waiting for downloader. GID {guild_id}")
@@ -379,25 +444,31 @@ class PlaybackManager:
                     else:
                         log.error(f"Unexpected Music Item status '{status}' for item '{title}'. Treating as Failed. GID: {guild_id}")
                         item_to_try.download_status = DownloadStatus.FAILED
-                        queue.pop(0)
+                        queue.popleft()
                         continue
 
-                elif isinstance(item_to_try, tuple) and len(item_to_try) == 3 and isinstance(item_to_try[1], str):
+                elif self._is_join_item(item_to_try):
                     member, sound_path, is_temp_tts = item_to_try
                     sound_basename = os.path.basename(sound_path)
+                    if not member.voice or member.voice.channel != vc.channel:
+                        log.info(f"_play_next: GID {guild_id} - {member.display_name} already left, dropping join sound '{sound_basename}'")
+                        self.join_latency.record_drop("left")
+                        queue.popleft()
+                        if is_temp_tts: self._delete_temp_sound(sound_path)
+                        continue
                     log.info(f"_play_next: GID {guild_id} - Attempting to process join sound tuple: '{sound_basename}' for {member.display_name}")
 
-                    log.debug(f"_play_next: GID {guild_id} - Calling audio_processor for join sound: {sound_path}")
+                    log.debug(f"_play_next: GID {guild_id} - Calling audio_service for join sound: {sound_path}")
                     try:
-                        audio_source, audio_buffer = audio_processor.process_audio(sound_path)
-                        log.debug(f"_play_next: GID {guild_id} - Audio processor result for '{sound_basename}': Source valid={audio_source is not None}, Buffer valid={audio_buffer is not None}")
+                        audio_source = await self.audio_service.get_source(guild_id, sound_path, cacheable=not is_temp_tts)
+                        log.debug(f"_play_next: GID {guild_id} - Audio service result for '{sound_basename}': Source valid={audio_source is not None}")
                     except Exception as proc_err:
-                        log.error(f"_play_next: GID {guild_id} - Exception during audio_processor.process_audio for '{sound_path}': {proc_err}", exc_info=True)
-                        audio_source, audio_buffer = None, None
+                        log.error(f"_play_next: GID {guild_id} - Exception during audio_service.get_source for '{sound_path}': {proc_err}", exc_info=True)
+                        audio_source = None
 
-                    if audio_source and audio_buffer:
-                        log.debug(f"_play_next: GID {guild_id} - Join sound audio processed successfully. Buffer size: {audio_buffer.getbuffer().nbytes} bytes.")
-                        dequeued_item_tuple = queue.pop(0)
+                    if audio_source:
+                        log.debug(f"_play_next: GID {guild_id} - Join sound audio source ready ({type(audio_source).__name__}).")
+                        dequeued_item_tuple = queue.popleft()
                         self.currently_playing[guild_id] = dequeued_item_tuple
                         self._cancel_idle_timer(guild_id)
                         self.playback_mode[guild_id] = PlaybackMode.QUEUE
@@ -406,19 +477,9 @@ class PlaybackManager:
                             gid_cb = guild_id
                             path_cb = sound_path
                             temp_cb = is_temp_tts
-                            buffer_cb = audio_buffer
                             member_name_cb = member.display_name
                             log.debug(f"after_join_sound: GID {gid_cb} - Callback triggered for '{os.path.basename(path_cb)}' (User: {member_name_cb}). Error: {error}")
-                            if buffer_cb:
-                                if not buffer_cb.closed:
-                                    # --- CORRECTED SYNTAX ---
-                                    try:
-                                        buffer_cb.close()
-                                    except Exception as buf_e:
-                                        log.warning(f"after_join_sound: GID {gid_cb} - Error closing buffer: {buf_e}")
-                                    # ------------------------
-                                log.debug(f"after_join_sound: GID {gid_cb} - Closed audio buffer.")
-                            else: log.warning(f"after_join_sound: GID {gid_cb} - Buffer was None in callback.")
+                            # The voice player calls audio_source.cleanup() itself, releasing its buffer/mapping
                             if temp_cb and path_cb and os.path.exists(path_cb):
                                 try:
                                     os.remove(path_cb)
@@ -440,34 +501,26 @@ class PlaybackManager:
                             break
                         except discord.ClientException as play_exc:
                              log.error(f"_play_next: GID {guild_id} - ClientException during vc.play() for join sound '{sound_basename}': {play_exc}", exc_info=True)
-                             if audio_buffer and not audio_buffer.closed:
-                                 # --- CORRECTED SYNTAX ---
-                                 try: audio_buffer.close()
-                                 except Exception: pass
-                                 # ------------------------
+                             audio_source.cleanup()
                              log.error(f"_play_next: GID {guild_id} - Failed to start playback for join sound '{sound_basename}'. Skipping.")
-                             if queue and queue[0] == item_to_try: queue.pop(0)
+                             if queue and queue[0] == item_to_try: queue.popleft()
                              continue
                         except Exception as play_exc_other:
                              log.error(f"_play_next: GID {guild_id} - Unexpected Exception during vc.play() for join sound '{sound_basename}': {play_exc_other}", exc_info=True)
-                             if audio_buffer and not audio_buffer.closed:
-                                 # --- CORRECTED SYNTAX ---
-                                 try: audio_buffer.close()
-                                 except Exception: pass
-                                 # ------------------------
+                             audio_source.cleanup()
                              log.error(f"_play_next: GID {guild_id} - Failed to start playback for join sound '{sound_basename}'. Skipping.")
-                             if queue and queue[0] == item_to_try: queue.pop(0)
+                             if queue and queue[0] == item_to_try: queue.popleft()
                              continue
                     else:
-                        log.error(f"_play_next: GID {guild_id} - Failed to process join sound '{sound_basename}' for {member.display_name} (audio_processor returned None). Skipping.")
-                        queue.pop(0)
+                        log.error(f"_play_next: GID {guild_id} - Failed to process join sound '{sound_basename}' for {member.display_name} (audio_service returned None). Skipping.")
+                        queue.popleft()
                         if is_temp_tts and os.path.exists(sound_path):
                             try: os.remove(sound_path)
                             except Exception as e: log.warning(f"Failed to delete failed temp join sound {sound_path}: {e}")
                         continue
                 else:
                     log.error(f"Unknown item type in queue for GID {guild_id}: {item_to_try}. Skipping.")
-                    queue.pop(0)
+                    queue.popleft()
                     continue
             # --- End of while queue loop ---
 
@@ -494,11 +547,15 @@ class PlaybackManager:
             if lock_acquired and self.guild_locks[guild_id].locked():
                 log.debug(f"Releasing lock for GID {guild_id} in _play_next")
                 self.guild_locks[guild_id].release()
+            if lock_acquired:
+                self._notify_queue_changed(guild_id, "play_next") # Queue advanced, next items move into the download window
 
     def _playback_finished_callback(self, guild_id: int, vc: discord.VoiceClient, error: Optional[Exception]):
         """Generic callback executed by discord.py after vc.play() finishes (used by music items)."""
         log.debug(f"_playback_finished_callback: GID {guild_id}. Error: {error}")
         if error: log.error(f"Playback error reported in generic callback for GID {guild_id}: {error}", exc_info=error)
+        if self._switch_to_prefetch(guild_id, vc):
+            return
         self.bot.loop.call_soon_threadsafe(
             lambda: self.bot.loop.create_task(self._playback_finished_task(guild_id, vc, error))
         )
@@ -508,7 +565,7 @@ class PlaybackManager:
         log.debug(f"Async finish handler task started for GID {guild_id}. Error: {error}")
         schedule_next_play = False
 
-        current_vc_check = discord.utils.get(self.bot.voice_clients, guild__id=guild_id)
+        current_vc_check = self.get_voice_client(guild_id)
         if not current_vc_check or not current_vc_check.is_connected():
             log.warning(f"Finish handler: VC disconnected for GID {guild_id} before task execution. Cleaning up state.")
             self.currently_playing.pop(guild_id, None)
@@ -545,6 +602,261 @@ class PlaybackManager:
         else:
              log.debug(f"Finish handler: No need to schedule _play_next for GID {guild_id}.")
 
+    # --- Gapless music ---
+    def _schedule_prefetch(self, guild_id: int, current_item: QueueItemType):
+        """Primes the next track's decoder PREFETCH_LEAD_SECONDS before current_item is due to end."""
+        if not GAPLESS_ENABLED or not isinstance(current_item, MusicQueueItem):
+            return
+        handle = self._prefetch_timers.pop(guild_id, None)
+        if handle: handle.cancel()
+        duration = current_item.duration_sec
+        delay = max(0.0, duration - PREFETCH_LEAD_SECONDS) if duration else 0.0
+        self._prefetch_timers[guild_id] = self.bot.loop.call_later(delay, self._prefetch_due, guild_id)
+
+    def _prefetch_due(self, guild_id: int, paused_since: Optional[float] = None):
+        """
+        The timer runs on wall-clock time from the track's start. If it falls due while paused, priming
+        would hold the decoder open through the pause, so it waits for resume and is then pushed back
+        by the pause it saw (the track's end moved back by that much).
+        """
+        self._prefetch_timers.pop(guild_id, None)
+        vc = self.get_voice_client(guild_id)
+        if vc and vc.is_paused():
+            since = paused_since if paused_since is not None else time.monotonic()
+            self._prefetch_timers[guild_id] = self.bot.loop.call_later(PREFETCH_PAUSE_POLL_SECONDS, self._prefetch_due, guild_id, since)
+            return
+        if paused_since is not None:
+            delay = time.monotonic() - paused_since
+            log.debug(f"Playback resumed for GID {guild_id}. Prefetch of the next track pushed back {delay:.0f}s")
+            self._prefetch_timers[guild_id] = self.bot.loop.call_later(delay, self._prefetch_due, guild_id)
+            return
+        self.bot.loop.create_task(self._prefetch_next(guild_id), name=f"Prefetch_{guild_id}")
+
+    def request_prefetch(self, guild_id: int):
+        """Called when the queue head becomes READY. Primes it now if the lead-time window has already started."""
+        if GAPLESS_ENABLED and guild_id not in self._prefetch_timers and self.is_playing(guild_id):
+            self.bot.loop.create_task(self._prefetch_next(guild_id), name=f"Prefetch_{guild_id}")
+
+    async def _prefetch_next(self, guild_id: int):
+        """Starts the decoder for the READY item at the queue head, so its first frames are buffered when it's needed."""
+        queue = self.guild_queues.get(guild_id)
+        if guild_id in self._prefetched or not queue or self.playback_mode.get(guild_id) != PlaybackMode.QUEUE:
+            return
+        item = queue[0]
+        if not isinstance(item, MusicQueueItem) or item.download_status != DownloadStatus.READY:
+            return
+        source = await item.get_playback_source()
+        if source is None:
+            return
+        queue = self.guild_queues.get(guild_id) # Re-check: the queue may have moved while ffmpeg started
+        if guild_id in self._prefetched or not queue or queue[0] is not item or self.playback_mode.get(guild_id) != PlaybackMode.QUEUE:
+            source.cleanup()
+            return
+        self._prefetched[guild_id] = (item, source)
+        log.debug(f"Prefetched next track '{item.title[:50]}' for GID {guild_id}")
+
+    def _take_prefetch(self, guild_id: int, item: QueueItemType) -> Optional[discord.AudioSource]:
+        prefetched = self._prefetched.pop(guild_id, None)
+        if prefetched is None:
+            return None
+        if prefetched[0] is not item:
+            prefetched[1].cleanup()
+            return None
+        return prefetched[1]
+
+    def _discard_prefetch(self, guild_id: int, keep_timer: bool = False):
+        if not keep_timer:
+            handle = self._prefetch_timers.pop(guild_id, None)
+            if handle: handle.cancel()
+        prefetched = self._prefetched.pop(guild_id, None) # pop() is atomic, so only one of us and the voice thread gets it
+        if prefetched is not None:
+            log.debug(f"Discarding prefetched track for GID {guild_id}")
+            prefetched[1].cleanup()
+
+    def _switch_to_prefetch(self, guild_id: int, vc: discord.VoiceClient) -> bool:
+        """
+        Runs on the voice thread as a track ends. If the next track is primed, starts it right here
+        instead of after the round trip through the event loop, then lets the loop catch up its state.
+        """
+        prefetched = self._prefetched.pop(guild_id, None)
+        if prefetched is None:
+            return False
+        item, source = prefetched
+        if self.playback_mode.get(guild_id) != PlaybackMode.QUEUE or not vc.is_connected():
+            source.cleanup()
+            return False
+        after = functools.partial(self._playback_finished_callback, guild_id, vc)
+        try:
+            if MIXER_ENABLED:
+                mixer = self.mixers.get(guild_id)
+                if mixer is None or not mixer.set_bed(source, after, label=item.title): # Mixer is being torn down (stop/disconnect)
+                    source.cleanup()
+                    return False
+            else:
+                vc.play(source, after=after)
+        except Exception as e:
+            log.warning(f"Gapless switch failed for GID {guild_id}, falling back to the normal path: {e}")
+            source.cleanup()
+            return False
+        log.info(f"Playing '{item.title}' in GID {guild_id} (gapless)")
+        self.bot.loop.call_soon_threadsafe(
+            lambda: self.bot.loop.create_task(self._gapless_switched(guild_id, item), name=f"GaplessSwitched_{guild_id}")
+        )
+        return True
+
+    async def _gapless_switched(self, guild_id: int, item: MusicQueueItem):
+        """Event-loop half of a gapless switch: advance the queue to the item that is already playing."""
+        async with self.guild_locks[guild_id]:
+            last_item = self.currently_playing.get(guild_id)
+            if isinstance(last_item, MusicQueueItem):
+                last_item.last_played_at = time.time()
+            queue = self.guild_queues.get(guild_id)
+            if queue and queue[0] is item:
+                queue.popleft()
+            else:
+                log.warning(f"Gapless switch for GID {guild_id}: '{item.title[:50]}' was no longer at the queue head")
+            self.currently_playing[guild_id] = item
+            self._cancel_idle_timer(guild_id)
+        self._notify_queue_changed(guild_id, "play_next")
+        self._schedule_prefetch(guild_id, item)
+
+    # --- Mixer ---
+    def _play_on(self, guild_id: int, vc: discord.VoiceClient, source: discord.AudioSource,
+                 after: Callable[[Optional[Exception]], None], label: str, bed: bool = False):
+        """
+        Starts source on vc: as the guild mixer's music bed (bed=True) or as a sound overlaid on
+        it, starting a new mixer if none is running. Without the mixer, plays it directly.
+        """
+        if not MIXER_ENABLED:
+            vc.play(source, after=after)
+            return
+        mixer = self.mixers.get(guild_id)
+        if mixer is not None and vc.source is mixer and vc.is_playing():
+            if mixer.set_bed(source, after, label) if bed else mixer.add_overlay(source, after, label):
+                return
+        mixer = GuildMixer(guild_id)
+        if bed:
+            mixer.set_bed(source, after, label)
+        else:
+            mixer.add_overlay(source, after, label)
+        if vc.is_playing():
+            vc.stop() # A mixer that has just run out, its player not yet stopped
+        self.mixers[guild_id] = mixer
+        try:
+            vc.play(mixer, after=functools.partial(self._mixer_finished_callback, guild_id, mixer))
+        except Exception:
+            self.mixers.pop(guild_id, None) # Caller cleans up source
+            raise
+        log.debug(f"Started mixer for GID {guild_id}")
+
+    def _mixer_finished_callback(self, guild_id: int, mixer: GuildMixer, error: Optional[Exception]):
+        if error: log.error(f"Mixer error for GID {guild_id}: {error}", exc_info=error)
+        self.bot.loop.call_soon_threadsafe(self._forget_mixer, guild_id, mixer)
+
+    def _forget_mixer(self, guild_id: int, mixer: GuildMixer):
+        if self.mixers.get(guild_id) is mixer:
+            del self.mixers[guild_id]
+
+    @staticmethod
+    def _delete_temp_sound(path: str):
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+                log.info(f"Deleted temporary sound file: {path}")
+            except OSError as e:
+                log.warning(f"Failed to delete temporary sound file {path}: {e}")
+
+    def _overlay_after(self, guild_id: int, label: str, temp_path: Optional[str] = None,
+                       on_done: Optional[Callable[[], None]] = None) -> Callable[[Optional[Exception]], None]:
+        """After callback for an overlaid sound (voice thread): delete its temp file / close its buffer, then check idle."""
+        def after(error: Optional[Exception]):
+            if error: log.error(f"Error during overlaid sound '{label}' for GID {guild_id}: {error}", exc_info=error)
+            if temp_path: self._delete_temp_sound(temp_path)
+            if on_done:
+                try: on_done()
+                except Exception as e: log.warning(f"Error releasing overlaid sound '{label}': {e}")
+            self.bot.loop.call_soon_threadsafe(self._overlay_finished, guild_id)
+        return after
+
+    def _overlay_finished(self, guild_id: int):
+        vc = self.get_voice_client(guild_id)
+        if (vc and vc.is_connected() and not self.is_playing(guild_id) and not self.guild_queues.get(guild_id)
+                and self.playback_mode.get(guild_id, PlaybackMode.IDLE) == PlaybackMode.IDLE):
+            self._start_idle_timer(guild_id, vc)
+
+    # --- Join announcements (priority lane) ---
+    async def announce_join(self, member: discord.Member, channel: discord.VoiceChannel, sound_path: str,
+                            is_temp_tts: bool, event_at: float) -> bool:
+        """
+        Plays a join announcement as soon as possible after the voice-state event at event_at (time.monotonic()).
+        The sound is rendered while the bot connects, then mixed over whatever is playing without
+        the guild lock or the queue. It is dropped if the member has already left channel or it is
+        older than JOIN_SOUND_MAX_AGE_SECONDS. Stage timings go to self.join_latency.
+        Without the mixer it is queued ahead of music, behind join sounds already waiting (after the current track).
+        """
+        guild_id = channel.guild.id
+        sound_basename = os.path.basename(sound_path)
+        temp_path = sound_path if is_temp_tts else None
+        timing = JoinTiming(event_at)
+        timing.mark('resolve')
+
+        if not MIXER_ENABLED:
+            async with self.guild_locks[guild_id]:
+                queue = self.guild_queues[guild_id]
+                position = 0
+                while position < len(queue) and self._is_join_item(queue[position]):
+                    position += 1 # Behind earlier joins, so announcements play in arrival order
+                queue.insert(position, (member, sound_path, is_temp_tts))
+                log.debug(f"JOIN LANE: GID {guild_id} - Queued join sound '{sound_basename}' at index {position}")
+                self._notify_queue_changed(guild_id, "insert")
+            # start_playback_if_idle is the only place that starts the loop for it
+            if await self.ensure_voice_client(None, channel, action_type="JOIN SOUND"):
+                await self.start_playback_if_idle(guild_id)
+            return True
+
+        render_task = self.bot.loop.create_task(
+            self.audio_service.get_source(guild_id, sound_path, cacheable=not is_temp_tts), name=f"JoinRender_{guild_id}"
+        )
+        vc = await self.ensure_voice_client(None, channel, action_type="JOIN SOUND")
+        timing.mark('voice')
+        try:
+            audio_source = await render_task
+        except Exception as e:
+            log.error(f"JOIN LANE: GID {guild_id} - Could not process '{sound_basename}': {e}", exc_info=not isinstance(e, AudioBacklogFull))
+            audio_source = None
+        timing.mark('source')
+
+        stale_reason = None
+        if not vc or not audio_source:
+            stale_reason = "failed"
+        elif not member.voice or member.voice.channel != channel:
+            stale_reason = "left"
+        elif timing.age() > JOIN_MAX_AGE_SECONDS:
+            stale_reason = "expired"
+        if stale_reason:
+            log.info(f"JOIN LANE: GID {guild_id} - Dropping join sound '{sound_basename}' for {member.display_name} ({stale_reason}, {timing.age():.1f}s after join)")
+            self.join_latency.record_drop(stale_reason)
+            if audio_source: audio_source.cleanup()
+            if temp_path: self._delete_temp_sound(temp_path)
+            return False
+
+        label = f"{member.display_name}: {sound_basename}"
+        def first_frame():
+            timing.mark('first_frame')
+            self.join_latency.record(timing, label)
+        try:
+            self._play_on(guild_id, vc, FirstFrameProbe(audio_source, first_frame),
+                          self._overlay_after(guild_id, sound_basename, temp_path), label=sound_basename)
+        except Exception as e:
+            log.error(f"JOIN LANE: GID {guild_id} - Failed to start '{sound_basename}': {e}", exc_info=True)
+            self.join_latency.record_drop("failed")
+            audio_source.cleanup()
+            if temp_path: self._delete_temp_sound(temp_path)
+            return False
+        self._cancel_idle_timer(guild_id)
+        log.info(f"JOIN LANE: Playing join sound '{sound_basename}' for {member.display_name} in GID {guild_id}")
+        return True
+
     def _start_idle_timer(self, guild_id: int, vc: discord.VoiceClient):
         """Starts or resets the idle disconnect timer."""
         if IDLE_TIMEOUT_SECONDS <= 0: return
@@ -567,7 +879,7 @@ class PlaybackManager:
              await asyncio.sleep(IDLE_TIMEOUT_SECONDS)
              log.info(f"Idle timer expired for GID {guild_id}. Checking state...")
              async with self.guild_locks[guild_id]:
-                 current_vc = discord.utils.get(self.bot.voice_clients, guild__id=guild_id)
+                 current_vc = self.get_voice_client(guild_id)
                  if (current_vc and vc.channel and current_vc.channel == vc.channel and
                      not self.is_playing(guild_id) and
                      not self.guild_queues.get(guild_id) and
@@ -591,7 +903,8 @@ class PlaybackManager:
              log.warning("play_single_sound called with invalid interaction state.")
              if interaction: await self._try_respond(interaction, "❌ Cannot play sound: Invalid user or voice state.", ephemeral=True)
              return False
-        guild, user, target_channel = interaction.guild, interaction.user, user.voice.channel
+        guild, user = interaction.guild, interaction.user
+        target_channel = user.voice.channel
         guild_id = guild.id
         sound_basename = os.path.basename(sound_path)
         log_display_name = display_name or sound_basename
@@ -600,33 +913,44 @@ class PlaybackManager:
             log.error(f"Single sound file not found: {sound_path}")
             await self._try_respond(interaction, "❌ Internal error: Could not find the audio file to play.", ephemeral=True)
             return False
+        file_helpers.sound_library.record_use(sound_path) # Ranks frequently played sounds first in autocomplete
 
-        lock_acquired, audio_buffer = False, None
+        # Process before taking the guild lock so queue/skip/stop stay responsive while decoding
+        log.debug(f"Processing single sound file '{sound_basename}' using audio_service...")
+        try:
+            audio_source = await self.audio_service.get_source(guild_id, sound_path)
+            log.debug(f"Audio service result for '{sound_basename}': Source valid={audio_source is not None}")
+        except AudioBacklogFull:
+             log.warning(f"Audio processing backlog full, rejecting single sound '{sound_basename}' for GID {guild_id}")
+             await self._try_respond(interaction, "⏳ The bot is busy processing other sounds. Please try again in a moment.", ephemeral=True)
+             return False
+        except Exception as proc_err:
+             log.error(f"Exception during audio_service.get_source for '{sound_path}' in play_single_sound: {proc_err}", exc_info=True)
+             audio_source = None
+
+        if not audio_source:
+             log.error(f"Failed to process single sound file '{sound_path}' for GID {guild_id}")
+             await self._try_respond(interaction, "❌ Error processing the audio file.", ephemeral=True)
+             return False
+        log.debug(f"Audio processed successfully for '{sound_basename}' ({type(audio_source).__name__}).")
+
+        lock_acquired = False
         try:
             await asyncio.wait_for(self.guild_locks[guild_id].acquire(), timeout=10.0)
             lock_acquired = True
             log.debug(f"Acquired lock for GID {guild_id} in play_single_sound")
             vc = await self.ensure_voice_client(interaction, target_channel, "SINGLE SOUND")
-            if not vc: return False
+            if not vc:
+                audio_source.cleanup()
+                return False
 
-            log.debug(f"Processing single sound file '{sound_basename}' using audio_processor...")
-            try:
-                audio_source, audio_buffer = audio_processor.process_audio(sound_path)
-                log.debug(f"Audio processor result for '{sound_basename}': Source valid={audio_source is not None}, Buffer valid={audio_buffer is not None}")
-            except Exception as proc_err:
-                 log.error(f"Exception during audio_processor.process_audio for '{sound_path}' in play_single_sound: {proc_err}", exc_info=True)
-                 audio_source, audio_buffer = None, None
-
-            if not audio_source or not audio_buffer:
-                 log.error(f"Failed to process single sound file '{sound_path}' for GID {guild_id}")
-                 await self._try_respond(interaction, "❌ Error processing the audio file.", ephemeral=True)
-                 if audio_buffer and not audio_buffer.closed:
-                     # --- CORRECTED SYNTAX ---
-                     try: audio_buffer.close()
-                     except Exception: pass
-                     # ------------------------
-                 return False
-            log.debug(f"Audio processed successfully for '{sound_basename}'.")
+            if MIXER_ENABLED:
+                # Mixed over whatever is playing; the queue keeps going underneath
+                self._play_on(guild_id, vc, audio_source, self._overlay_after(guild_id, sound_basename), label=sound_basename)
+                self._cancel_idle_timer(guild_id)
+                log.info(f"Started playing single sound file '{log_display_name}' in GID {guild_id} (mixed)")
+                await self._try_respond(interaction, f"▶️ Playing `{log_display_name}`...", ephemeral=False)
+                return True
 
             original_mode = self.playback_mode.get(guild_id, PlaybackMode.IDLE)
             self.playback_mode[guild_id] = PlaybackMode.SINGLE_SOUND
@@ -636,29 +960,14 @@ class PlaybackManager:
 
             def single_sound_finished(error: Optional[Exception]):
                 async def async_cleanup():
-                    gid_cb, original_mode_cb, path_cb, buffer_cb = guild_id, original_mode, sound_path, audio_buffer
+                    gid_cb, original_mode_cb, path_cb = guild_id, original_mode, sound_path
                     log.debug(f"single_sound_finished callback triggered for GID {gid_cb}. Sound: {os.path.basename(path_cb)}. Error: {error}")
-                    if buffer_cb:
-                         if not buffer_cb.closed:
-                            # --- CORRECTED SYNTAX ---
-                            try: buffer_cb.close()
-                            except Exception as e: log.warning(f"Error closing single sound (file) buffer: {e}")
-                            # ------------------------
-                         log.debug(f"Closed buffer for single sound file '{os.path.basename(path_cb)}' in GID {gid_cb}")
-                    else: log.warning(f"Single sound (file) finished callback missing buffer for GID {gid_cb}")
-                    stored_buffer = self.active_single_buffers.pop(gid_cb, None)
-                    if stored_buffer != buffer_cb and stored_buffer is not None:
-                         log.warning(f"Mismatched buffer found/removed in active_single_buffers for GID {gid_cb}")
-                         if not stored_buffer.closed:
-                            # --- CORRECTED SYNTAX ---
-                            try: stored_buffer.close()
-                            except Exception: pass
-                            # ------------------------
+                    # The voice player has already called audio_source.cleanup()
                     async with self.guild_locks[gid_cb]:
                         if self.playback_mode.get(gid_cb) == PlaybackMode.SINGLE_SOUND:
                              self.playback_mode[gid_cb] = original_mode_cb
                              log.info(f"Reverted playback mode to {original_mode_cb} for GID {gid_cb} after single sound file.")
-                             current_vc_cb = discord.utils.get(self.bot.voice_clients, guild__id=gid_cb)
+                             current_vc_cb = self.get_voice_client(gid_cb)
                              if current_vc_cb and current_vc_cb.is_connected():
                                  if original_mode_cb == PlaybackMode.QUEUE and self.guild_queues.get(gid_cb):
                                      log.info(f"Attempting to resume queue playback for GID {gid_cb}.")
@@ -672,14 +981,6 @@ class PlaybackManager:
                 asyncio.run_coroutine_threadsafe(async_cleanup(), self.bot.loop)
             # --- End callback ---
 
-            old_buffer = self.active_single_buffers.pop(guild_id, None)
-            if old_buffer and not old_buffer.closed:
-                # --- CORRECTED SYNTAX ---
-                try: old_buffer.close()
-                except Exception: pass
-                # ------------------------
-            self.active_single_buffers[guild_id] = audio_buffer
-
             vc.play(audio_source, after=single_sound_finished)
             log.info(f"Started playing single sound file '{log_display_name}' in GID {guild_id}")
             await self._try_respond(interaction, f"▶️ Playing `{log_display_name}`...", ephemeral=False)
@@ -687,32 +988,18 @@ class PlaybackManager:
         except asyncio.TimeoutError:
             log.error(f"Timeout acquiring lock for GID {guild_id} in play_single_sound.")
             await self._try_respond(interaction, "❌ Could not acquire playback lock.", ephemeral=True)
-            if audio_buffer and not audio_buffer.closed:
-                # --- CORRECTED SYNTAX ---
-                try: audio_buffer.close()
-                except Exception: pass
-                # ------------------------
+            audio_source.cleanup()
             return False
         except discord.ClientException as e:
              log.error(f"ClientException during single sound file playback: {e}", exc_info=True)
              await self._try_respond(interaction, f"❌ Playback error: {e}", ephemeral=True)
              self.playback_mode[guild_id] = PlaybackMode.IDLE
-             if audio_buffer and not audio_buffer.closed:
-                 # --- CORRECTED SYNTAX ---
-                 try: audio_buffer.close()
-                 except Exception: pass
-                 # ------------------------
-             self.active_single_buffers.pop(guild_id, None)
+             audio_source.cleanup()
              return False
         except Exception as e:
             log.error(f"Unexpected error in play_single_sound: {e}", exc_info=True)
             self.playback_mode[guild_id] = PlaybackMode.IDLE
-            if audio_buffer and not audio_buffer.closed:
-                # --- CORRECTED SYNTAX ---
-                try: audio_buffer.close()
-                except Exception: pass
-                # ------------------------
-            self.active_single_buffers.pop(guild_id, None)
+            audio_source.cleanup()
             await self._try_respond(interaction, "❌ Unexpected error playing sound.", ephemeral=True)
             return False
         finally:
@@ -721,9 +1008,9 @@ class PlaybackManager:
                 self.guild_locks[guild_id].release()
 
     async def play_audio_source_now(
-        self, interaction: discord.Interaction, audio_source: discord.PCMAudio, audio_buffer_to_close: io.BytesIO, display_name: Optional[str] = None
+        self, interaction: discord.Interaction, audio_source: discord.AudioSource, audio_buffer_to_close: Optional[io.BytesIO] = None, display_name: Optional[str] = None
     ) -> bool:
-        """Plays a prepared audio source (e.g., from TTS) immediately."""
+        """Plays a prepared audio source (e.g., from TTS) immediately. audio_buffer_to_close is None for sources that clean up after themselves."""
         if not interaction or not interaction.guild or not isinstance(interaction.user, discord.Member) or not interaction.user.voice:
              log.warning("play_audio_source_now called with invalid interaction state.")
              if interaction: await self._try_respond(interaction, "❌ Invalid user/voice state.", ephemeral=True)
@@ -733,12 +1020,13 @@ class PlaybackManager:
                  except Exception: pass
                  # ------------------------
              return False
-        guild, user, target_channel = interaction.guild, interaction.user, user.voice.channel
+        guild, user = interaction.guild, interaction.user
+        target_channel = user.voice.channel
         guild_id = guild.id
         log_display_name = display_name or "Audio Source"
         log.info(f"Request to play single audio source '{log_display_name}' in GID {guild_id}")
-        if not audio_source or not audio_buffer_to_close:
-            log.error(f"play_audio_source_now called with missing audio_source or buffer for GID {guild_id}")
+        if not audio_source:
+            log.error(f"play_audio_source_now called with missing audio_source for GID {guild_id}")
             await self._try_respond(interaction, "❌ Internal error: Missing audio data.", ephemeral=True)
             if audio_buffer_to_close and not audio_buffer_to_close.closed:
                 # --- CORRECTED SYNTAX ---
@@ -761,6 +1049,14 @@ class PlaybackManager:
                     # ------------------------
                 return False
 
+            if MIXER_ENABLED:
+                on_done = audio_buffer_to_close.close if audio_buffer_to_close else None
+                self._play_on(guild_id, vc, audio_source, self._overlay_after(guild_id, log_display_name, on_done=on_done), label=log_display_name)
+                self._cancel_idle_timer(guild_id)
+                log.info(f"Started playing direct audio source '{log_display_name}' in GID {guild_id} (mixed)")
+                await self._try_respond(interaction, f"🗣️ Playing `{log_display_name}`...", ephemeral=False)
+                return True
+
             original_mode = self.playback_mode.get(guild_id, PlaybackMode.IDLE)
             self.playback_mode[guild_id] = PlaybackMode.SINGLE_SOUND
             log.debug(f"Set playback mode to SINGLE_SOUND for GID {guild_id} (direct source)")
@@ -778,12 +1074,11 @@ class PlaybackManager:
                             except Exception as e: log.warning(f"Error closing direct source buffer: {e}")
                             # ------------------------
                          log.debug(f"Closed buffer for direct source play in GID {gid_cb}")
-                    else: log.warning(f"Direct source finished callback missing buffer for GID {gid_cb}")
                     async with self.guild_locks[gid_cb]:
                         if self.playback_mode.get(gid_cb) == PlaybackMode.SINGLE_SOUND:
                              self.playback_mode[gid_cb] = original_mode_cb
                              log.info(f"Reverted playback mode to {original_mode_cb} for GID {gid_cb} after direct source.")
-                             current_vc_cb = discord.utils.get(self.bot.voice_clients, guild__id=gid_cb)
+                             current_vc_cb = self.get_voice_client(gid_cb)
                              if current_vc_cb and current_vc_cb.is_connected():
                                  if original_mode_cb == PlaybackMode.QUEUE and self.guild_queues.get(gid_cb):
                                      log.info(f"Attempting to resume queue playback for GID {gid_cb}.")
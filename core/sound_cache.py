@@ -0,0 +1,228 @@
+# core/sound_cache.py
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+import config
+from utils import file_helpers
+
+log = logging.getLogger('SoundBot.SoundCache')
+
+# --- Configuration ---
+CACHE_DIR = getattr(config, 'SOUND_CACHE_DIR', 'sound_cache')
+CACHE_MAX_BYTES = getattr(config, 'SOUND_CACHE_MAX_MB', 512) * 1024 * 1024
+INDEX_FILENAME = "index.json"
+# Artifact formats and their file extensions
+FORMAT_PCM = "pcm" # 48kHz stereo s16le
+FORMAT_OPUS = "opus" # Length-prefixed pre-encoded Opus packets (see core.audio_sources)
+ARTIFACT_EXTS = {FORMAT_PCM: ".pcm", FORMAT_OPUS: ".opuspk"}
+# Bump when the rendering pipeline changes in a way that alters its output
+RENDER_VERSION = 1
+
+
+def render_fingerprint() -> str:
+    """Settings that affect rendered output. Part of every cache key."""
+    fingerprint = f"v{RENDER_VERSION}|{config.TARGET_LOUDNESS_DBFS}|{config.MAX_PLAYBACK_DURATION_MS}"
+    if getattr(config, 'NORMALIZATION_MODE', 'peak') == 'lufs': # Peak-mode keys stay as they were
+        fingerprint += f"|lufs{getattr(config, 'TARGET_LOUDNESS_LUFS', -16.0)}"
+    return fingerprint
+
+
+class SoundCache:
+    """
+    Content-addressed on-disk cache of rendered sounds (trimmed, normalized, 48kHz stereo),
+    stored either as raw PCM or as pre-encoded Opus packets.
+    Keys are sha256(file content + render settings), so identical files share one entry and
+    changing TARGET_LOUDNESS_DBFS / MAX_PLAYBACK_DURATION_MS naturally misses old entries.
+    Entries are evicted least-recently-used once the cache exceeds its size budget.
+    Methods do blocking file I/O and are meant to be called from worker threads.
+    """
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._index_path = os.path.join(cache_dir, INDEX_FILENAME)
+        self._lock = threading.Lock()
+        # key -> {'size': int, 'last_access': float, 'sources': [abs source paths], 'format': str}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # abs source path -> (mtime_ns, size, content sha256), avoids re-hashing unchanged files
+        self._hash_memo: Dict[str, Tuple[int, int, str]] = {}
+        self._total_bytes = 0
+        self._dirty = False
+        file_helpers.ensure_dir(cache_dir)
+        self._load_index()
+
+    # --- Index persistence ---
+    def _load_index(self):
+        if not os.path.exists(self._index_path):
+            log.info(f"SOUND CACHE: No index at '{self._index_path}'. Starting empty.")
+            return
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for key, entry in data.get('entries', {}).items():
+                entry.setdefault('format', FORMAT_PCM) # Entries written before Opus artifacts existed
+                if os.path.exists(self.artifact_path(key, entry['format'])):
+                    self._entries[key] = entry
+                    self._total_bytes += entry.get('size', 0)
+            log.info(f"SOUND CACHE: Loaded {len(self._entries)} entries ({self._total_bytes / (1024*1024):.2f} MB) from '{self._index_path}'")
+        except (json.JSONDecodeError, UnicodeDecodeError, OSError) as e:
+            log.error(f"SOUND CACHE: Error loading index '{self._index_path}': {e}. Starting empty.", exc_info=True)
+            self._entries = {}
+            self._total_bytes = 0
+
+    def flush(self):
+        """Writes the index to disk if it changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = {'entries': {k: dict(v) for k, v in self._entries.items()}}
+            self._dirty = False
+        temp_path = f"{self._index_path}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f)
+            os.replace(temp_path, self._index_path)
+            log.debug(f"SOUND CACHE: Saved index ({len(snapshot['entries'])} entries)")
+        except OSError as e:
+            log.error(f"SOUND CACHE: Error saving index: {e}", exc_info=True)
+
+    # --- Keys ---
+    def artifact_path(self, key: str, fmt: str = FORMAT_PCM) -> str:
+        return os.path.join(self.cache_dir, f"{key}{ARTIFACT_EXTS[fmt]}")
+
+    def content_hash(self, source_path: str) -> str:
+        """sha256 of the file content, memoized on (mtime, size)."""
+        abs_path = os.path.abspath(source_path)
+        st = os.stat(abs_path)
+        memo = self._hash_memo.get(abs_path)
+        if memo and memo[0] == st.st_mtime_ns and memo[1] == st.st_size:
+            return memo[2]
+        digest = hashlib.sha256()
+        with open(abs_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        content_sha = digest.hexdigest()
+        self._hash_memo[abs_path] = (st.st_mtime_ns, st.st_size, content_sha)
+        return content_sha
+
+    def key_for(self, source_path: str) -> str:
+        fingerprint = f"{self.content_hash(source_path)}|{render_fingerprint()}"
+        return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+
+    # --- Lookup / Store ---
+    def lookup(self, source_path: str, fmt: Optional[str] = None) -> Optional[Tuple[str, str]]:
+        """
+        Returns (artifact path, format) for source_path if cached, else None.
+        If fmt is given, entries stored in another format count as misses so they get re-rendered.
+        """
+        try:
+            key = self.key_for(source_path)
+        except OSError as e:
+            log.warning(f"SOUND CACHE: Cannot hash '{source_path}': {e}")
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                return None
+            if fmt and entry['format'] != fmt:
+                return None
+            fmt = entry['format']
+            artifact = self.artifact_path(key, fmt)
+            if not os.path.exists(artifact):
+                log.warning(f"SOUND CACHE: Artifact for key {key[:12]} vanished. Dropping entry.")
+                self._drop_entry(key)
+                return None
+            entry['last_access'] = time.time()
+            self._dirty = True # Saved with the next store/invalidate or at shutdown, so LRU order survives restarts
+            abs_source = os.path.abspath(source_path)
+            if abs_source not in entry['sources']:
+                entry['sources'].append(abs_source)
+        log.debug(f"SOUND CACHE: Hit for '{os.path.basename(source_path)}' (key {key[:12]}, {fmt})")
+        return artifact, fmt
+
+    def store(self, source_path: str, data: bytes, fmt: str = FORMAT_PCM) -> Optional[str]:
+        """Writes a rendered artifact (PCM or Opus packets) for source_path into the cache. Returns its path or None."""
+        try:
+            key = self.key_for(source_path)
+        except OSError as e:
+            log.warning(f"SOUND CACHE: Cannot hash '{source_path}' for store: {e}")
+            return None
+        artifact = self.artifact_path(key, fmt)
+        temp_path = f"{artifact}.{os.urandom(4).hex()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, artifact)
+        except OSError as e:
+            log.error(f"SOUND CACHE: Failed writing artifact for '{os.path.basename(source_path)}': {e}", exc_info=True)
+            try: os.remove(temp_path)
+            except OSError: pass
+            return None
+
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous:
+                self._total_bytes -= previous.get('size', 0)
+                if previous['format'] != fmt: # Re-rendered in a different format, drop the old file
+                    self._remove_artifact(key, previous['format'])
+            sources = previous['sources'] if previous else []
+            abs_source = os.path.abspath(source_path)
+            if abs_source not in sources:
+                sources.append(abs_source)
+            self._entries[key] = {'size': len(data), 'last_access': time.time(), 'sources': sources, 'format': fmt}
+            self._total_bytes += len(data)
+            self._dirty = True
+            self._evict_locked(keep_key=key)
+        log.info(f"SOUND CACHE: Stored '{os.path.basename(source_path)}' (key {key[:12]}, {fmt}, {len(data)} bytes). Total: {self._total_bytes / (1024*1024):.2f} MB")
+        self.flush()
+        return artifact
+
+    def invalidate(self, source_path: str):
+        """Forgets source_path (after upload/replace/delete). Artifacts no other file uses are removed."""
+        abs_source = os.path.abspath(source_path)
+        self._hash_memo.pop(abs_source, None)
+        removed = 0
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if abs_source in entry['sources']:
+                    entry['sources'].remove(abs_source)
+                    self._dirty = True
+                    if not entry['sources']:
+                        self._drop_entry(key)
+                        removed += 1
+        if removed:
+            log.info(f"SOUND CACHE: Invalidated '{os.path.basename(source_path)}' ({removed} artifact(s) removed)")
+        self.flush()
+
+    # --- Eviction (call with self._lock held) ---
+    def _drop_entry(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._total_bytes -= entry.get('size', 0)
+            self._dirty = True
+        self._remove_artifact(key, entry['format'] if entry else FORMAT_PCM)
+
+    def _remove_artifact(self, key: str, fmt: str):
+        try:
+            os.remove(self.artifact_path(key, fmt))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log.warning(f"SOUND CACHE: Could not remove artifact {key[:12]}: {e}")
+
+    def _evict_locked(self, keep_key: Optional[str] = None):
+        if self._total_bytes <= self.max_bytes:
+            return
+        by_age = sorted(self._entries.items(), key=lambda kv: kv[1].get('last_access', 0))
+        for key, _ in by_age:
+            if self._total_bytes <= self.max_bytes:
+                break
+            if key == keep_key:
+                continue
+            log.debug(f"SOUND CACHE: Evicting {key[:12]} (over budget)")
+            self._drop_entry(key)
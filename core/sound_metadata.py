@@ -0,0 +1,205 @@
+# core/sound_metadata.py
+
+import os
+import json
+import hashlib
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+import config
+from utils import audio_processor
+
+log = logging.getLogger('SoundBot.SoundMetadata')
+
+# --- Configuration ---
+METADATA_FILE = getattr(config, 'SOUND_METADATA_FILE', 'sound_metadata.json')
+SAVE_DELAY_SECONDS = 10 # Batches index writes (uploads, backfill)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SoundMetadataIndex:
+    """
+    Per-file metadata for stored sounds (user and public), measured once when a file is saved:
+    duration, sample rate, channels, peak and integrated loudness of the played part, and a
+    content hash. Rendering uses it to skip re-analysis and decode only the played part;
+    listings use it to show durations.
+
+    Entries are keyed by absolute path and checked against the file's size and mtime, so a
+    file changed behind the bot's back is simply treated as unknown.
+    Methods are thread-safe; analyze() decodes and should run in a worker thread.
+    """
+    def __init__(self, index_file: str = METADATA_FILE):
+        self.index_file = index_file
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self._save_timer: Optional[threading.Timer] = None
+        self._backfill_task: Optional[asyncio.Task] = None
+        self._load()
+
+    # --- Persistence ---
+    def _load(self):
+        if not os.path.exists(self.index_file):
+            log.info(f"SOUND METADATA: {self.index_file} not found. Starting empty.")
+            return
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._entries = {p: e for p, e in data.get('entries', {}).items() if os.path.exists(p)}
+            self._dirty = len(self._entries) != len(data.get('entries', {}))
+            log.info(f"SOUND METADATA: Loaded {len(self._entries)} entries from {self.index_file}")
+        except (json.JSONDecodeError, UnicodeDecodeError, OSError) as e:
+            log.error(f"SOUND METADATA: Error loading {self.index_file}: {e}. Starting empty.", exc_info=True)
+            self._entries = {}
+
+    def flush(self):
+        """Writes the index to disk if it changed."""
+        with self._lock:
+            if self._save_timer:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self._dirty:
+                return
+            snapshot = {'entries': {p: dict(e) for p, e in self._entries.items()}}
+            self._dirty = False
+        temp_path = f"{self.index_file}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f)
+            os.replace(temp_path, self.index_file)
+            log.debug(f"SOUND METADATA: Saved {len(snapshot['entries'])} entries")
+        except OSError as e:
+            log.error(f"SOUND METADATA: Error saving {self.index_file}: {e}", exc_info=True)
+
+    def _mark_dirty(self):
+        """Call with the lock held."""
+        self._dirty = True
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(SAVE_DELAY_SECONDS, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    # --- Entries ---
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.abspath(path)
+
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        """Metadata for path if it is current (same size/mtime, same trim length), else None."""
+        key = self._key(path)
+        with self._lock:
+            entry = self._entries.get(key)
+        if not entry:
+            return None
+        try:
+            st = os.stat(key)
+        except OSError:
+            return None
+        if entry.get('size') != st.st_size or entry.get('mtime_ns') != st.st_mtime_ns:
+            return None
+        if entry.get('analyzed_ms') != config.MAX_PLAYBACK_DURATION_MS:
+            return None
+        return dict(entry)
+
+    def record(self, path: str, audio_segment: Any) -> Optional[Dict[str, Any]]:
+        """Measures an already decoded file (e.g. the upload validation decode) and stores the result. Blocking."""
+        key = self._key(path)
+        try:
+            st = os.stat(key)
+            entry = audio_processor.analyze_segment(audio_segment)
+            entry.update({'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': file_sha256(key)})
+        except Exception as e:
+            log.error(f"SOUND METADATA: Could not analyze '{os.path.basename(path)}': {e}", exc_info=True)
+            return None
+        with self._lock:
+            self._entries[key] = entry
+            self._mark_dirty()
+        log.info(f"SOUND METADATA: Recorded '{os.path.basename(path)}' ({entry['duration_ms']}ms, peak {entry['peak_dbfs']:.2f} dBFS)")
+        return dict(entry)
+
+    def analyze(self, path: str) -> Optional[Dict[str, Any]]:
+        """Decodes path and records its metadata. Blocking; used for files saved before the index existed."""
+        if not audio_processor.PYDUB_AVAILABLE:
+            return None
+        try:
+            ext = os.path.splitext(path)[1].lower().strip('. ') or 'mp3'
+            audio_segment = audio_processor.AudioSegment.from_file(path, format=ext)
+        except Exception as e:
+            log.warning(f"SOUND METADATA: Could not decode '{os.path.basename(path)}' for analysis: {e}")
+            return None
+        return self.record(path, audio_segment)
+
+    def copy(self, source_path: str, dest_path: str):
+        """For byte-identical copies (publishing). Falls back to nothing if the source is unknown."""
+        entry = self.get(source_path)
+        if not entry:
+            return
+        try:
+            st = os.stat(dest_path)
+        except OSError:
+            return
+        if st.st_size != entry['size']:
+            return
+        entry['mtime_ns'] = st.st_mtime_ns
+        with self._lock:
+            self._entries[self._key(dest_path)] = entry
+            self._mark_dirty()
+
+    def remove(self, path: str):
+        with self._lock:
+            if self._entries.pop(self._key(path), None) is not None:
+                self._mark_dirty()
+
+    def durations_in_dir(self, directory: str) -> Dict[str, int]:
+        """Lower-cased base name -> duration in ms, for known files directly inside directory."""
+        prefix = self._key(directory) + os.sep
+        with self._lock:
+            items = list(self._entries.items())
+        return {
+            os.path.splitext(os.path.basename(path))[0].lower(): entry['duration_ms']
+            for path, entry in items
+            if path.startswith(prefix) and os.sep not in path[len(prefix):]
+        }
+
+    # --- Backfill ---
+    def start_backfill(self, directories: Iterable[str]):
+        """Analyzes, in the background and one file at a time, sounds saved before the index existed."""
+        if self._backfill_task and not self._backfill_task.done():
+            return
+        self._backfill_task = asyncio.create_task(self._backfill(list(directories)), name="SoundMetadataBackfill")
+
+    async def _backfill(self, directories: Iterable[str]):
+        loop = asyncio.get_running_loop()
+        missing = await loop.run_in_executor(None, self._find_unindexed, directories)
+        if not missing:
+            return
+        log.info(f"SOUND METADATA: Backfilling {len(missing)} sounds")
+        analyzed = 0
+        for path in missing:
+            if await loop.run_in_executor(None, self.analyze, path):
+                analyzed += 1
+        log.info(f"SOUND METADATA: Backfill done ({analyzed}/{len(missing)} analyzed)")
+
+    def _find_unindexed(self, directories: Iterable[str]) -> list:
+        missing = []
+        for directory in directories:
+            for root, _, files in os.walk(directory):
+                for filename in files:
+                    path = os.path.join(root, filename)
+                    if os.path.splitext(filename)[1].lower() in config.ALLOWED_EXTENSIONS and not filename.startswith('temp_') and self.get(path) is None:
+                        missing.append(path)
+        return missing
+
+    def close(self):
+        if self._backfill_task and not self._backfill_task.done():
+            self._backfill_task.cancel()
+        self.flush()
@@ -0,0 +1,246 @@
+# core/tts_clip_cache.py
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import config
+from utils import file_helpers
+from core.sound_cache import SoundCache
+
+log = logging.getLogger('SoundBot.TTSClipCache')
+
+# --- Configuration ---
+CLIP_CACHE_DIR = getattr(config, 'TTS_JOIN_CACHE_DIR', 'tts_join_cache')
+CLIP_CACHE_MAX_CLIPS = getattr(config, 'TTS_JOIN_CACHE_MAX_CLIPS', 2000)
+INDEX_FILENAME = "index.json"
+SAVE_DELAY_SECONDS = 5.0 # Index changes within this window share one write
+
+# Returns the synthesized MP3 for (text, voice)
+SynthesizeFunc = Callable[[str, str], Awaitable[bytes]]
+
+
+def clip_key(text: str, voice: str) -> str:
+    normalized_text = " ".join(text.split()).casefold()
+    return hashlib.sha256(f"{normalized_text}|{voice}".encode('utf-8')).hexdigest()[:32]
+
+
+class TTSClipCache:
+    """
+    Persistent cache of TTS join announcements keyed by (normalized text, voice).
+    Clips are kept as the synthesized MP3; the first play renders them into the shared
+    SoundCache (normalized, playback format), so later joins need neither a TTS round trip
+    nor a decode. Each member's current clip is tracked per guild (display names are per guild),
+    and a clip is dropped once nobody references it, e.g. after a name or TTS voice change.
+    """
+    def __init__(self, sound_cache: Optional[SoundCache] = None, cache_dir: str = CLIP_CACHE_DIR, max_clips: int = CLIP_CACHE_MAX_CLIPS):
+        self.sound_cache = sound_cache
+        self.cache_dir = cache_dir
+        self.max_clips = max(1, max_clips)
+        self._index_path = os.path.join(cache_dir, INDEX_FILENAME)
+        # key -> {'text': str, 'voice': str, 'last_used': float}
+        self._clips: Dict[str, Dict[str, Any]] = {}
+        self._users: Dict[str, str] = {} # '<user id>:<guild id>' -> key of their current clip
+        self._refs: Dict[str, int] = {} # key -> number of owners in self._users
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._removing: Dict[str, asyncio.Future] = {} # key -> pending file deletion
+        self._dirty = False
+        self._save_handle: Optional[asyncio.TimerHandle] = None
+        self._write_lock = threading.Lock()
+        self._generation = 0 # Bumped per snapshot; a write never replaces a newer one
+        self._written_generation = 0
+        file_helpers.ensure_dir(cache_dir)
+        self._load_index()
+
+    # --- Index persistence ---
+    def _load_index(self):
+        if not os.path.exists(self._index_path):
+            return
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._clips = {k: v for k, v in data.get('clips', {}).items() if os.path.exists(self.clip_path(k))}
+            self._users = {u: k for u, k in data.get('users', {}).items() if k in self._clips}
+            for key in self._users.values():
+                self._refs[key] = self._refs.get(key, 0) + 1
+            log.info(f"TTS CLIP CACHE: Loaded {len(self._clips)} clips for {len(self._users)} users")
+        except (json.JSONDecodeError, UnicodeDecodeError, OSError) as e:
+            log.error(f"TTS CLIP CACHE: Error loading index '{self._index_path}': {e}. Starting empty.", exc_info=True)
+            self._clips, self._users, self._refs = {}, {}, {}
+
+    def _schedule_save(self):
+        """Marks the index changed. It is written in a worker thread SAVE_DELAY_SECONDS later."""
+        self._dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self._save_handle is None:
+            self._save_handle = loop.call_later(SAVE_DELAY_SECONDS, self._write_behind, loop)
+
+    def _snapshot(self) -> Tuple[int, Dict[str, Any]]:
+        """Copies the index. Call from the event loop, which is the only thread mutating it."""
+        self._dirty = False
+        self._generation += 1
+        return self._generation, {'clips': {k: dict(v) for k, v in self._clips.items()}, 'users': dict(self._users)}
+
+    def _write_behind(self, loop: asyncio.AbstractEventLoop):
+        self._save_handle = None
+        loop.run_in_executor(None, self._write, *self._snapshot())
+
+    def _write(self, generation: int, snapshot: Dict[str, Any]):
+        with self._write_lock:
+            if generation <= self._written_generation:
+                return
+            temp_path = f"{self._index_path}.tmp"
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(snapshot, f)
+                os.replace(temp_path, self._index_path)
+                self._written_generation = generation
+            except OSError as e:
+                log.error(f"TTS CLIP CACHE: Error saving index: {e}", exc_info=True)
+
+    def flush(self):
+        """Writes pending index changes now, on the calling thread. Called at shutdown."""
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+        if self._dirty:
+            self._write(*self._snapshot())
+
+    # --- Clips ---
+    def clip_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.mp3")
+
+    def _remove_clip(self, key: str):
+        """Drops key from the index now; its files are deleted in a worker thread."""
+        self._clips.pop(key, None)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._delete_clip_files(key)
+            return
+        removal = loop.run_in_executor(None, self._delete_clip_files, key)
+        self._removing[key] = removal
+        removal.add_done_callback(lambda f, k=key: self._removing.pop(k) if self._removing.get(k) is f else None)
+
+    def _delete_clip_files(self, key: str):
+        path = self.clip_path(key)
+        if self.sound_cache:
+            self.sound_cache.invalidate(path)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log.warning(f"TTS CLIP CACHE: Could not remove clip {key[:12]}: {e}")
+
+    def _write_clip(self, key: str, data: bytes):
+        """Worker thread: writes the clip to a temp file and renames it into place."""
+        path = self.clip_path(key)
+        temp_path = f"{path}.{os.urandom(4).hex()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            try: os.remove(temp_path)
+            except OSError: pass
+            raise
+
+    @staticmethod
+    def _owner(user_id: int, guild_id: int) -> str:
+        return f"{user_id}:{guild_id}"
+
+    def _assign(self, owner: str, key: str):
+        if self._users.get(owner) == key:
+            return
+        self._release(owner)
+        self._users[owner] = key
+        self._refs[key] = self._refs.get(key, 0) + 1
+
+    def _release(self, owner: str):
+        """Forgets owner's clip and deletes it if nobody else shares it."""
+        old_key = self._users.pop(owner, None)
+        if old_key is None:
+            return
+        refs = self._refs.get(old_key, 0) - 1
+        if refs > 0:
+            self._refs[old_key] = refs
+            return
+        self._refs.pop(old_key, None)
+        log.debug(f"TTS CLIP CACHE: Removing clip {old_key[:12]} (no longer used)")
+        self._remove_clip(old_key)
+
+    def invalidate_user(self, user_id: int, guild_id: Optional[int] = None):
+        """Call when a member's display name (guild_id given) or a user's TTS voice (all guilds) changes."""
+        prefix = self._owner(user_id, guild_id) if guild_id is not None else f"{user_id}:"
+        owners = [o for o in self._users if o == prefix or (guild_id is None and o.startswith(prefix))]
+        for owner in owners:
+            self._release(owner)
+        if owners:
+            self._schedule_save()
+            log.info(f"TTS CLIP CACHE: Invalidated {len(owners)} join clip(s) for user {user_id}")
+
+    def _evict(self):
+        if len(self._clips) <= self.max_clips:
+            return
+        by_age = sorted(self._clips.items(), key=lambda kv: kv[1].get('last_used', 0))
+        for key, _ in by_age[:len(self._clips) - self.max_clips]:
+            if self._refs.pop(key, 0):
+                for owner in [o for o, k in self._users.items() if k == key]:
+                    del self._users[owner]
+            self._remove_clip(key)
+
+    async def get_or_create(self, user_id: int, guild_id: int, text: str, voice: str, synthesize: SynthesizeFunc) -> Optional[str]:
+        """Returns the clip path for (text, voice), synthesizing it once if missing. Returns None on failure."""
+        owner = self._owner(user_id, guild_id)
+        key = clip_key(text, voice)
+        path = self.clip_path(key)
+
+        if self._users.get(owner) != key:
+            self._release(owner) # Name or voice changed since the last join
+
+        if key in self._clips: # _remove_clip keeps the index in step with the files
+            log.info(f"TTS CLIP CACHE: Hit for user {user_id} in guild {guild_id} ({key[:12]})")
+        else:
+            task = self._in_flight.get(key)
+            if task is None:
+                task = asyncio.create_task(self._create(key, text, voice, synthesize), name=f"TTSClip_{key[:12]}")
+                self._in_flight[key] = task
+                task.add_done_callback(lambda t, k=key: self._in_flight.pop(k, None))
+            if not await asyncio.shield(task):
+                return None
+
+        entry = self._clips.get(key)
+        if entry is None: # Evicted or invalidated while it was being synthesized
+            log.info(f"TTS CLIP CACHE: Clip {key[:12]} was removed before user {user_id} could use it")
+            return None
+        entry['last_used'] = time.time()
+        self._assign(owner, key)
+        self._evict()
+        self._schedule_save()
+        return path
+
+    async def _create(self, key: str, text: str, voice: str, synthesize: SynthesizeFunc) -> bool:
+        try:
+            data = await synthesize(text, voice)
+            if not data:
+                raise RuntimeError(f"TTS produced no audio for clip {key[:12]}")
+            removal = self._removing.get(key)
+            if removal is not None: # Same clip was dropped moments ago; don't let that deletion hit the new file
+                await asyncio.wait({removal})
+            await asyncio.get_running_loop().run_in_executor(None, self._write_clip, key, data)
+        except Exception as e:
+            log.error(f"TTS CLIP CACHE: Failed to synthesize clip {key[:12]} (voice={voice}): {e}", exc_info=True)
+            return False
+        self._clips[key] = {'text': text, 'voice': voice, 'last_used': time.time()}
+        log.info(f"TTS CLIP CACHE: Stored new clip {key[:12]} ('{text[:50]}', {voice})")
+        return True
@@ -0,0 +1,175 @@
+# core/tts_engine.py
+
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+import config
+from core.tts_clip_cache import clip_key
+from utils.stats import percentiles
+
+try:
+    import edge_tts
+    EDGE_TTS_IMPORTED = True
+except ImportError:
+    EDGE_TTS_IMPORTED = False
+
+log = logging.getLogger('SoundBot.TTSEngine')
+
+# --- Configuration ---
+TTS_MAX_CONCURRENT_REQUESTS = getattr(config, 'TTS_MAX_CONCURRENT_REQUESTS', 4) # Open Edge-TTS connections, all guilds
+TTS_RESULT_CACHE_MAX_BYTES = getattr(config, 'TTS_RESULT_CACHE_MAX_MB', 32) * 1024 * 1024
+METRICS_WINDOW = 200 # Recent requests per voice kept for latency percentiles
+STATS_LOG_INTERVAL = 100 # Log a latency summary every N synthesized requests
+
+
+class TTSEngine:
+    """
+    Single entry point to Edge-TTS for /tts and join announcements.
+    - Results (MP3 bytes) are kept in an in-memory LRU keyed by (normalized text, voice).
+    - Concurrent requests for the same text and voice share one synthesis.
+    - At most TTS_MAX_CONCURRENT_REQUESTS synthesize at once; the rest wait their turn.
+    - Time to first audio and total time are tracked per voice; see stats().
+    """
+    def __init__(self, max_concurrent: int = TTS_MAX_CONCURRENT_REQUESTS, cache_max_bytes: int = TTS_RESULT_CACHE_MAX_BYTES):
+        self.max_concurrent = max(1, max_concurrent)
+        self.cache_max_bytes = cache_max_bytes
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._cache_bytes = 0
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._first_audio: Dict[str, Deque[float]] = {}
+        self._total: Dict[str, Deque[float]] = {}
+        self._requests = 0
+        self._cache_hits = 0
+        self._coalesced = 0
+        self._errors = 0
+        self._synthesized = 0
+        log.info(f"TTSEngine initialized. Max concurrent: {self.max_concurrent}, Cache: {cache_max_bytes / (1024*1024):.0f} MB")
+
+    # --- Result cache ---
+    def _cache_get(self, key: str) -> Optional[bytes]:
+        data = self._cache.get(key)
+        if data is not None:
+            self._cache.move_to_end(key)
+        return data
+
+    def _cache_put(self, key: str, data: bytes):
+        if len(data) > self.cache_max_bytes:
+            return
+        old = self._cache.pop(key, None)
+        if old is not None:
+            self._cache_bytes -= len(old)
+        self._cache[key] = data
+        self._cache_bytes += len(data)
+        while self._cache_bytes > self.cache_max_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_bytes -= len(evicted)
+
+    # --- Synthesis ---
+    @staticmethod
+    async def _edge_tts_chunks(text: str, voice: str) -> AsyncIterator[bytes]:
+        communicate = edge_tts.Communicate(text, voice)
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                yield chunk["data"]
+
+    def _record_latency(self, voice: str, first_audio: float, total: float):
+        self._first_audio.setdefault(voice, deque(maxlen=METRICS_WINDOW)).append(first_audio)
+        self._total.setdefault(voice, deque(maxlen=METRICS_WINDOW)).append(total)
+        self._synthesized += 1
+        if self._synthesized % STATS_LOG_INTERVAL == 0:
+            self.log_stats()
+
+    async def stream(self, text: str, voice: str) -> AsyncIterator[bytes]:
+        """
+        Yields MP3 chunks for (text, voice) as Edge-TTS produces them. Cached or coalesced
+        results arrive as a single chunk. Raises if synthesis fails. Close the iterator
+        (aclose) when stopping early so the concurrency slot is released.
+        """
+        if not EDGE_TTS_IMPORTED:
+            raise RuntimeError("TTS engine unavailable: edge-tts is not installed")
+        self._requests += 1
+        key = clip_key(text, voice)
+        cached = self._cache_get(key)
+        if cached is not None:
+            self._cache_hits += 1
+            log.debug(f"TTS ENGINE: Cache hit ({key[:12]}, {voice})")
+            yield cached
+            return
+
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            self._coalesced += 1
+            log.debug(f"TTS ENGINE: Joining in-flight synthesis ({key[:12]}, {voice})")
+            data = await asyncio.shield(pending)
+            if data:
+                yield data
+                return
+            # The other request failed or stopped early; synthesize for ourselves
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        chunks = []
+        complete = False
+        try:
+            async with self._semaphore:
+                started = time.monotonic()
+                first_audio: Optional[float] = None
+                try:
+                    async for chunk in self._edge_tts_chunks(text, voice):
+                        if first_audio is None:
+                            first_audio = time.monotonic() - started
+                        chunks.append(chunk)
+                        yield chunk
+                    complete = True
+                except Exception as e:
+                    self._errors += 1
+                    log.warning(f"TTS ENGINE: Synthesis failed for voice {voice} after {time.monotonic() - started:.2f}s: {e}")
+                    raise
+                if chunks:
+                    self._record_latency(voice, first_audio, time.monotonic() - started)
+        finally:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+            data = b"".join(chunks) if complete and chunks else None
+            if data:
+                self._cache_put(key, data)
+            if not future.done():
+                future.set_result(data)
+
+    async def synthesize(self, text: str, voice: str) -> bytes:
+        """Returns the complete MP3 for (text, voice). Raises RuntimeError if Edge-TTS returns no audio. Used as TTSClipCache's synthesize callback."""
+        data = b"".join([chunk async for chunk in self.stream(text, voice)])
+        if not data:
+            raise RuntimeError("TTS: Edge-TTS generation yielded no audio data.")
+        return data
+
+    # --- Metrics ---
+    def stats(self) -> Dict[str, Any]:
+        """Request counters and, per voice, first-audio and total latency percentiles (seconds)."""
+        return {
+            'requests': self._requests,
+            'cache_hits': self._cache_hits,
+            'coalesced': self._coalesced,
+            'errors': self._errors,
+            'cache_entries': len(self._cache),
+            'cache_bytes': self._cache_bytes,
+            'voices': {
+                voice: {
+                    'count': len(totals),
+                    'first_audio': percentiles(self._first_audio.get(voice, ())),
+                    'total': percentiles(totals),
+                }
+                for voice, totals in self._total.items()
+            },
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        log.info(f"TTS ENGINE: {stats['requests']} requests, {stats['cache_hits']} cache hits, {stats['coalesced']} coalesced, {stats['errors']} errors, {stats['cache_entries']} cached ({stats['cache_bytes'] / 1024:.0f} KB)")
+        for voice, v in sorted(stats['voices'].items()):
+            fa, total = v['first_audio'], v['total']
+            log.info(f"TTS ENGINE: {voice} (n={v['count']}) first audio p50/p95/p99 {fa['p50']:.2f}/{fa['p95']:.2f}/{fa['p99']:.2f}s, total {total['p50']:.2f}/{total['p95']:.2f}/{total['p99']:.2f}s")
@@ -0,0 +1,193 @@
+# core/tts_stream.py
+
+import time
+import queue
+import shutil
+import asyncio
+import logging
+import threading
+import subprocess
+from typing import AsyncIterator, Optional
+
+import discord
+
+import config
+from core.audio_sources import FRAME_SIZE
+
+log = logging.getLogger('SoundBot.TTSStream')
+
+# --- Configuration ---
+STREAM_FIRST_AUDIO_TIMEOUT = getattr(config, 'TTS_STREAM_FIRST_AUDIO_TIMEOUT', 4.0)
+STREAM_STALL_TIMEOUT = getattr(config, 'TTS_STREAM_STALL_TIMEOUT', 3.0)
+STREAM_BUFFER_FRAMES = max(1, int(getattr(config, 'TTS_STREAM_BUFFER_SECONDS', 5) * 50)) # 50 frames per second
+STREAM_PREBUFFER_FRAMES = max(1, int(getattr(config, 'TTS_STREAM_PREBUFFER_MS', 200) // 20))
+SILENCE_FRAME = b'\x00' * FRAME_SIZE
+
+
+def ffmpeg_path() -> Optional[str]:
+    return shutil.which("ffmpeg")
+
+
+def _normalize_filter() -> str:
+    """
+    Streaming stand-in for the buffered path's peak normalization (whole clip not known yet):
+    dynaudnorm towards the same peak, gain capped at +6dB. A short window keeps added latency ~150ms.
+    """
+    target_peak = min(1.0, 10 ** (config.TARGET_LOUDNESS_DBFS / 20))
+    return f"dynaudnorm=f=100:g=3:p={target_peak:.3f}:m=2.0"
+
+
+class StreamingTTSAudio(discord.AudioSource):
+    """
+    Plays Edge-TTS MP3 while it is still being synthesized. Chunks are piped into an ffmpeg
+    decoder as they arrive (start_feeding), a reader thread splits its output into 20ms frames on a
+    bounded queue, and read() hands them to the voice thread. When the queue is full, ffmpeg
+    and then the feeder block, so memory stays bounded no matter how fast synthesis runs.
+
+    If no new audio arrives for STREAM_STALL_TIMEOUT, playback pads with silence and then ends.
+    Callers should await wait_ready() before playing and fall back to the buffered path if it fails.
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_duration_ms: int = config.MAX_PLAYBACK_DURATION_MS):
+        self._loop = loop
+        self._frames: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=STREAM_BUFFER_FRAMES)
+        self._ready = asyncio.Event()
+        self._closed = False
+        self._ended = False # Voice thread has seen the end of the stream
+        self._decoded_frames = 0
+        self._underrun_since: Optional[float] = None
+        self._feed_task: Optional[asyncio.Task] = None
+        self.stalled = False
+        args = [
+            ffmpeg_path() or "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-f", "mp3", "-i", "pipe:0",
+            "-af", _normalize_filter(),
+            "-t", f"{max_duration_ms / 1000:.2f}",
+            "-f", "s16le", "-ar", "48000", "-ac", "2", "pipe:1",
+        ]
+        self._proc = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self._reader = threading.Thread(target=self._read_frames, name="TTSStreamReader", daemon=True)
+        self._reader.start()
+
+    # --- Decoder side (reader thread) ---
+    def _put(self, item: Optional[bytes]) -> bool:
+        while not self._closed:
+            try:
+                self._frames.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read_frames(self):
+        stdout = self._proc.stdout
+        try:
+            while not self._closed:
+                frame = stdout.read(FRAME_SIZE)
+                if not frame:
+                    break
+                if len(frame) < FRAME_SIZE:
+                    frame += b'\x00' * (FRAME_SIZE - len(frame))
+                if not self._put(frame):
+                    break
+                self._decoded_frames += 1
+                if self._decoded_frames == STREAM_PREBUFFER_FRAMES:
+                    self._loop.call_soon_threadsafe(self._ready.set)
+        except (OSError, ValueError) as e:
+            if not self._closed:
+                log.warning(f"TTS STREAM: Error reading decoder output: {e}")
+        finally:
+            self._put(None)
+            try: stdout.close()
+            except (OSError, ValueError): pass
+            if not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(self._ready.set) # Short clips end before the prebuffer fills
+
+    # --- Input side (event loop) ---
+    def start_feeding(self, chunks: AsyncIterator[bytes]):
+        self._feed_task = self._loop.create_task(self._feed(chunks), name="TTSStreamFeed")
+
+    async def _feed(self, chunks: AsyncIterator[bytes]):
+        stdin = self._proc.stdin
+        total = 0
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=STREAM_STALL_TIMEOUT)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    self.stalled = True
+                    log.warning(f"TTS STREAM: Edge-TTS stalled after {total} bytes. Ending stream early.")
+                    break
+                # Blocks while the frame queue is full; that is the backpressure
+                await self._loop.run_in_executor(None, stdin.write, chunk)
+                total += len(chunk)
+            log.debug(f"TTS STREAM: Fed {total} bytes of MP3 to decoder")
+        except (BrokenPipeError, ValueError):
+            log.debug("TTS STREAM: Decoder closed its input (duration limit reached or stopped)")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stalled = True
+            log.error(f"TTS STREAM: Edge-TTS stream failed after {total} bytes: {e}", exc_info=True)
+        finally:
+            try: stdin.close()
+            except (OSError, ValueError): pass
+            aclose = getattr(chunks, 'aclose', None)
+            if aclose:
+                try: await aclose()
+                except Exception: pass
+
+    async def wait_ready(self, timeout: float = STREAM_FIRST_AUDIO_TIMEOUT) -> bool:
+        """True once enough audio is decoded to start playback without an immediate underrun."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            log.warning(f"TTS STREAM: No audio within {timeout:.1f}s")
+            return False
+        return self._decoded_frames > 0
+
+    # --- Voice thread ---
+    def read(self) -> bytes:
+        if self._ended or self._closed:
+            return b''
+        try:
+            frame = self._frames.get_nowait() # Never block the voice thread; it keeps its own 20ms pacing
+        except queue.Empty:
+            # Underrun: keep the connection fed with silence until the stall timeout
+            now = time.monotonic()
+            if self._underrun_since is None:
+                self._underrun_since = now
+            elif now - self._underrun_since > STREAM_STALL_TIMEOUT:
+                log.warning("TTS STREAM: Decoder starved. Ending playback.")
+                self._ended = True
+                return b''
+            return SILENCE_FRAME
+        self._underrun_since = None
+        if frame is None:
+            self._ended = True
+            return b''
+        return frame
+
+    def is_opus(self) -> bool:
+        return False
+
+    def cleanup(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._feed_task and not self._feed_task.done():
+            self._loop.call_soon_threadsafe(self._feed_task.cancel)
+        try:
+            self._proc.kill() # Reader thread sees EOF and closes stdout itself
+        except OSError:
+            pass
+        # Called on the voice thread, so the exit is waited for elsewhere
+        threading.Thread(target=self._reap, name="TTSStreamReap", daemon=True).start()
+        log.debug(f"TTS STREAM: Cleaned up after {self._decoded_frames} frames")
+
+    def _reap(self):
+        try:
+            self._proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            log.warning("TTS STREAM: ffmpeg did not exit after kill")
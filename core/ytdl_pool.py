@@ -0,0 +1,118 @@
+# core/ytdl_pool.py
+
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, TypeVar
+
+import yt_dlp
+
+import config
+
+log = logging.getLogger('SoundBot.YTDLPool')
+
+# --- Configuration ---
+YTDL_WORKERS = getattr(config, 'YTDL_WORKERS', 6) # Separate from the loop's default executor
+YTDL_RECYCLE_AFTER_JOBS = getattr(config, 'YTDL_RECYCLE_AFTER_JOBS', 100) # Rebuild a worker's YoutubeDL after this many jobs
+METRICS_WINDOW = 200 # Recent jobs kept for wait/work time stats
+
+T = TypeVar('T')
+
+
+class YTDLPool:
+    """
+    Runs yt-dlp jobs on a dedicated thread pool where each worker thread keeps one long-lived
+    YoutubeDL instance, so extractors are loaded once instead of on every call.
+    A worker's instance is recycled after YTDL_RECYCLE_AFTER_JOBS jobs or when a job raises.
+    Tracks queue wait time (submitted -> started) separately from work time; see stats().
+    """
+    def __init__(self, ytdl_opts: Dict[str, Any], max_workers: int = YTDL_WORKERS, recycle_after: int = YTDL_RECYCLE_AFTER_JOBS):
+        self.ytdl_opts = dict(ytdl_opts)
+        self.recycle_after = max(1, recycle_after)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="YTDLWorker")
+        self._local = threading.local()
+        self._metrics_lock = threading.Lock()
+        self._wait_times: Deque[float] = deque(maxlen=METRICS_WINDOW)
+        self._work_times: Deque[float] = deque(maxlen=METRICS_WINDOW)
+        self._jobs = 0
+        self._errors = 0
+        self._recycles = 0
+        log.info(f"YTDLPool initialized. Workers: {max(1, max_workers)}, Recycle after: {self.recycle_after} jobs")
+
+    # --- Worker side ---
+    def _worker_ydl(self) -> yt_dlp.YoutubeDL:
+        ydl = getattr(self._local, 'ydl', None)
+        if ydl is None or self._local.jobs >= self.recycle_after:
+            if ydl is not None:
+                self._close_worker_ydl(reason=f"{self._local.jobs} jobs")
+            self._local.ydl = ydl = yt_dlp.YoutubeDL(dict(self.ytdl_opts))
+            self._local.jobs = 0
+            log.debug(f"YTDLPool: Created YoutubeDL in {threading.current_thread().name}")
+        return ydl
+
+    def _close_worker_ydl(self, reason: str):
+        ydl = getattr(self._local, 'ydl', None)
+        self._local.ydl = None
+        if ydl is None:
+            return
+        with self._metrics_lock:
+            self._recycles += 1
+        log.debug(f"YTDLPool: Recycling YoutubeDL in {threading.current_thread().name} ({reason})")
+        try:
+            close = getattr(ydl, 'close', None) # Older yt-dlp versions have no close()
+            if close: close()
+        except Exception as e:
+            log.debug(f"YTDLPool: Error closing YoutubeDL: {e}")
+
+    def _run_job(self, submitted_at: float, func: Callable[..., T], args: tuple) -> T:
+        started_at = time.monotonic()
+        failed = False
+        try:
+            ydl = self._worker_ydl()
+            self._local.jobs += 1
+            return func(ydl, *args)
+        except Exception as e:
+            failed = True
+            self._close_worker_ydl(reason=f"error: {type(e).__name__}")
+            raise
+        finally:
+            finished_at = time.monotonic()
+            with self._metrics_lock:
+                self._jobs += 1
+                if failed: self._errors += 1
+                self._wait_times.append(started_at - submitted_at)
+                self._work_times.append(finished_at - started_at)
+
+    # --- Loop side ---
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """Runs func(ydl, *args) on a pool worker and returns its result. Exceptions propagate."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._run_job, time.monotonic(), func, args)
+
+    def stats(self) -> Dict[str, Any]:
+        """Job counts and wait/work time (seconds) over the last METRICS_WINDOW jobs."""
+        def summarize(samples):
+            if not samples:
+                return {'avg': 0.0, 'p95': 0.0, 'max': 0.0}
+            ordered = sorted(samples)
+            return {
+                'avg': sum(ordered) / len(ordered),
+                'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                'max': ordered[-1],
+            }
+        with self._metrics_lock:
+            return {
+                'jobs': self._jobs,
+                'errors': self._errors,
+                'recycles': self._recycles,
+                'wait': summarize(list(self._wait_times)),
+                'work': summarize(list(self._work_times)),
+            }
+
+    def shutdown(self):
+        stats = self.stats()
+        log.info(f"YTDLPool shutting down. Jobs: {stats['jobs']}, Errors: {stats['errors']}, Avg wait: {stats['wait']['avg']:.2f}s, Avg work: {stats['work']['avg']:.2f}s")
+        self._executor.shutdown(wait=False, cancel_futures=True)
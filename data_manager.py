@@ -1,13 +1,107 @@
 # -*- coding: utf-8 -*-
 import json
 import os
+import asyncio
 import logging
-from typing import Dict, Any, Tuple
+import threading
+from typing import Dict, Any, Iterable, Optional, Set, Tuple
 
 import config # Import the config module
 
 log = logging.getLogger('SoundBot.DataManager')
 
+SAVE_DELAY_SECONDS = getattr(config, 'DATA_SAVE_DELAY_SECONDS', 5.0) # Changes within this window share one write
+
+
+class _WriteBehindFile:
+    """
+    Debounced, atomic persistence for one top-level JSON object (user id / guild id -> dict).
+    save() only marks entries dirty; after SAVE_DELAY_SECONDS the dirty entries are re-encoded
+    on the event loop (the data is only mutated there) and the file is assembled from the cached
+    per-entry JSON and written to a temp file + rename in a worker thread. The file format is the
+    same as json.dump(data, indent=4). Without a running loop (startup, shutdown) it writes at once.
+    """
+    def __init__(self, path: str, label: str):
+        self.path = path
+        self.label = label
+        self._data: Optional[Dict[str, Any]] = None
+        self._encoded: Dict[str, str] = {} # key -> JSON of its value, indented for the file
+        self._dirty_keys: Set[str] = set()
+        self._all_dirty = True
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._write_lock = threading.Lock()
+        self._generation = 0 # Bumped per snapshot; a write never replaces a newer one
+        self._written_generation = 0
+
+    def save(self, data: Dict[str, Any], keys: Optional[Iterable[str]] = None):
+        """Marks keys (or everything) in data as changed and schedules a write."""
+        if data is not self._data:
+            self._data = data
+            self._all_dirty = True
+        if keys is None:
+            self._all_dirty = True
+        else:
+            self._dirty_keys.update(str(k) for k in keys)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self._timer is None:
+            self._timer = loop.call_later(SAVE_DELAY_SECONDS, self._write_behind, loop)
+
+    def _snapshot(self) -> Tuple[int, Dict[str, str]]:
+        """Re-encodes dirty entries. Call from the thread that mutates the data."""
+        data = self._data or {}
+        if self._all_dirty:
+            self._encoded = {}
+            keys = data.keys()
+        else:
+            keys = self._dirty_keys
+        for key in list(keys):
+            if key in data:
+                self._encoded[key] = json.dumps(data[key], indent=4, ensure_ascii=False).replace('\n', '\n    ')
+            else:
+                self._encoded.pop(key, None)
+        self._dirty_keys.clear()
+        self._all_dirty = False
+        self._generation += 1
+        return self._generation, dict(self._encoded)
+
+    def _write_behind(self, loop: asyncio.AbstractEventLoop):
+        self._timer = None
+        snapshot = self._snapshot()
+        loop.run_in_executor(None, self._write, *snapshot)
+
+    def _write(self, generation: int, encoded: Dict[str, str]):
+        with self._write_lock:
+            if generation <= self._written_generation:
+                return
+            body = ",\n".join(f"    {json.dumps(key, ensure_ascii=False)}: {value}" for key, value in encoded.items())
+            text = "{\n" + body + "\n}" if encoded else "{}"
+            temp_path = f"{self.path}.tmp"
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                os.replace(temp_path, self.path)
+                self._written_generation = generation
+                log.debug(f"Saved {len(encoded)} {self.label} to {self.path}")
+            except Exception as e:
+                log.error(f"Error saving {self.path}: {e}", exc_info=True)
+
+    def flush(self):
+        """Writes pending changes now, on the calling thread."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._data is None or (not self._all_dirty and not self._dirty_keys and self._written_generation == self._generation):
+            return
+        self._write(*self._snapshot())
+
+
+_user_config_file = _WriteBehindFile(config.CONFIG_FILE, "user configs")
+_guild_settings_file = _WriteBehindFile(config.GUILD_SETTINGS_FILE, "guild settings")
+
 def load_config() -> Dict[str, Dict[str, Any]]:
     """Loads user sound configurations from JSON file specified in config."""
     user_sound_config: Dict[str, Dict[str, Any]] = {}
@@ -56,14 +150,12 @@ def load_config() -> Dict[str, Dict[str, Any]]:
         user_sound_config = {}
     return user_sound_config
 
-def save_config(user_sound_config: Dict[str, Dict[str, Any]]):
-    """Saves user sound configurations to JSON file specified in config."""
-    try:
-        with open(config.CONFIG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(user_sound_config, f, indent=4, ensure_ascii=False)
-        log.debug(f"Saved {len(user_sound_config)} user configs to {config.CONFIG_FILE}")
-    except Exception as e:
-        log.error(f"Error saving {config.CONFIG_FILE}: {e}", exc_info=True)
+def save_config(user_sound_config: Dict[str, Dict[str, Any]], user_id: Optional[str] = None):
+    """
+    Schedules a save of user sound configurations to the JSON file specified in config.
+    Pass the user_id whose entry changed (or was deleted) so only that entry is re-encoded.
+    """
+    _user_config_file.save(user_sound_config, None if user_id is None else [user_id])
 
 def load_guild_settings() -> Dict[str, Dict[str, Any]]:
     """Loads guild-specific settings from JSON file specified in config."""
@@ -86,14 +178,9 @@ def load_guild_settings() -> Dict[str, Dict[str, Any]]:
         guild_settings = {}
     return guild_settings
 
-def save_guild_settings(guild_settings: Dict[str, Dict[str, Any]]):
-    """Saves guild-specific settings to JSON file specified in config."""
-    try:
-        with open(config.GUILD_SETTINGS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(guild_settings, f, indent=4, ensure_ascii=False)
-        log.debug(f"Saved {len(guild_settings)} guild settings to {config.GUILD_SETTINGS_FILE}")
-    except Exception as e:
-        log.error(f"Error saving {config.GUILD_SETTINGS_FILE}: {e}", exc_info=True)
+def save_guild_settings(guild_settings: Dict[str, Dict[str, Any]], guild_id: Optional[str] = None):
+    """Schedules a save of guild-specific settings. Pass the guild_id whose entry changed, as with save_config."""
+    _guild_settings_file.save(guild_settings, None if guild_id is None else [guild_id])
 
 def load_all_data() -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
     """Loads both user config and guild settings."""
@@ -104,4 +191,9 @@ def load_all_data() -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]
 def save_all_data(user_sound_config: Dict[str, Dict[str, Any]], guild_settings: Dict[str, Dict[str, Any]]):
     """Saves both user config and guild settings."""
     save_config(user_sound_config)
-    save_guild_settings(guild_settings)
\ No newline at end of file
+    save_guild_settings(guild_settings)
+
+def flush_all():
+    """Writes any pending changes immediately. Call on shutdown."""
+    _user_config_file.flush()
+    _guild_settings_file.flush()
@@ -3,7 +3,7 @@ import os
 import io
 import math
 import logging
-from typing import Optional, Tuple
+from typing import Any, Dict, Optional, Tuple
 
 import discord
 
@@ -17,24 +17,145 @@ except ImportError:
     PYDUB_AVAILABLE = False
 
 import config # Import config for constants
+from utils import audio_dsp # NumPy render path, used when numpy is installed
 
 log = logging.getLogger('SoundBot.AudioProcessor')
 
-def process_audio(sound_path: str, member_display_name: str = "User") -> Tuple[Optional[discord.PCMAudio], Optional[io.BytesIO]]:
+NORMALIZATION_MODE = getattr(config, 'NORMALIZATION_MODE', 'peak') # 'peak' or 'lufs'
+TARGET_LOUDNESS_LUFS = getattr(config, 'TARGET_LOUDNESS_LUFS', -16.0)
+LUFS_MAX_PEAK_DBFS = -1.0 # LUFS gain never pushes peaks above this
+
+if NORMALIZATION_MODE == 'lufs' and not audio_dsp.NUMPY_AVAILABLE:
+    log.warning("AUDIO: NORMALIZATION_MODE is 'lufs' but numpy is not installed. Using peak normalization.")
+
+def _normalization_gain(peak_dbfs: float, loudness_lufs: Optional[float], basename: str) -> float:
+    """Gain in dB towards the peak target, or the LUFS target when loudness is given. Positive gain is capped at +6dB."""
+    if math.isinf(peak_dbfs):
+        log.warning(f"AUDIO: Cannot normalize silent audio '{basename}'. Peak is -inf.")
+        return 0.0
+    if peak_dbfs <= -90.0:
+        log.warning(f"AUDIO: Skipping normalization for very quiet audio '{basename}'. Peak: {peak_dbfs:.2f}")
+        return 0.0
+    if loudness_lufs is not None and not math.isinf(loudness_lufs):
+        change_in_dbfs = TARGET_LOUDNESS_LUFS - loudness_lufs
+        headroom = LUFS_MAX_PEAK_DBFS - peak_dbfs
+        if change_in_dbfs > headroom: # Loud transients would clip
+            log.info(f"AUDIO: Limiting gain to {headroom:.2f}dB for '{basename}' to keep peaks under {LUFS_MAX_PEAK_DBFS}dBFS.")
+            change_in_dbfs = headroom
+        log.info(f"AUDIO: Normalizing '{basename}'. Loudness:{loudness_lufs:.2f} LUFS Target:{TARGET_LOUDNESS_LUFS:.2f} Gain:{change_in_dbfs:.2f} dB.")
+    else:
+        change_in_dbfs = config.TARGET_LOUDNESS_DBFS - peak_dbfs
+        log.info(f"AUDIO: Normalizing '{basename}'. Peak:{peak_dbfs:.2f} Target:{config.TARGET_LOUDNESS_DBFS:.2f} Gain:{change_in_dbfs:.2f} dB.")
+    gain_limit = 6.0 # Limit positive gain
+    apply_gain = min(change_in_dbfs, gain_limit) if change_in_dbfs > 0 else change_in_dbfs
+    if apply_gain != change_in_dbfs:
+        log.info(f"AUDIO: Limiting gain to +{gain_limit}dB for '{basename}' (calculated: {change_in_dbfs:.2f}dB).")
+    return apply_gain
+
+
+def _use_numpy(audio_segment: "AudioSegment") -> bool:
+    return audio_dsp.NUMPY_AVAILABLE and audio_segment.sample_width in audio_dsp.SUPPORTED_SAMPLE_WIDTHS
+
+
+def analyze_segment(audio_segment: "AudioSegment") -> Dict[str, Any]:
     """
-    Loads, TRIMS, normalizes, and prepares audio for Discord playback.
-    Returns a tuple: (PCMAudio source or None, BytesIO buffer or None).
-    The BytesIO buffer MUST be closed by the caller after playback is finished or fails.
+    Measures a decoded sound once (e.g. at upload) so rendering can skip analysis later.
+    Peak and loudness cover only the part that is played (first MAX_PLAYBACK_DURATION_MS).
+    """
+    if _use_numpy(audio_segment):
+        rate, sample_width = audio_segment.frame_rate, audio_segment.sample_width
+        samples = audio_dsp.samples_from_raw(audio_segment.raw_data, sample_width, audio_segment.channels)
+        samples = samples[:config.MAX_PLAYBACK_DURATION_MS * rate // 1000]
+        peak_dbfs = audio_dsp.peak_dbfs(samples, sample_width)
+        loudness_lufs = audio_dsp.integrated_loudness(samples, sample_width, rate)
+    else:
+        playable = audio_segment[:config.MAX_PLAYBACK_DURATION_MS] if len(audio_segment) > config.MAX_PLAYBACK_DURATION_MS else audio_segment
+        peak_dbfs, loudness_lufs = playable.max_dBFS, None
+    return {
+        'duration_ms': len(audio_segment),
+        'sample_rate': audio_segment.frame_rate,
+        'channels': audio_segment.channels,
+        'sample_width': audio_segment.sample_width,
+        'peak_dbfs': peak_dbfs,
+        'loudness_lufs': loudness_lufs,
+        'analyzed_ms': config.MAX_PLAYBACK_DURATION_MS, # Peak/loudness are stale if the trim length changes
+    }
+
+
+def _stored_gain(analysis: Dict[str, Any], basename: str) -> float:
+    log.debug(f"AUDIO: Using stored analysis for '{basename}'")
+    loudness = analysis.get('loudness_lufs') if NORMALIZATION_MODE == 'lufs' else None
+    return _normalization_gain(analysis['peak_dbfs'], loudness, basename)
+
+
+def _finalize_segment(audio_segment: "AudioSegment", basename: str, analysis: Optional[Dict[str, Any]] = None) -> Optional[bytes]:
+    """
+    Trims, normalizes and converts a decoded segment to 48kHz stereo s16le PCM. Shared by files and in-memory audio.
+    With a stored analysis (see analyze_segment) the peak/loudness measurement is skipped.
+    """
+    if _use_numpy(audio_segment):
+        pcm_data = _finalize_numpy(audio_segment, basename, analysis)
+    else:
+        pcm_data = _finalize_pydub(audio_segment, basename, analysis)
+    if not pcm_data:
+        log.error(f"AUDIO: Exported raw audio for '{basename}' is empty!")
+        return None
+    log.debug(f"AUDIO: Successfully rendered '{basename}' ({len(pcm_data)} bytes)")
+    return pcm_data
+
+
+def _finalize_numpy(audio_segment: "AudioSegment", basename: str, analysis: Optional[Dict[str, Any]] = None) -> bytearray:
+    """One read for the peak (and loudness), one fused gain/resample/stereo pass into the output buffer."""
+    rate, sample_width = audio_segment.frame_rate, audio_segment.sample_width
+    samples = audio_dsp.samples_from_raw(audio_segment.raw_data, sample_width, audio_segment.channels)
+    max_frames = config.MAX_PLAYBACK_DURATION_MS * rate // 1000
+    if len(samples) > max_frames:
+        log.info(f"AUDIO: Trimming '{basename}' from {len(samples) * 1000 // rate}ms to first {config.MAX_PLAYBACK_DURATION_MS}ms.")
+        samples = samples[:max_frames] # View, nothing copied
+    if analysis:
+        gain = _stored_gain(analysis, basename)
+    else:
+        peak_dbfs = audio_dsp.peak_dbfs(samples, sample_width)
+        loudness = audio_dsp.integrated_loudness(samples, sample_width, rate) if NORMALIZATION_MODE == 'lufs' else None
+        gain = _normalization_gain(peak_dbfs, loudness, basename)
+    return audio_dsp.render_s16le_stereo(samples, sample_width, rate, gain)
+
+
+def _finalize_pydub(audio_segment: "AudioSegment", basename: str, analysis: Optional[Dict[str, Any]] = None) -> bytes:
+    """Fallback without NumPy: every pydub step below copies the whole segment."""
+    # Trim audio
+    if len(audio_segment) > config.MAX_PLAYBACK_DURATION_MS:
+        log.info(f"AUDIO: Trimming '{basename}' from {len(audio_segment)}ms to first {config.MAX_PLAYBACK_DURATION_MS}ms.")
+        audio_segment = audio_segment[:config.MAX_PLAYBACK_DURATION_MS]
+    else:
+        log.debug(f"AUDIO: '{basename}' is {len(audio_segment)}ms (<= {config.MAX_PLAYBACK_DURATION_MS}ms), no trimming needed.")
+
+    # Normalize loudness (LUFS needs NumPy, see _finalize_numpy)
+    apply_gain = _stored_gain(analysis, basename) if analysis else _normalization_gain(audio_segment.max_dBFS, None, basename)
+    if apply_gain:
+        audio_segment = audio_segment.apply_gain(apply_gain)
+
+    # Resample and set channels for Discord
+    audio_segment = audio_segment.set_frame_rate(48000).set_channels(2).set_sample_width(2)
+
+    # Raw data of a 16-bit segment is already PCM S16LE, no export pass needed
+    return audio_segment.raw_data
+
+
+def render_pcm(sound_path: str, analysis: Optional[Dict[str, Any]] = None) -> Optional[bytes]:
+    """
+    Loads, TRIMS and normalizes a sound file, returning 48kHz stereo s16le PCM bytes.
+    Pure function with no discord objects involved, so it can run in a thread or process pool.
+    With a stored analysis (core.sound_metadata) only the played part is decoded and nothing is re-measured.
+    Returns None on failure (errors are logged here).
     """
     if not PYDUB_AVAILABLE:
         log.error("AUDIO: Pydub library is not available. Cannot process audio.")
-        return None, None
+        return None
     if not os.path.exists(sound_path):
         log.error(f"AUDIO: File not found: '{sound_path}'")
-        return None, None
+        return None
 
-    audio_source: Optional[discord.PCMAudio] = None
-    pcm_data_io: Optional[io.BytesIO] = None # Initialize buffer variable
     basename = os.path.basename(sound_path)
 
     try:
@@ -44,68 +165,66 @@ def process_audio(sound_path: str, member_display_name: str = "User") -> Tuple[O
              log.warning(f"AUDIO: File '{basename}' has no extension. Assuming mp3.")
              ext = 'mp3'
 
+        # Known to be too long: let ffmpeg stop decoding at the trim point
+        load_kwargs = {}
+        if analysis and analysis.get('duration_ms', 0) > config.MAX_PLAYBACK_DURATION_MS:
+            load_kwargs['duration'] = config.MAX_PLAYBACK_DURATION_MS / 1000
+
         # Load audio using Pydub
         try:
-            audio_segment = AudioSegment.from_file(sound_path, format=ext)
+            audio_segment = AudioSegment.from_file(sound_path, format=ext, **load_kwargs)
         except CouldntDecodeError as decode_err:
             raise decode_err # Re-raise specifically for the outer handler
         except Exception as load_e:
             log.warning(f"AUDIO: Initial load failed for '{basename}', trying explicit format if possible. Error: {load_e}")
-            if ext == 'm4a': audio_segment = AudioSegment.from_file(sound_path, format="m4a")
-            elif ext == 'aac': audio_segment = AudioSegment.from_file(sound_path, format="aac")
-            elif ext == 'ogg': audio_segment = AudioSegment.from_file(sound_path, format="ogg")
+            if ext == 'm4a': audio_segment = AudioSegment.from_file(sound_path, format="m4a", **load_kwargs)
+            elif ext == 'aac': audio_segment = AudioSegment.from_file(sound_path, format="aac", **load_kwargs)
+            elif ext == 'ogg': audio_segment = AudioSegment.from_file(sound_path, format="ogg", **load_kwargs)
             else: raise load_e
 
-        # Trim audio
-        if len(audio_segment) > config.MAX_PLAYBACK_DURATION_MS:
-            log.info(f"AUDIO: Trimming '{basename}' from {len(audio_segment)}ms to first {config.MAX_PLAYBACK_DURATION_MS}ms.")
-            audio_segment = audio_segment[:config.MAX_PLAYBACK_DURATION_MS]
-        else:
-            log.debug(f"AUDIO: '{basename}' is {len(audio_segment)}ms (<= {config.MAX_PLAYBACK_DURATION_MS}ms), no trimming needed.")
-
-        # Normalize loudness
-        peak_dbfs = audio_segment.max_dBFS
-        if not math.isinf(peak_dbfs) and peak_dbfs > -90.0:
-            change_in_dbfs = config.TARGET_LOUDNESS_DBFS - peak_dbfs
-            log.info(f"AUDIO: Normalizing '{basename}'. Peak:{peak_dbfs:.2f} Target:{config.TARGET_LOUDNESS_DBFS:.2f} Gain:{change_in_dbfs:.2f} dB.")
-            gain_limit = 6.0 # Limit positive gain
-            apply_gain = min(change_in_dbfs, gain_limit) if change_in_dbfs > 0 else change_in_dbfs
-            if apply_gain != change_in_dbfs:
-                log.info(f"AUDIO: Limiting gain to +{gain_limit}dB for '{basename}' (calculated: {change_in_dbfs:.2f}dB).")
-            audio_segment = audio_segment.apply_gain(apply_gain)
-        elif math.isinf(peak_dbfs):
-            log.warning(f"AUDIO: Cannot normalize silent audio '{basename}'. Peak is -inf.")
-        else:
-             log.warning(f"AUDIO: Skipping normalization for very quiet audio '{basename}'. Peak: {peak_dbfs:.2f}")
-
-        # Resample and set channels for Discord
-        audio_segment = audio_segment.set_frame_rate(48000).set_channels(2)
-
-        # Export to PCM S16LE in memory
-        pcm_data_io = io.BytesIO()
-        audio_segment.export(pcm_data_io, format="s16le")
-        pcm_data_io.seek(0)
-
-        if pcm_data_io.getbuffer().nbytes > 0:
-            audio_source = discord.PCMAudio(pcm_data_io)
-            log.debug(f"AUDIO: Successfully processed '{basename}'")
-            return audio_source, pcm_data_io # Return source and buffer
-        else:
-            log.error(f"AUDIO: Exported raw audio for '{basename}' is empty!")
-            if pcm_data_io: pcm_data_io.close()
-            return None, None
+        return _finalize_segment(audio_segment, basename, analysis)
 
     except CouldntDecodeError as decode_err:
         log.error(f"AUDIO: Pydub CouldntDecodeError for '{basename}'. Is FFmpeg installed and in PATH? Is the file corrupt? Error: {decode_err}", exc_info=True)
-        if pcm_data_io: pcm_data_io.close()
-        return None, None
+        return None
     except FileNotFoundError:
          log.error(f"AUDIO: File not found during processing: '{sound_path}'")
-         if pcm_data_io: pcm_data_io.close()
-         return None, None
+         return None
     except Exception as e:
         log.error(f"AUDIO: Unexpected error processing '{basename}': {e}", exc_info=True)
-        if pcm_data_io and not pcm_data_io.closed:
-            try: pcm_data_io.close()
-            except Exception: pass
+        return None
+
+def render_pcm_data(data: bytes, fmt: str = "mp3", label: str = "in-memory audio") -> Optional[bytes]:
+    """
+    render_pcm for encoded audio already in memory (e.g. Edge-TTS MP3), so no temp file is needed.
+    Same trimming and normalization; returns None on failure (errors are logged here).
+    """
+    if not PYDUB_AVAILABLE:
+        log.error("AUDIO: Pydub library is not available. Cannot process audio.")
+        return None
+    if not data:
+        log.error(f"AUDIO: No data to render for {label}")
+        return None
+    try:
+        with io.BytesIO(data) as fp:
+            audio_segment = AudioSegment.from_file(fp, format=fmt)
+        return _finalize_segment(audio_segment, label)
+    except CouldntDecodeError as decode_err:
+        log.error(f"AUDIO: Pydub CouldntDecodeError for {label}. Is FFmpeg installed and in PATH? Error: {decode_err}", exc_info=True)
+        return None
+    except Exception as e:
+        log.error(f"AUDIO: Unexpected error processing {label}: {e}", exc_info=True)
+        return None
+
+def process_audio(sound_path: str, member_display_name: str = "User") -> Tuple[Optional[discord.PCMAudio], Optional[io.BytesIO]]:
+    """
+    Loads, TRIMS, normalizes, and prepares audio for Discord playback (blocking).
+    Returns a tuple: (PCMAudio source or None, BytesIO buffer or None).
+    The BytesIO buffer MUST be closed by the caller after playback is finished or fails.
+    Prefer core.audio_service.AudioProcessingService from async code; this blocks the caller.
+    """
+    pcm_data = render_pcm(sound_path)
+    if not pcm_data:
         return None, None
+    pcm_data_io = io.BytesIO(pcm_data)
+    return discord.PCMAudio(pcm_data_io), pcm_data_io
@@ -3,13 +3,19 @@ import os
 import re
 import logging
 import shutil
-from typing import List, Optional, Tuple, Dict
+import asyncio
+import functools
+from typing import Any, List, Optional, Tuple, Dict
 import discord  # <--- ADD THIS LINE
 
 import config # Import config for ALLOWED_EXTENSIONS
+from utils.sound_library import SoundLibrary
 
 log = logging.getLogger('SoundBot.Utils.FileHelpers')
 
+# In-memory listing of sound directories; commands that add or delete sounds keep it current
+sound_library = SoundLibrary()
+
 def ensure_dir(dir_path: str):
     """Creates a directory if it doesn't exist."""
     if not os.path.exists(dir_path):
@@ -44,68 +50,23 @@ def _find_sound_path_in_dir(directory: str, sound_name: str) -> Optional[str]:
     """
     Generic helper to find a sound file by name (case-insensitive, checks extensions).
     Handles sanitized names if exact match fails. Returns the full path.
+    Answered from the in-memory sound library (one dict lookup per name variant).
     """
-    if not os.path.isdir(directory):
-        log.debug(f"Directory not found for searching: {directory}")
-        return None
-
-    # Prioritize common/efficient formats if multiple files with the same base name exist
-    preferred_order = ['.mp3', '.wav', '.ogg', '.m4a', '.aac'] # Match config.ALLOWED_EXTENSIONS logic
-
-    # Check both the raw name and the sanitized version
-    name_variants_to_check = [sound_name]
+    path = sound_library.find(directory, sound_name)
+    if path:
+        return path
     sanitized = sanitize_filename(sound_name) # Use the shared sanitizer
     if sanitized and sanitized != sound_name:
-        name_variants_to_check.append(sanitized)
-        log.debug(f"Searching for name variants: {name_variants_to_check}")
-
-    for name_variant in name_variants_to_check:
-        try:
-            # Use scandir for potentially better performance on large directories
-            with os.scandir(directory) as entries:
-                found_paths: Dict[str, str] = {} # Store found paths by extension
-                for entry in entries:
-                    if entry.is_file():
-                        base, file_ext = os.path.splitext(entry.name)
-                        file_ext_lower = file_ext.lower()
-                        # Case-insensitive base name comparison
-                        if base.lower() == name_variant.lower() and file_ext_lower in config.ALLOWED_EXTENSIONS:
-                            found_paths[file_ext_lower] = entry.path
-
-                # Check found paths against preferred order
-                for ext in preferred_order:
-                    if ext in found_paths:
-                        log.debug(f"Found sound '{name_variant}' with preferred ext '{ext}' at: {found_paths[ext]}")
-                        return found_paths[ext] # Return the first match in preferred order
-
-                # If not found in preferred order, return any valid match (less common)
-                if found_paths:
-                    first_found_path = next(iter(found_paths.values()))
-                    log.debug(f"Found sound '{name_variant}' with non-preferred ext at: {first_found_path}")
-                    return first_found_path
-
-        except OSError as e:
-            log.error(f"Error listing files in {directory} during find: {e}")
-            return None # Abort search for this variant if directory listing fails
-
+        path = sound_library.find(directory, sanitized)
+        if path:
+            log.debug(f"Found sound '{sound_name}' via sanitized name '{sanitized}' at: {path}")
+            return path
     log.debug(f"Sound '{sound_name}' (or sanitized variants) not found in {directory}")
-    return None # Not found after checking all variants
+    return None
 
 def _get_sound_files_from_dir(directory: str) -> List[str]:
-    """Generic helper to list sound base names (without extension) from a directory."""
-    sounds = set() # Use a set to avoid duplicates if multiple extensions exist
-    if os.path.isdir(directory):
-        try:
-            with os.scandir(directory) as entries:
-                for entry in entries:
-                    if entry.is_file():
-                        base_name, ext = os.path.splitext(entry.name)
-                        if ext.lower() in config.ALLOWED_EXTENSIONS:
-                            sounds.add(base_name) # Add only the base name
-        except OSError as e:
-            log.error(f"Error listing files in {directory}: {e}")
-    # Return sorted list for consistent display
-    return sorted(list(sounds), key=str.lower)
+    """Generic helper to list sound base names (without extension) from a directory. Served from memory."""
+    return sound_library.names(directory)
 
 # --- Specific Sound Directory Helpers ---
 
@@ -119,10 +80,18 @@ def find_user_sound_path(user_id: int, sound_name: str) -> Optional[str]:
     user_dir = os.path.join(config.USER_SOUNDS_DIR, str(user_id))
     return _find_sound_path_in_dir(user_dir, sound_name)
 
+def search_user_sounds(user_id: int, query: str, limit: int = 25) -> List[str]:
+    """A user's sound names starting with, then containing, query (case-insensitive)."""
+    return sound_library.search(os.path.join(config.USER_SOUNDS_DIR, str(user_id)), query, limit)
+
 def get_public_sound_files() -> List[str]:
     """Lists base names of public sound files."""
     return _get_sound_files_from_dir(config.PUBLIC_SOUNDS_DIR)
 
+def search_public_sounds(query: str, limit: int = 25) -> List[str]:
+    """Public sound names starting with, then containing, query (case-insensitive)."""
+    return sound_library.search(config.PUBLIC_SOUNDS_DIR, query, limit)
+
 def find_public_sound_path(sound_name: str) -> Optional[str]:
     """Finds the full path for a public sound by base name."""
     return _find_sound_path_in_dir(config.PUBLIC_SOUNDS_DIR, sound_name)
@@ -131,11 +100,14 @@ async def validate_and_save_upload(
     ctx: discord.ApplicationContext, # Use ApplicationContext for slash commands
     sound_file: discord.Attachment,
     target_save_path: str,
-    command_name: str = "upload"
+    command_name: str = "upload",
+    metadata_index: Optional[Any] = None
 ) -> Tuple[bool, Optional[str]]:
     """
     Validates attachment (type, size), saves temporarily, checks with Pydub,
     moves/renames to final path if valid.
+    If metadata_index (core.sound_metadata.SoundMetadataIndex) is given, the validation decode
+    is also measured and recorded, so playback never has to analyze the file again.
     Returns (success_bool, error_message_or_None). Sends NO user feedback itself.
     """
     # Ensure config is available for checks
@@ -171,6 +143,12 @@ async def validate_and_save_upload(
     temp_save_filename = f"temp_{command_name}_{user_id}_{os.urandom(4).hex()}{file_extension}"
     temp_save_path = os.path.join(temp_save_dir, temp_save_filename)
 
+    async def record_metadata(audio):
+        if metadata_index is None:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, metadata_index.record, target_save_path, audio)
+
     async def cleanup_temp():
         if os.path.exists(temp_save_path):
             try:
@@ -192,7 +170,9 @@ async def validate_and_save_upload(
             if not audio_format:
                  log.warning(f"{log_prefix}: No file extension found for Pydub format hint, trying auto-detection.")
             # This is the core validation step
-            audio = AudioSegment.from_file(temp_save_path, format=audio_format)
+            # Decode in a worker thread; long uploads would otherwise stall the gateway
+            loop = asyncio.get_running_loop()
+            audio = await loop.run_in_executor(None, functools.partial(AudioSegment.from_file, temp_save_path, format=audio_format))
             log.info(f"{log_prefix}: Pydub validation OK for '{temp_save_path}' (Duration: {len(audio)}ms)")
 
             # --- Final Move/Rename ---
@@ -200,6 +180,7 @@ async def validate_and_save_upload(
                 # Use os.replace for atomic rename where possible (safer)
                 os.replace(temp_save_path, target_save_path)
                 log.info(f"{log_prefix}: Final file saved (atomic replace/rename): '{target_save_path}'")
+                await record_metadata(audio)
                 return True, None # SUCCESS
             except OSError as rep_e:
                 # Fallback to shutil.move if os.replace fails (e.g., cross-device move)
@@ -211,6 +192,7 @@ async def validate_and_save_upload(
                         os.remove(target_save_path)
                     shutil.move(temp_save_path, target_save_path)
                     log.info(f"{log_prefix}: Final file saved (fallback move): '{target_save_path}'")
+                    await record_metadata(audio)
                     return True, None # SUCCESS
                 except Exception as move_e:
                     log.error(f"{log_prefix}: FAILED final save (replace error: {rep_e}, fallback move error: {move_e})", exc_info=True)
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+import re
+import heapq
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set
+
+_TOKEN_SPLIT = re.compile(r'[\W_]+') # Any non-alphanumeric, so accented and non-Latin words are kept
+_FUZZY_MIN_SHARED = 0.4 # Fraction of the query's trigrams a candidate needs to count as a fuzzy match
+
+
+def _normalize(text: str) -> str:
+    return text.casefold().strip()
+
+
+def _ngrams(text: str, n: int) -> Set[str]:
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class _TrieNode:
+    __slots__ = ('children', 'keys')
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.keys: Set[Hashable] = set() # Every key with a string passing through this node
+
+
+class SearchIndex:
+    """
+    Autocomplete index over a set of items, each searchable by one or more texts (e.g. a voice's
+    display name and ID). Built once and updated incrementally with add()/remove().
+
+    search() ranks matches in tiers: the whole text starts with the query, then a word in it does
+    (prefix trie), then the text contains the query, then fuzzy matches sharing most of the query's
+    trigrams (typos). Within a tier, items used more often (record_use) come first, then alphabetical.
+    Not thread-safe; callers that share an index across threads must lock around it.
+    """
+    def __init__(self):
+        self._trie = _TrieNode() # Over whole texts
+        self._word_trie = _TrieNode() # Over the words in each text
+        self._grams: Dict[str, Set[Hashable]] = {} # Bigrams and trigrams -> keys, for substring and fuzzy matches
+        self._texts: Dict[Hashable, List[str]] = {} # key -> normalized texts
+        self._payloads: Dict[Hashable, Any] = {}
+        self._sort_names: Dict[Hashable, str] = {}
+        self._uses: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._texts
+
+    # --- Building ---
+    @staticmethod
+    def _trie_insert(root: _TrieNode, text: str, key: Hashable):
+        node = root
+        node.keys.add(key)
+        for char in text:
+            node = node.children.setdefault(char, _TrieNode())
+            node.keys.add(key)
+
+    @staticmethod
+    def _trie_remove(root: _TrieNode, text: str, key: Hashable):
+        node = root
+        node.keys.discard(key)
+        path = []
+        for char in text:
+            child = node.children.get(char)
+            if child is None:
+                break
+            child.keys.discard(key)
+            path.append((node, char, child))
+            node = child
+        for parent, char, child in reversed(path): # Prune branches nothing passes through any more
+            if child.keys:
+                break
+            del parent.children[char]
+
+    @staticmethod
+    def _words(text: str) -> Set[str]:
+        return {word for word in _TOKEN_SPLIT.split(text) if word} - {text}
+
+    def add(self, key: Hashable, texts: Optional[Iterable[str]] = None, payload: Any = None):
+        """Indexes key under texts (default: the key itself). search() returns payload (default: key)."""
+        if key in self._texts:
+            self.remove(key)
+        normalized = list(dict.fromkeys(_normalize(t) for t in (texts if texts is not None else [key]) if t))
+        self._texts[key] = normalized
+        self._payloads[key] = key if payload is None else payload
+        self._sort_names[key] = normalized[0] if normalized else ''
+        for text in normalized:
+            self._trie_insert(self._trie, text, key)
+            for word in self._words(text):
+                self._trie_insert(self._word_trie, word, key)
+            for gram in _ngrams(text, 2) | _ngrams(text, 3):
+                self._grams.setdefault(gram, set()).add(key)
+
+    def remove(self, key: Hashable):
+        normalized = self._texts.pop(key, None)
+        if normalized is None:
+            return
+        self._payloads.pop(key, None)
+        self._sort_names.pop(key, None)
+        for text in normalized:
+            self._trie_remove(self._trie, text, key)
+            for word in self._words(text):
+                self._trie_remove(self._word_trie, word, key)
+            for gram in _ngrams(text, 2) | _ngrams(text, 3):
+                holders = self._grams.get(gram)
+                if holders is not None:
+                    holders.discard(key)
+                    if not holders:
+                        del self._grams[gram]
+
+    def record_use(self, key: Hashable):
+        """Counts a use of key (e.g. a sound played), which ranks it higher among equal matches."""
+        if key in self._texts:
+            self._uses[key] = self._uses.get(key, 0) + 1
+
+    # --- Queries ---
+    @staticmethod
+    def _trie_keys(root: _TrieNode, prefix: str) -> Set[Hashable]:
+        node = root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return set()
+        return node.keys
+
+    def _rank(self, key: Hashable):
+        return (-self._uses.get(key, 0), self._sort_names[key])
+
+    def search(self, query: str, limit: int = 25) -> List[Any]:
+        """Payloads of up to limit best matches for query, best first. An empty query lists everything."""
+        query = _normalize(query)
+        if limit <= 0:
+            return []
+        results: List[Hashable] = []
+        seen: Set[Hashable] = set()
+
+        def take(candidates: Iterable[Hashable], rank=self._rank):
+            fresh = [key for key in candidates if key not in seen]
+            for key in heapq.nsmallest(limit - len(results), fresh, key=rank):
+                results.append(key)
+                seen.add(key)
+
+        take(self._trie_keys(self._trie, query))
+        if query and len(results) < limit:
+            take(self._trie_keys(self._word_trie, query))
+        if query and len(results) < limit:
+            grams = _ngrams(query, 3)
+            if grams:
+                # Candidates must hold every trigram of the query; confirm with a real substring test
+                pools = sorted((self._grams.get(gram, set()) for gram in grams), key=len)
+                candidates = set.intersection(*pools) if pools[0] else set()
+                take(key for key in candidates if any(query in text for text in self._texts[key]))
+            elif len(query) == 2:
+                take(self._grams.get(query, ())) # Holding the bigram is the same as containing the query
+            else:
+                take(key for key, texts in self._texts.items() if any(query in text for text in texts))
+            if grams and len(results) < limit:
+                shared: Dict[Hashable, int] = {}
+                for gram in grams:
+                    for key in self._grams.get(gram, ()):
+                        shared[key] = shared.get(key, 0) + 1
+                needed = max(1, int(len(grams) * _FUZZY_MIN_SHARED + 0.5))
+                take((key for key, count in shared.items() if count >= needed),
+                     rank=lambda key: (-shared[key],) + self._rank(key))
+        return [self._payloads[key] for key in results]
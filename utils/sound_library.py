@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+import os
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import config
+from utils.search_index import SearchIndex
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+    WATCHDOG_AVAILABLE = False
+
+log = logging.getLogger('SoundBot.Utils.SoundLibrary')
+
+# --- Configuration ---
+WATCH_ENABLED = getattr(config, 'SOUND_LIBRARY_WATCH', True) # Pick up files added/removed outside the bot (needs watchdog)
+PREFERRED_EXTENSIONS = ['.mp3', '.wav', '.ogg', '.m4a', '.aac'] # Picked in this order when one name has several files
+
+
+class _Directory:
+    """
+    Sound files directly inside one directory: base name -> {extension: path}, a case-folded
+    name -> base names map for lookups, and a search index over the names.
+    """
+    def __init__(self):
+        self.files: Dict[str, Dict[str, str]] = {}
+        self.by_folded: Dict[str, Set[str]] = {} # 'Airhorn' and 'airhorn' both resolve from 'airhorn'
+        self.index = SearchIndex()
+        self._sorted: Optional[List[str]] = None
+
+    def add(self, base_name: str, ext: str, path: str):
+        if base_name not in self.files:
+            self.index.add(base_name)
+            self.by_folded.setdefault(base_name.casefold(), set()).add(base_name)
+            self._sorted = None
+        self.files.setdefault(base_name, {})[ext] = path
+
+    def remove(self, base_name: str, ext: str) -> bool:
+        extensions = self.files.get(base_name)
+        if extensions is None or extensions.pop(ext, None) is None:
+            return False
+        if not extensions:
+            del self.files[base_name]
+            self.index.remove(base_name)
+            folded = self.by_folded.get(base_name.casefold())
+            if folded is not None:
+                folded.discard(base_name)
+                if not folded:
+                    del self.by_folded[base_name.casefold()]
+            self._sorted = None
+        return True
+
+    def sorted_names(self) -> List[str]:
+        if self._sorted is None:
+            self._sorted = sorted(self.files, key=str.lower)
+        return self._sorted
+
+    @staticmethod
+    def _preferred(extensions: Dict[str, str]) -> Optional[str]:
+        for ext in PREFERRED_EXTENSIONS:
+            if ext in extensions:
+                return extensions[ext]
+        return next(iter(extensions.values()), None)
+
+    def path_for(self, base_name: str) -> Optional[str]:
+        return self._preferred(self.files.get(base_name) or {})
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Case-insensitive lookup; when several files match, the preferred extension wins."""
+        base_names = self.by_folded.get(name.casefold())
+        if not base_names:
+            return None
+        if len(base_names) == 1:
+            return self.path_for(next(iter(base_names)))
+        merged: Dict[str, str] = {}
+        for base_name in sorted(base_names):
+            merged.update(self.files[base_name])
+        return self._preferred(merged)
+
+
+class SoundLibrary:
+    """
+    In-memory listing of the user and public sound directories, so listings and autocomplete
+    never touch the filesystem. Each directory is scanned once, the first time it is asked for;
+    after that commands that write sounds (upload, delete, publish, remove) call add()/remove(),
+    and an optional watchdog observer catches files changed by hand.
+    Thread-safe; the observer delivers events from its own thread.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dirs: Dict[str, _Directory] = {}
+        self._observer = None
+
+    @staticmethod
+    def _key(directory: str) -> str:
+        return os.path.abspath(directory)
+
+    @staticmethod
+    def _sound_parts(filename: str):
+        """(base name, lower extension) for an allowed sound file name, else None."""
+        base, ext = os.path.splitext(filename)
+        ext = ext.lower()
+        if not base or ext not in config.ALLOWED_EXTENSIONS or filename.startswith('temp_'):
+            return None
+        return base, ext
+
+    def _scan(self, directory: str) -> _Directory:
+        entry = _Directory()
+        if not os.path.isdir(directory):
+            return entry
+        try:
+            with os.scandir(directory) as entries:
+                for item in entries:
+                    parts = self._sound_parts(item.name)
+                    if parts and item.is_file():
+                        entry.add(parts[0], parts[1], item.path)
+        except OSError as e:
+            log.error(f"SOUND LIBRARY: Error listing files in {directory}: {e}")
+        log.debug(f"SOUND LIBRARY: Indexed {len(entry.files)} sounds in {directory}")
+        return entry
+
+    def _dir(self, directory: str) -> _Directory:
+        """Call with the lock held. Scans the directory on first use."""
+        key = self._key(directory)
+        entry = self._dirs.get(key)
+        if entry is None:
+            entry = self._dirs[key] = self._scan(key)
+        return entry
+
+    # --- Queries ---
+    def names(self, directory: str) -> List[str]:
+        """Sound base names in directory, sorted case-insensitively."""
+        with self._lock:
+            return list(self._dir(directory).sorted_names())
+
+    def named_paths(self, directory: str) -> List[Tuple[str, str]]:
+        """(base name, path) pairs in sorted order, one path per name (preferred extension)."""
+        with self._lock:
+            entry = self._dir(directory)
+            return [(name, entry.path_for(name)) for name in entry.sorted_names()]
+
+    def find(self, directory: str, name: str) -> Optional[str]:
+        """Path of the sound called name (case-insensitive) in directory, or None. No filesystem access once indexed."""
+        with self._lock:
+            return self._dir(directory).resolve(name)
+
+    def count(self, directory: str) -> int:
+        with self._lock:
+            return len(self._dir(directory).files)
+
+    def search(self, directory: str, query: str, limit: int = 25) -> List[str]:
+        """Best matching names for query: prefix, then word prefix, substring and fuzzy matches (see SearchIndex)."""
+        with self._lock:
+            return self._dir(directory).index.search(query, limit)
+
+    def record_use(self, path: str):
+        """Counts a play of path, so frequently played sounds rank first among equal matches."""
+        base_name = os.path.splitext(os.path.basename(path))[0]
+        with self._lock:
+            entry = self._dirs.get(self._key(os.path.dirname(path)))
+            if entry is not None:
+                entry.index.record_use(base_name)
+
+    # --- Updates ---
+    def add(self, path: str):
+        """Records a sound file that was just written."""
+        parts = self._sound_parts(os.path.basename(path))
+        if not parts:
+            return
+        with self._lock:
+            self._dir(os.path.dirname(path)).add(parts[0], parts[1], path)
+
+    def remove(self, path: str):
+        """Forgets a sound file that was just deleted."""
+        parts = self._sound_parts(os.path.basename(path))
+        if not parts:
+            return
+        with self._lock:
+            entry = self._dirs.get(self._key(os.path.dirname(path)))
+            if entry is not None:
+                entry.remove(parts[0], parts[1])
+
+    def refresh(self, directory: Optional[str] = None):
+        """Drops one (or every) directory so it is rescanned on next use."""
+        with self._lock:
+            if directory is None:
+                self._dirs.clear()
+            else:
+                self._dirs.pop(self._key(directory), None)
+
+    # --- Watcher ---
+    def start_watching(self, directories: Iterable[str]):
+        """Follows changes made outside the bot. No-op without watchdog or with SOUND_LIBRARY_WATCH off."""
+        if self._observer is not None or not WATCH_ENABLED:
+            return
+        if not WATCHDOG_AVAILABLE:
+            log.info("SOUND LIBRARY: watchdog not installed. Files changed outside the bot appear after a restart.")
+            return
+        observer = Observer()
+        handler = _LibraryEventHandler(self)
+        for directory in directories:
+            if os.path.isdir(directory):
+                observer.schedule(handler, directory, recursive=True)
+        observer.daemon = True
+        try:
+            observer.start()
+        except OSError as e:
+            log.error(f"SOUND LIBRARY: Could not start file watcher: {e}")
+            return
+        self._observer = observer
+        log.info("SOUND LIBRARY: Watching sound directories for changes")
+
+    def stop_watching(self):
+        if self._observer is None:
+            return
+        self._observer.stop()
+        self._observer.join(timeout=2)
+        self._observer = None
+
+
+class _LibraryEventHandler(FileSystemEventHandler):
+    def __init__(self, library: SoundLibrary):
+        super().__init__()
+        self.library = library
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.library.add(event.src_path)
+
+    def on_deleted(self, event):
+        if event.is_directory:
+            self.library.refresh(event.src_path)
+        else:
+            self.library.remove(event.src_path)
+
+    def on_moved(self, event):
+        if event.is_directory:
+            self.library.refresh(event.src_path)
+            return
+        self.library.remove(event.src_path)
+        self.library.add(event.dest_path)
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, Iterable
+
+
+def percentiles(samples: Iterable[float]) -> Dict[str, float]:
+    """p50/p95/p99 of samples (nearest rank), all 0.0 if there are none. For the latency stats of TTS and join sounds."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0}
+    pick = lambda q: ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+    return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99)}
@@ -81,7 +81,7 @@ async def start_leave_timer(bot: discord.Bot, vc: discord.VoiceClient):
             await asyncio.sleep(timeout)
 
             # Re-check conditions AFTER sleep
-            current_vc = discord.utils.get(bot_ref.voice_clients, guild__id=g_id)
+            current_vc = bot_ref.playback_manager.get_voice_client(g_id)
             if not current_vc or not current_vc.is_connected() or current_vc.channel != original_channel:
                  log.info(f"{log_prefix} Timer expired, but bot disconnected/moved from {original_channel.name if original_channel else 'orig chan'}. Aborting leave.")
                  return
@@ -197,7 +197,7 @@ async def ensure_voice_client_ready(interaction: discord.Interaction, target_cha
         log.warning(f"{log_prefix} Missing Connect/Speak perms in {target_channel.name} ({guild.name}).")
         return None
 
-    vc = discord.utils.get(bot.voice_clients, guild=guild)
+    vc = guild.voice_client
     playback_manager = getattr(bot, 'playback_manager', None)
 
     try: